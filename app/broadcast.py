@@ -1,6 +1,46 @@
 from broadcaster import Broadcast
 from app.config import Config
+from app.core.document_hub import get_document_hub
+from app.core.event_log import EventLog
+from app.core.send_queue import OutboundMessage, OverflowPolicy
+from app.models.editor_events import EventType
+from app.redis import redis_client
+import json
 import os
 
 
+def describe_document_message(message: str) -> OutboundMessage:
+    """A block change supersedes earlier changes of the block, events unknown
+    to the server, e.g. presence of clients, may be dropped"""
+    try:
+        body = json.loads(message)
+        event_type = EventType(body["event"]["type"])
+    except (ValueError, KeyError, TypeError):
+        return OutboundMessage(text=message, critical=False)
+    if event_type is EventType.BLOCK_CHANGED:
+        return OutboundMessage(
+            text=message,
+            coalesce_key=(event_type, body["event"]["data"]["id"]),
+            seq=body.get("seq"),
+        )
+    return OutboundMessage(text=message, seq=body.get("seq"))
+
+
 broadcast = Broadcast(Config.BROADCAST_STORAGE_URL)
+event_log = EventLog(
+    redis_client,
+    retention=Config.EVENT_LOG_RETENTION,
+    ttl=Config.EVENT_LOG_TTL,
+)
+document_hub = get_document_hub(
+    Config.DOCUMENT_HUB_BACKEND,
+    broadcast,
+    describe_message=describe_document_message,
+    send_queue_size=Config.SEND_QUEUE_SIZE,
+    overflow_policy=OverflowPolicy(Config.SEND_QUEUE_OVERFLOW_POLICY),
+    event_log=event_log,
+)
+
+
+def get_document_channel_name(document_id: str) -> str:
+    return f"document-edit:{document_id}"
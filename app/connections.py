@@ -0,0 +1,6 @@
+from app.core.ws_connection_manager import ConnectionRegistry
+from app.core.lock_mirror import LockMirrorRegistry
+
+
+connection_registry = ConnectionRegistry()
+lock_mirrors = LockMirrorRegistry()
@@ -0,0 +1,134 @@
+from abc import ABC, abstractmethod
+from pydantic import BaseModel
+import msgpack
+import typing
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+T = typing.TypeVar("T", bound=BaseModel)
+
+# first byte of an encoded value, so readers pick the format of the writer
+FORMAT_JSON = 1
+FORMAT_MSGPACK = 2
+FORMAT_MSGPACK_ZLIB = 3
+FORMAT_MSGPACK_ZSTD = 4
+
+# values written before the format byte are plain json objects
+_LEGACY_JSON_PREFIX = ord("{")
+
+
+class UnknownCacheFormatException(ValueError): ...
+
+
+def _decompress_zstd(data: bytes) -> bytes:
+    if zstandard is None:
+        raise UnknownCacheFormatException("zstandard is not installed")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_DECOMPRESSORS: dict[int, typing.Callable[[bytes], bytes]] = {
+    FORMAT_MSGPACK_ZLIB: zlib.decompress,
+    FORMAT_MSGPACK_ZSTD: _decompress_zstd,
+}
+
+
+class CacheCodec(ABC):
+    """Encodes models stored in cache, decoding follows the format byte of the value"""
+
+    name: str
+
+    @abstractmethod
+    def encode(self, model: BaseModel) -> bytes: ...
+
+    def decode(self, data: bytes, model_type: type[T]) -> T:
+        if data[0] == _LEGACY_JSON_PREFIX:
+            return model_type.model_validate_json(data)
+        if data[0] == FORMAT_JSON:
+            return model_type.model_validate_json(data[1:])
+        if data[0] == FORMAT_MSGPACK:
+            return model_type.model_validate(msgpack.unpackb(data[1:]))
+        if data[0] in _DECOMPRESSORS:
+            return model_type.model_validate(
+                msgpack.unpackb(_DECOMPRESSORS[data[0]](data[1:]))
+            )
+        raise UnknownCacheFormatException(f"unknown cache format {data[0]}")
+
+
+class JSONCodec(CacheCodec):
+    name = "json"
+
+    def encode(self, model: BaseModel) -> bytes:
+        return bytes([FORMAT_JSON]) + model.model_dump_json().encode()
+
+
+class MsgpackCodec(CacheCodec):
+    name = "msgpack"
+
+    def encode(self, model: BaseModel) -> bytes:
+        return bytes([FORMAT_MSGPACK]) + self._pack(model)
+
+    def _pack(self, model: BaseModel) -> bytes:
+        return msgpack.packb(model.model_dump(mode="json"))
+
+
+class CompressedMsgpackCodec(MsgpackCodec):
+    """Msgpack, compressed once it reaches the threshold in bytes"""
+
+    compressed_format: int
+
+    def __init__(self, compression_threshold: int) -> None:
+        self._compression_threshold = compression_threshold
+
+    def encode(self, model: BaseModel) -> bytes:
+        packed = self._pack(model)
+        if len(packed) < self._compression_threshold:
+            return bytes([FORMAT_MSGPACK]) + packed
+        return bytes([self.compressed_format]) + self._compress(packed)
+
+    @abstractmethod
+    def _compress(self, data: bytes) -> bytes: ...
+
+
+class MsgpackZlibCodec(CompressedMsgpackCodec):
+    name = "msgpack-zlib"
+    compressed_format = FORMAT_MSGPACK_ZLIB
+
+    def _compress(self, data: bytes) -> bytes:
+        # cache is written on every edit, so the fastest level
+        return zlib.compress(data, level=1)
+
+
+class MsgpackZstdCodec(CompressedMsgpackCodec):
+    name = "msgpack-zstd"
+    compressed_format = FORMAT_MSGPACK_ZSTD
+
+    def __init__(self, compression_threshold: int) -> None:
+        if zstandard is None:
+            raise ImportError("msgpack-zstd codec requires zstandard package")
+        super().__init__(compression_threshold)
+        self._compressor = zstandard.ZstdCompressor(level=3)
+
+    def _compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+
+CACHE_CODECS: dict[str, type[CacheCodec]] = {
+    codec.name: codec
+    for codec in (JSONCodec, MsgpackCodec, MsgpackZlibCodec, MsgpackZstdCodec)
+}
+
+
+def get_cache_codec(name: str, compression_threshold: int) -> CacheCodec:
+    if name not in CACHE_CODECS:
+        raise ValueError(
+            f"unknown cache codec {name}, expected one of {', '.join(CACHE_CODECS)}"
+        )
+    codec_type = CACHE_CODECS[name]
+    if issubclass(codec_type, CompressedMsgpackCodec):
+        return codec_type(compression_threshold=compression_threshold)
+    return codec_type()
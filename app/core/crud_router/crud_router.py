@@ -1,13 +1,16 @@
 from typing import Protocol, Type, Callable, Annotated, Optional, Any
 from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from datetime import datetime
-from ..repository.base import BaseRepository
+from ..repository.base import BaseRepository, InvalidIdException
+from ..repository.pagination import PageCursor, InvalidCursorException
 from .models import (
     ReadContentModel,
     CreateModel,
     ReadInfoModel,
     CollectionModel,
+    BatchResultModel,
 )
 
 
@@ -31,6 +34,7 @@ class CRUDRouter:
         schema_name: str = "document",
         default_content: Any | None = None,
         id_type: Type = str,
+        max_batch_size: int = 100,
     ) -> None:
         self._repository = repository
         self._user_dependency = user_dependency
@@ -44,6 +48,10 @@ class CRUDRouter:
         self._default_content = default_content
         self._schema_name = schema_name
         self._id_type = id_type
+        self._max_batch_size = max_batch_size
+
+        # list routes never return content, so it is not read from the database
+        self._info_projection = self._get_projection(read_info_schema)
 
         self.router = APIRouter(prefix=prefix, tags=tags)
         self.router.add_api_route
@@ -56,7 +64,8 @@ class CRUDRouter:
         self._add_update_route()
         self._add_read_route()
         self._add_delete_route()
-
+        self._add_batch_delete_route()
+        self._add_batch_restore_route()
 
     def _add_read_all_route(self):
         @self.router.get(
@@ -70,24 +79,61 @@ class CRUDRouter:
             limit: Annotated[int, Query(gt=-1)] = 25,
             offset: Annotated[int, Query(gt=-1)] = 0,
             name: Optional[str] = None,
-            is_deleted: bool = False,
+            is_deleted: Annotated[bool, Query(
+                description="List only deleted items instead of only not deleted ones, "
+                "total_amount counts the same items",
+            )] = False,
+            cursor: Optional[str] = None,
+            fields: Annotated[Optional[list[str]], Query()] = None,
+            ids: Annotated[
+                Optional[list[self._id_type]],  # type: ignore
+                Query(max_length=self._max_batch_size),
+            ] = None,
         ):
-            documents = await repository.get_documents(
-                limit=limit,
-                offset=offset,
-                name=name,
-                owner_id=user.id,
-                is_deleted=is_deleted,
-            )
-            total_amount = await repository.count_documents(
-                name=name,
-                owner_id=user.id
-            )
+            include_fields = self._info_projection if fields is None \
+                else self._get_projection(self._read_info_schema, fields)
 
-            return self._collection_schema(
+            if ids is not None:
+                try:
+                    documents = await repository.get_documents_by_ids(
+                        ids=ids,
+                        owner_id=user.id,
+                        include_fields=include_fields,
+                    )
+                except InvalidIdException as e:
+                    self._raise_invalid_id_exception(e)
+                total_amount, next_cursor = len(documents), None
+            else:
+                page_cursor = self._decode_cursor(cursor)
+                documents, total_amount = await repository.get_documents_with_count(
+                    limit=limit,
+                    offset=offset,
+                    name=name,
+                    owner_id=user.id,
+                    is_deleted=is_deleted,
+                    cursor=page_cursor,
+                    include_fields=include_fields,
+                )
+                next_cursor = self._get_next_cursor(documents, limit)
+
+            collection = self._collection_schema(
                 total_amount=total_amount,
                 presented_amount=len(documents),
-                content=documents
+                content=documents,
+                next_cursor=next_cursor,
+            )
+            if fields is None:
+                return collection
+            return JSONResponse(
+                content=collection.model_dump(
+                    mode='json',
+                    include={
+                        'total_amount': True,
+                        'presented_amount': True,
+                        'next_cursor': True,
+                        'content': {'__all__': set(fields)},
+                    },
+                )
             )
 
     def _add_create_route(self):
@@ -145,11 +191,26 @@ class CRUDRouter:
             user: Annotated[UserProtocol, Depends(self._user_dependency)],
             repository: Annotated[BaseRepository, Depends(self._get_repository)],
             id: self._id_type,  # type: ignore
+            fields: Annotated[Optional[list[str]], Query()] = None,
         ):
-            document = await repository.get_document(id=id, owner_id=user.id)
+            document = await repository.get_document(
+                id=id,
+                owner_id=user.id,
+                include_fields=(
+                    None if fields is None
+                    else self._get_projection(self._base_schema, fields)
+                ),
+            )
             if document is None:
                 self._raise_not_found_exception(id)
-            return document
+            if fields is None:
+                return document
+            return JSONResponse(
+                content=self._base_schema.model_validate(document).model_dump(
+                    mode='json',
+                    include=set(fields),
+                )
+            )
 
     def _add_delete_route(self):
         @self.router.delete(
@@ -165,11 +226,97 @@ class CRUDRouter:
             if not is_deleted:
                 self._raise_not_found_exception(id)
 
+    def _add_batch_delete_route(self):
+        @self.router.delete(
+            path='/',
+            response_model=BatchResultModel,
+        )
+        async def delete_many(
+            user: Annotated[UserProtocol, Depends(self._user_dependency)],
+            repository: Annotated[BaseRepository, Depends(self._get_repository)],
+            ids: Annotated[
+                list[self._id_type],  # type: ignore
+                Query(min_length=1, max_length=self._max_batch_size),
+            ],
+        ):
+            try:
+                affected_amount = await repository.mark_documents_as_deleted(
+                    ids=ids,
+                    owner_id=user.id,
+                )
+            except InvalidIdException as e:
+                self._raise_invalid_id_exception(e)
+            return BatchResultModel(affected_amount=affected_amount)
+
+    def _add_batch_restore_route(self):
+        @self.router.post(
+            path='/restore',
+            response_model=BatchResultModel,
+        )
+        async def restore_many(
+            user: Annotated[UserProtocol, Depends(self._user_dependency)],
+            repository: Annotated[BaseRepository, Depends(self._get_repository)],
+            ids: Annotated[
+                list[self._id_type],  # type: ignore
+                Query(min_length=1, max_length=self._max_batch_size),
+            ],
+        ):
+            try:
+                affected_amount = await repository.restore_documents(
+                    ids=ids,
+                    owner_id=user.id,
+                )
+            except InvalidIdException as e:
+                self._raise_invalid_id_exception(e)
+            return BatchResultModel(affected_amount=affected_amount)
+
+    def _get_projection(
+        self,
+        schema: Type[BaseModel],
+        fields: list[str] | None = None,
+    ) -> list[str] | None:
+        """Database keys of schema fields, limited to fields if provided, required ones always kept"""
+        if fields is not None:
+            unknown_fields = set(fields) - set(schema.model_fields)
+            if unknown_fields:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"unknown fields: {', '.join(sorted(unknown_fields))}",
+                )
+
+        return [
+            field.alias or name
+            for name, field in schema.model_fields.items()
+            if fields is None or name in fields or field.is_required()
+        ]
+
+    def _decode_cursor(self, cursor: str | None) -> PageCursor | None:
+        if cursor is None:
+            return None
+        try:
+            return PageCursor.decode(cursor)
+        except InvalidCursorException as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
+
+    def _get_next_cursor(self, documents: list[dict], limit: int) -> str | None:
+        if limit == 0 or len(documents) < limit:
+            return None
+        return PageCursor.from_document(documents[-1]).encode()
+
     def _raise_not_found_exception(self, id) -> None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"{self._schema_name.capitalize()} {id} not found",
         )
 
+    def _raise_invalid_id_exception(self, e: InvalidIdException) -> None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
     def _get_repository(self) -> BaseRepository:
         return self._repository
@@ -20,7 +20,12 @@ class CollectionModel(BaseModel):
     total_amount: int
     presented_amount: int
     content: list[ReadInfoModel]
+    next_cursor: str | None = Field(default=None)
 
 
 class CreateModel(BaseModel):
     name: str
+
+
+class BatchResultModel(BaseModel):
+    affected_amount: int
@@ -0,0 +1,268 @@
+from abc import ABC, abstractmethod
+from broadcaster import Broadcast
+from dataclasses import dataclass, field
+from redis.asyncio.client import Pipeline
+import asyncio
+import contextlib
+import typing
+import uuid
+
+from .event_log import EventLog
+from .send_queue import OutboundMessage, OverflowPolicy, SendQueue
+
+
+# runs a transaction of the caller, e.g. writing what a message is about,
+# with commands queued by the given function and returns the result of the
+# last of them
+Transaction = typing.Callable[
+    [typing.Callable[[Pipeline], typing.Awaitable[None]]],
+    typing.Awaitable[typing.Any],
+]
+
+
+async def _queue_nothing(pipeline: Pipeline) -> None: ...
+
+
+@dataclass
+class _Channel:
+    queues: set[SendQueue] = field(default_factory=set)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    listener: asyncio.Task | None = None
+
+
+@dataclass
+class _SequenceLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # publishers holding or waiting for the lock
+    users: int = 0
+
+
+class DocumentHub(ABC):
+    """Fans messages of a channel out to bounded queues of the connections of the process"""
+
+    name: str
+
+    def __init__(
+        self,
+        describe_message: typing.Callable[[str], OutboundMessage],
+        send_queue_size: int,
+        overflow_policy: OverflowPolicy,
+        event_log: EventLog | None = None,
+    ) -> None:
+        self._channels: dict[str, _Channel] = dict()
+        self._describe_message = describe_message
+        self._send_queue_size = send_queue_size
+        self._overflow_policy = overflow_policy
+        self._event_log = event_log
+
+    async def connect(self) -> None: ...
+
+    async def disconnect(self) -> None: ...
+
+    @abstractmethod
+    async def publish(
+        self,
+        channel: str,
+        message: str,
+        transaction: Transaction | None = None,
+    ) -> None: ...
+
+    async def read_since(self, channel: str, seq: int) -> list[str] | None:
+        """Messages published after seq, None when they are not known anymore"""
+        if self._event_log is None:
+            return None
+        return await self._event_log.read_since(channel, seq)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel: str) -> typing.AsyncIterator[SendQueue]:
+        state = self._channels.get(channel)
+        if state is None:
+            state = self._channels[channel] = _Channel()
+            self._open_channel(channel, state)
+        queue = SendQueue(self._send_queue_size, self._overflow_policy)
+        state.queues.add(queue)
+        try:
+            await state.ready.wait()
+            yield queue
+        finally:
+            state.queues.discard(queue)
+            if not state.queues and self._channels.get(channel) is state:
+                del self._channels[channel]
+                await self._close_channel(state)
+
+    def subscribers_amount(self, channel: str) -> int:
+        state = self._channels.get(channel)
+        return 0 if state is None else len(state.queues)
+
+    def get_stats(self) -> dict[str, dict]:
+        """Send queue depths per channel and per connection"""
+        stats = dict()
+        for channel, state in self._channels.items():
+            connections = {str(queue.id): queue.get_stats() for queue in state.queues}
+            stats[channel] = {
+                "connections": len(connections),
+                "depth": sum(queue["depth"] for queue in connections.values()),
+                "deepest_queue": max(
+                    (queue["depth"] for queue in connections.values()), default=0
+                ),
+                "queues": connections,
+            }
+        return stats
+
+    def _open_channel(self, channel: str, state: _Channel) -> None:
+        state.ready.set()
+
+    async def _append(
+        self,
+        channel: str,
+        message: str,
+        transaction: Transaction | None,
+        publish: bool,
+    ) -> str:
+        """Sequences the message, within the transaction when there is one"""
+        if transaction is None:
+            return await self._event_log.append(channel, message, publish=publish)
+
+        async def queue_append(pipeline: Pipeline) -> None:
+            await self._event_log.queue_append(pipeline, channel, message, publish=publish)
+
+        return (await transaction(queue_append)).decode()
+
+    async def _close_channel(self, state: _Channel) -> None: ...
+
+    def _fan_out(self, state: _Channel, message: str) -> None:
+        outbound_message = self._describe_message(message)
+        for queue in state.queues:
+            queue.put(outbound_message)
+
+
+class MemoryDocumentHub(DocumentHub):
+    """Delivers published messages within the process, for single-node deployments"""
+
+    name = "memory"
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        # the only process, so sequencing a channel in order of publishing is enough
+        self._sequence_locks: dict[str, _SequenceLock] = dict()
+
+    async def publish(
+        self,
+        channel: str,
+        message: str,
+        transaction: Transaction | None = None,
+    ) -> None:
+        if self._event_log is None:
+            if transaction is not None:
+                await transaction(_queue_nothing)
+            self._deliver(channel, message)
+            return
+        async with self._sequencing(channel):
+            self._deliver(
+                channel,
+                await self._append(channel, message, transaction, publish=False),
+            )
+
+    @contextlib.asynccontextmanager
+    async def _sequencing(self, channel: str) -> typing.AsyncIterator[None]:
+        sequence_lock = self._sequence_locks.get(channel)
+        if sequence_lock is None:
+            sequence_lock = self._sequence_locks[channel] = _SequenceLock()
+        sequence_lock.users += 1
+        try:
+            async with sequence_lock.lock:
+                yield
+        finally:
+            sequence_lock.users -= 1
+            if not sequence_lock.users:
+                del self._sequence_locks[channel]
+
+    def _deliver(self, channel: str, message: str) -> None:
+        state = self._channels.get(channel)
+        if state is not None:
+            self._fan_out(state, message)
+
+
+class BroadcastDocumentHub(DocumentHub):
+    """Shares one broadcaster subscription per channel among connections"""
+
+    name = "broadcast"
+    # seconds to wait for a message published by the event log at connect
+    publish_check_timeout = 5.0
+
+    def __init__(self, broadcast: Broadcast, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._broadcast = broadcast
+
+    async def connect(self) -> None:
+        await self._broadcast.connect()
+        if self._event_log is not None:
+            await self._check_event_log_publishing()
+
+    async def disconnect(self) -> None:
+        await self._broadcast.disconnect()
+
+    async def publish(
+        self,
+        channel: str,
+        message: str,
+        transaction: Transaction | None = None,
+    ) -> None:
+        if self._event_log is None:
+            if transaction is not None:
+                await transaction(_queue_nothing)
+            await self._broadcast.publish(channel=channel, message=message)
+        else:
+            # published by the sequencing script, so the broadcast backend
+            # has to be the redis of the event log, checked at connect
+            await self._append(channel, message, transaction, publish=True)
+
+    async def _check_event_log_publishing(self) -> None:
+        """Fails unless subscribers of the broadcast get messages the event log publishes"""
+        channel = f"document-hub-check:{uuid.uuid4().hex}"
+        deadline = asyncio.get_running_loop().time() + self.publish_check_timeout
+        async with self._broadcast.subscribe(channel=channel) as subscriber:
+            # published again, the subscription may reach the backend after a publish
+            while asyncio.get_running_loop().time() < deadline:
+                await self._event_log.publish(channel, "check")
+                try:
+                    await asyncio.wait_for(subscriber.get(), timeout=0.1)
+                    return
+                except TimeoutError:
+                    pass
+        raise ValueError(
+            "the broadcast backend does not get messages published by the event log, "
+            "it has to use the redis of the event log"
+        )
+
+    def _open_channel(self, channel: str, state: _Channel) -> None:
+        state.listener = asyncio.create_task(self._listen(channel, state))
+
+    async def _close_channel(self, state: _Channel) -> None:
+        state.listener.cancel()
+        await asyncio.gather(state.listener, return_exceptions=True)
+
+    async def _listen(self, channel: str, state: _Channel) -> None:
+        try:
+            async with self._broadcast.subscribe(channel=channel) as subscriber:
+                state.ready.set()
+                async for event in subscriber:
+                    self._fan_out(state, event.message)
+        finally:
+            # wakes up connections waiting for the subscription too
+            if self._channels.get(channel) is state:
+                del self._channels[channel]
+            state.ready.set()
+            for queue in state.queues:
+                queue.close()
+
+
+def get_document_hub(name: str, broadcast: Broadcast, **kwargs) -> DocumentHub:
+    if name == MemoryDocumentHub.name:
+        return MemoryDocumentHub(**kwargs)
+    if name == BroadcastDocumentHub.name:
+        return BroadcastDocumentHub(broadcast, **kwargs)
+    raise ValueError(
+        f"unknown document hub {name}, expected "
+        f"{MemoryDocumentHub.name} or {BroadcastDocumentHub.name}"
+    )
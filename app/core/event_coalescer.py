@@ -0,0 +1,58 @@
+import asyncio
+import typing
+
+from .message_handler import Response
+
+
+class EventCoalescer:
+    """Holds coalescible broadcasts of a connection for at most window seconds"""
+
+    def __init__(
+        self,
+        publish: typing.Callable[[Response], typing.Awaitable[None]],
+        window: float,
+        # gets errors of publishing a held response after the window, nobody awaits it
+        on_error: typing.Callable[[Exception], typing.Awaitable[None]],
+    ) -> None:
+        self._publish = publish
+        self._window = window
+        self._on_error = on_error
+        self._held: Response | None = None
+        self._flush_task: asyncio.Task | None = None
+        # publishing the held response and the next one must not overtake
+        self._publish_lock = asyncio.Lock()
+
+    async def publish(self, response: Response) -> None:
+        async with self._publish_lock:
+            # a later response of the same key replaces the held one, others keep the order
+            if self._held is not None and self._held.coalesce_key != response.coalesce_key:
+                await self._publish_held()
+            if response.coalesce_key is None or self._window <= 0:
+                await self._publish(response)
+                return
+            self._held = response
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def close(self) -> None:
+        """Sends the held response right away"""
+        async with self._publish_lock:
+            await self._publish_held()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._window)
+        async with self._publish_lock:
+            self._flush_task = None
+            try:
+                await self._publish_held()
+            except Exception as e:
+                await self._on_error(e)
+
+    async def _publish_held(self) -> None:
+        # called with the lock, so a pending flush is not in the middle of publishing
+        held, self._held = self._held, None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._flush_task = None
+        if held is not None:
+            await self._publish(held)
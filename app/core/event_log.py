@@ -0,0 +1,82 @@
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+
+# KEYS: sequence, stream; ARGV: json object message, max length, ttl in s,
+# channel to publish the message to or empty
+# returns the message with its sequence number as the first field
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local message = '{"seq":' .. seq .. ',' .. string.sub(ARGV[1], 2)
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'message', message)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if ARGV[4] ~= '' then
+    redis.call('PUBLISH', ARGV[4], message)
+end
+return message
+"""
+
+
+class EventLog:
+    """Sequenced messages of channels, the recent ones kept in capped streams for ttl seconds"""
+
+    def __init__(self, redis_client: Redis, retention: int, ttl: int) -> None:
+        self._redis_client = redis_client
+        self._retention = retention
+        self._ttl = ttl
+        self._append_script = redis_client.register_script(_APPEND_SCRIPT)
+
+    async def append(self, channel: str, message: str, publish: bool = False) -> str:
+        """Sequences a json object message, returns it with the "seq" field.
+        With publish the same script publishes it, so subscribers get it in sequence order"""
+        sequenced = await self._append_script(
+            keys=self._get_keys(channel),
+            args=[message, self._retention, self._ttl, channel if publish else ""],
+        )
+        return sequenced.decode()
+
+    async def queue_append(
+        self,
+        pipeline: Pipeline,
+        channel: str,
+        message: str,
+        publish: bool = False,
+    ) -> None:
+        """Queues append into a transaction of the caller, e.g. with a write
+        the message is about, its result is the sequenced message"""
+        await self._append_script(
+            keys=self._get_keys(channel),
+            args=[message, self._retention, self._ttl, channel if publish else ""],
+            client=pipeline,
+        )
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Publishes a message without sequencing it, as append does"""
+        await self._redis_client.publish(channel, message)
+
+    async def get_seq(self, channel: str) -> int:
+        return int(await self._redis_client.get(self.get_seq_key(channel)) or 0)
+
+    def get_seq_key(self, channel: str) -> str:
+        """Key of the last sequence number, for reads atomic with other keys"""
+        return self._get_keys(channel)[0]
+
+    async def read_since(self, channel: str, seq: int) -> list[str] | None:
+        """Messages after seq, None once some of them fell out of retention"""
+        seq_key, stream_key = self._get_keys(channel)
+        async with self._redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.get(seq_key)
+            pipeline.xrange(stream_key, min=f"{seq + 1}-0")
+            last_seq, entries = await pipeline.execute()
+        last_seq = int(last_seq or 0)
+        if seq > last_seq:
+            return None
+        if seq == last_seq:
+            return list()
+        if not entries or entries[0][0] != f"{seq + 1}-0".encode():
+            return None
+        return [fields[b"message"].decode() for _, fields in entries]
+
+    def _get_keys(self, channel: str) -> list[str]:
+        return [f"{channel}:seq", f"{channel}:events"]
@@ -0,0 +1,46 @@
+from redis.asyncio import Redis
+import uuid
+
+
+# KEYS: lease key; ARGV: token, ttl in ms
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lease key; ARGV: token
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """Exclusive lease on a key which expires unless renewed by its holder"""
+
+    def __init__(self, redis_client: Redis, key: str, ttl: float) -> None:
+        self._redis_client = redis_client
+        self._key = key
+        self._ttl_ms = int(ttl * 1000)
+        self._token = uuid.uuid4().hex
+        self._renew_script = redis_client.register_script(_RENEW_SCRIPT)
+        self._release_script = redis_client.register_script(_RELEASE_SCRIPT)
+
+    async def acquire(self) -> bool:
+        return bool(
+            await self._redis_client.set(self._key, self._token, nx=True, px=self._ttl_ms)
+        )
+
+    async def renew(self) -> bool:
+        return bool(
+            await self._renew_script(keys=[self._key], args=[self._token, self._ttl_ms])
+        )
+
+    async def release(self) -> bool:
+        return bool(
+            await self._release_script(keys=[self._key], args=[self._token])
+        )
@@ -1,6 +1,162 @@
-from redis import Redis
+from redis.asyncio import Redis
 from pydantic import BaseModel
-import json
+from dataclasses import dataclass
+
+
+# locks of a namespace live in one hash of "{owner_id}|{expires_at_ms}" per resource,
+# expired ones stay until the sweeper drops them from it and from this sorted set
+LOCK_EXPIRIES_KEY = "block-locks:expiries"
+
+# KEYS of scripts: locks, version, expiries
+# sets now to the current time in ms and defines helpers
+_SCRIPT_PRELUDE = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local function bump_version()
+    local version = redis.call('INCR', KEYS[2])
+    redis.call('EXPIRE', KEYS[2], 86400)
+    return version
+end
+
+-- owner of a lease, alive or not, and whether it is alive
+local function read_lock(resource_id)
+    local record = redis.call('HGET', KEYS[1], resource_id)
+    if not record then
+        return nil, false
+    end
+    local owner, expires_at = string.match(record, '^(.*)|(%d+)$')
+    return owner, tonumber(expires_at) > now
+end
+
+local function write_lock(namespace, resource_id, owner, ttl)
+    redis.call('HSET', KEYS[1], resource_id, owner .. '|' .. (now + ttl))
+    redis.call('ZADD', KEYS[3], now + ttl, namespace .. '|' .. resource_id)
+end
+
+local function delete_lock(namespace, resource_id)
+    redis.call('HDEL', KEYS[1], resource_id)
+    redis.call('ZREM', KEYS[3], namespace .. '|' .. resource_id)
+end
+"""
+
+# ARGV: namespace, owner id, ttl ms, resource id
+# returns version after locking or 0 when locked by another owner
+_LOCK_SCRIPT = _SCRIPT_PRELUDE + """
+local owner, alive = read_lock(ARGV[4])
+if alive and owner ~= ARGV[2] then
+    return 0
+end
+write_lock(ARGV[1], ARGV[4], ARGV[2], tonumber(ARGV[3]))
+return bump_version()
+"""
+
+# ARGV: namespace, owner id, resource id
+# returns version after releasing or 0 when locked by another owner
+_RELEASE_SCRIPT = _SCRIPT_PRELUDE + """
+local owner, alive = read_lock(ARGV[3])
+if alive and owner ~= ARGV[2] then
+    return 0
+end
+delete_lock(ARGV[1], ARGV[3])
+return bump_version()
+"""
+
+# ARGV: namespace, owner id, ttl ms, resource ids...
+# returns version after locking all or 0 when any is locked by another owner
+_LOCK_MANY_SCRIPT = _SCRIPT_PRELUDE + """
+for i = 4, #ARGV do
+    local owner, alive = read_lock(ARGV[i])
+    if alive and owner ~= ARGV[2] then
+        return 0
+    end
+end
+for i = 4, #ARGV do
+    write_lock(ARGV[1], ARGV[i], ARGV[2], tonumber(ARGV[3]))
+end
+return bump_version()
+"""
+
+# ARGV: namespace, owner id, resource ids...
+# returns version after releasing all or 0 when any is locked by another owner
+_RELEASE_MANY_SCRIPT = _SCRIPT_PRELUDE + """
+for i = 3, #ARGV do
+    local owner, alive = read_lock(ARGV[i])
+    if alive and owner ~= ARGV[2] then
+        return 0
+    end
+end
+for i = 3, #ARGV do
+    delete_lock(ARGV[1], ARGV[i])
+end
+return bump_version()
+"""
+
+# ARGV: namespace, owner id, ttl ms, resource ids...
+# returns resource ids whose alive leases of the owner were renewed
+_RENEW_SCRIPT = _SCRIPT_PRELUDE + """
+local renewed = {}
+for i = 4, #ARGV do
+    local owner, alive = read_lock(ARGV[i])
+    if alive and owner == ARGV[2] then
+        write_lock(ARGV[1], ARGV[i], ARGV[2], tonumber(ARGV[3]))
+        table.insert(renewed, ARGV[i])
+    end
+end
+return renewed
+"""
+
+# ARGV: namespace, owner id, resource ids...
+# returns version, 0 when nothing changed, followed by resource ids whose
+# alive leases of the owner were released
+_RELEASE_OWNED_SCRIPT = _SCRIPT_PRELUDE + """
+local result = {0}
+for i = 3, #ARGV do
+    local owner, alive = read_lock(ARGV[i])
+    if owner == ARGV[2] then
+        delete_lock(ARGV[1], ARGV[i])
+        if alive then
+            table.insert(result, ARGV[i])
+        end
+    end
+end
+if #result > 1 then
+    result[1] = bump_version()
+end
+return result
+"""
+
+# ARGV: namespace, resource id
+# returns owner of the lease and version when it expired and was dropped
+_EXPIRE_SCRIPT = _SCRIPT_PRELUDE + """
+local owner, alive = read_lock(ARGV[2])
+if alive then
+    return nil
+end
+delete_lock(ARGV[1], ARGV[2])
+if owner then
+    return {owner, bump_version()}
+end
+return nil
+"""
+
+# returns version, current time in ms and the flat locks hash
+_GET_LOCKS_SCRIPT = _SCRIPT_PRELUDE + """
+local result = {tonumber(redis.call('GET', KEYS[2]) or 0), now}
+for _, value in ipairs(redis.call('HGETALL', KEYS[1])) do
+    table.insert(result, value)
+end
+return result
+"""
+
+# ARGV: resource id
+_GET_OWNER_SCRIPT = _SCRIPT_PRELUDE + """
+local owner, alive = read_lock(ARGV[1])
+if alive then
+    return owner
+end
+return nil
+"""
 
 
 class LockRecord(BaseModel):
@@ -8,51 +164,160 @@ class LockRecord(BaseModel):
     owner_id: str | None
 
 
+@dataclass(frozen=True)
+class ExpiredLock:
+    resource_namespace: str
+    resource_id: str
+    owner_id: str
+    version: int
+
+
+@dataclass(frozen=True)
+class LockState:
+    """Alive locks of a namespace at version"""
+    version: int
+    owner_ids: dict[str, str]
+    # seconds left of every lease
+    expires_in: dict[str, float]
+
+
 class AlreadyLockedException(Exception): ...
 class UnauthorizedReleaseException(Exception): ...
 
 class LockManager:
+    """Leased locks of resources within a namespace, taken and released by atomic scripts"""
+
     def __init__(
         self,
         resource_namespace: str,
         redis_client: Redis,
+        ttl: float,
     ) -> None:
         self._redis_client = redis_client
-        self._storage_key = f"locks:{resource_namespace}"
+        self._namespace = resource_namespace
+        self._keys = _get_keys(resource_namespace)
+        self._ttl_ms = int(ttl * 1000)
+        self._lock_script = redis_client.register_script(_LOCK_SCRIPT)
+        self._release_script = redis_client.register_script(_RELEASE_SCRIPT)
+        self._lock_many_script = redis_client.register_script(_LOCK_MANY_SCRIPT)
+        self._release_many_script = redis_client.register_script(_RELEASE_MANY_SCRIPT)
+        self._renew_script = redis_client.register_script(_RENEW_SCRIPT)
+        self._release_owned_script = redis_client.register_script(_RELEASE_OWNED_SCRIPT)
+        self._get_owner_script = redis_client.register_script(_GET_OWNER_SCRIPT)
+        self._get_locks_script = redis_client.register_script(_GET_LOCKS_SCRIPT)
 
     async def lock(
         self,
         resource_id: str,
         user_id: str,
-    ) -> None:
-        lock = await self._get_lock(resource_id)
-        if lock.locked:
-            raise AlreadyLockedException()
+    ) -> int:
+        """Takes or renews the lease, returns the new version.
 
-        await self._update_lock(
-            resource_id=resource_id,
-            lock=LockRecord(
-                locked=True,
-                owner_id=user_id
-            )
+        Raises AlreadyLockedException.
+        """
+        version = await self._lock_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, self._ttl_ms, resource_id],
         )
+        if not version:
+            raise AlreadyLockedException()
+        return version
 
     async def release(
         self,
         resource_id: str,
         user_id: str,
-    ) -> None:
-        lock = await self._get_lock(resource_id)
-        if lock.locked and lock.owner_id != user_id:
+    ) -> int:
+        """Releases the lease, returns the new version.
+
+        Raises UnauthorizedReleaseException.
+        """
+        version = await self._release_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, resource_id],
+        )
+        if not version:
             raise UnauthorizedReleaseException()
+        return version
 
-        await self._update_lock(
-            resource_id=resource_id,
-            lock=LockRecord(
-                locked=False,
-                owner_id=None
-            )
+    async def lock_many(
+        self,
+        resource_ids: list[str],
+        user_id: str,
+    ) -> int:
+        """Takes or renews all leases or none, returns the new version.
+
+        Raises AlreadyLockedException.
+        """
+        if not resource_ids:
+            raise ValueError("resource_ids must not be empty")
+        version = await self._lock_many_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, self._ttl_ms, *resource_ids],
+        )
+        if not version:
+            raise AlreadyLockedException()
+        return version
+
+    async def release_many(
+        self,
+        resource_ids: list[str],
+        user_id: str,
+    ) -> int:
+        """Releases all leases or none, returns the new version.
+
+        Raises UnauthorizedReleaseException.
+        """
+        if not resource_ids:
+            raise ValueError("resource_ids must not be empty")
+        version = await self._release_many_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, *resource_ids],
+        )
+        if not version:
+            raise UnauthorizedReleaseException()
+        return version
+
+    async def renew(
+        self,
+        resource_ids: list[str],
+        user_id: str,
+    ) -> list[str]:
+        """Extends leases still held by the user, returns their resource ids"""
+        if not resource_ids:
+            return list()
+        renewed = await self._renew_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, self._ttl_ms, *resource_ids],
         )
+        return [resource_id.decode() for resource_id in renewed]
+
+    async def release_owned(
+        self,
+        resource_ids: list[str],
+        user_id: str,
+    ) -> tuple[list[str], int | None]:
+        """Releases leases still held by the user.
+
+        Returns their resource ids and the new version, None if nothing changed.
+        """
+        if not resource_ids:
+            return list(), None
+        version, *released = await self._release_owned_script(
+            keys=self._keys,
+            args=[self._namespace, user_id, *resource_ids],
+        )
+        return [resource_id.decode() for resource_id in released], version or None
+
+    async def get_locks(self) -> LockState:
+        version, now, *records = await self._get_locks_script(keys=self._keys)
+        owner_ids, expires_in = dict(), dict()
+        for resource_id, record in zip(records[::2], records[1::2]):
+            owner_id, expires_at = record.decode().rsplit("|", 1)
+            if int(expires_at) > now:
+                owner_ids[resource_id.decode()] = owner_id
+                expires_in[resource_id.decode()] = (int(expires_at) - now) / 1000
+        return LockState(version=version, owner_ids=owner_ids, expires_in=expires_in)
 
     async def is_locked(self, resource_id: str) -> bool:
         lock = await self._get_lock(resource_id)
@@ -66,24 +331,51 @@ class LockManager:
         lock = await self._get_lock(resource_id)
         return lock.locked and lock.owner_id == user_id
 
-    async def _get_lock_data(self) -> dict:
-        data = self._redis_client.get(self._storage_key)
-        return json.loads(data) if data else {}
-
     async def _get_lock(self, resource_id: str) -> LockRecord:
-        locks = await self._get_lock_data()
-        record = locks.get(resource_id)
-        return LockRecord(locked=False, owner_id=None) \
-            if record is None else LockRecord(**record)
+        owner_id = await self._get_owner_script(
+            keys=self._keys,
+            args=[resource_id],
+        )
+        if owner_id is None:
+            return LockRecord(locked=False, owner_id=None)
+        return LockRecord(locked=True, owner_id=owner_id.decode())
 
-    async def _update_lock(
-        self,
-        resource_id: str,
-        lock: LockRecord,
-    ) -> None:
-        locks = await self._get_lock_data()
-        locks[resource_id] = lock.model_dump()
-        self._redis_client.set(
-            self._storage_key,
-            json.dumps(locks)
+
+async def sweep_expired_locks(redis_client: Redis, limit: int) -> list[ExpiredLock]:
+    """Drops up to limit expired leases of all namespaces, returns the dropped ones"""
+    seconds, microseconds = await redis_client.time()
+    members = await redis_client.zrangebyscore(
+        LOCK_EXPIRIES_KEY,
+        min="-inf",
+        max=seconds * 1000 + microseconds // 1000,
+        start=0,
+        num=limit,
+    )
+    expire_script = redis_client.register_script(_EXPIRE_SCRIPT)
+    expired = list()
+    for member in members:
+        namespace, resource_id = member.decode().split("|", 1)
+        # the script keeps a lease renewed meanwhile
+        dropped = await expire_script(
+            keys=_get_keys(namespace),
+            args=[namespace, resource_id],
         )
+        if dropped is not None:
+            owner_id, version = dropped
+            expired.append(
+                ExpiredLock(
+                    resource_namespace=namespace,
+                    resource_id=resource_id,
+                    owner_id=owner_id.decode(),
+                    version=version,
+                )
+            )
+    return expired
+
+
+def _get_keys(resource_namespace: str) -> list[str]:
+    return [
+        f"block-locks:{resource_namespace}",
+        f"block-locks:{resource_namespace}:version",
+        LOCK_EXPIRIES_KEY,
+    ]
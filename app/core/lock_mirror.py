@@ -0,0 +1,115 @@
+import asyncio
+import time
+import typing
+import weakref
+
+from app.core.lock_manager import LockManager
+
+
+class LockMirror:
+    """Lock ownership of one namespace mirrored in the process, applied in version order"""
+
+    def __init__(self, lock_manager: LockManager, ttl: float) -> None:
+        self._lock_manager = lock_manager
+        self._ttl = ttl
+        self._owner_ids: dict[str, str] = dict()
+        # by the monotonic clock, for changes of this process and reconciled
+        # locks never later than the lease in Redis
+        self._expires_at: dict[str, float] = dict()
+        self._version = 0
+        self._reconcile_lock = asyncio.Lock()
+        self.is_stale = True
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def is_locked_by(self, resource_id: str, user_id: str) -> bool:
+        """Positive only while the mirror is trusted, otherwise ask Redis"""
+        if self.is_stale or self._owner_ids.get(resource_id) != user_id:
+            return False
+        return self._expires_at[resource_id] > time.monotonic()
+
+    def apply_locked(
+        self,
+        resource_ids: typing.Iterable[str],
+        owner_id: str,
+        version: int | None,
+        expires_at: float | None = None,
+    ) -> None:
+        """Applies a lock change, expires_at defaults to ttl from now"""
+        if not self._advance(version):
+            return
+        if expires_at is None:
+            expires_at = time.monotonic() + self._ttl
+        for resource_id in resource_ids:
+            self._owner_ids[resource_id] = owner_id
+            self._expires_at[resource_id] = expires_at
+
+    def apply_released(
+        self,
+        resource_ids: typing.Iterable[str],
+        version: int | None,
+    ) -> None:
+        self._advance(version)
+        for resource_id in resource_ids:
+            self._owner_ids.pop(resource_id, None)
+            self._expires_at.pop(resource_id, None)
+
+    def apply_renewed(
+        self,
+        resource_ids: typing.Iterable[str],
+        owner_id: str,
+        expires_at: float,
+    ) -> None:
+        """Extends leases of the owner, renewals do not change the version"""
+        for resource_id in resource_ids:
+            if self._owner_ids.get(resource_id) == owner_id:
+                self._expires_at[resource_id] = expires_at
+
+    async def reconcile(self) -> None:
+        """Replaces the mirror with the locks in Redis"""
+        async with self._reconcile_lock:
+            if not self.is_stale:
+                return
+            started_at = time.monotonic()
+            state = await self._lock_manager.get_locks()
+            if state.version < self._version:
+                # a newer change arrived meanwhile, the next check retries
+                return
+            self._version = state.version
+            self._owner_ids = dict(state.owner_ids)
+            self._expires_at = {
+                resource_id: started_at + expires_in
+                for resource_id, expires_in in state.expires_in.items()
+            }
+            self.is_stale = False
+
+    def _advance(self, version: int | None) -> bool:
+        """Moves to the version, returns False for an already applied one"""
+        if version is None:
+            # published without a version, e.g. by an older process
+            self.is_stale = True
+            return True
+        if version <= self._version:
+            return False
+        if version != self._version + 1:
+            self.is_stale = True
+        self._version = version
+        return True
+
+
+class LockMirrorRegistry:
+    """Mirrors of the process, one per namespace while anyone holds it"""
+
+    def __init__(self) -> None:
+        self._mirrors: weakref.WeakValueDictionary[str, LockMirror] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def get(self, lock_manager: LockManager, namespace: str, ttl: float) -> LockMirror:
+        mirror = self._mirrors.get(namespace)
+        if mirror is None:
+            mirror = LockMirror(lock_manager, ttl=ttl)
+            self._mirrors[namespace] = mirror
+        return mirror
@@ -1,8 +1,12 @@
 from enum import Enum, auto
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
+import typing
 import json
 
+if typing.TYPE_CHECKING:
+    from .document_hub import Transaction
+
 
 class ResponseType(Enum):
     UNICAST = auto()
@@ -13,6 +17,11 @@ class ResponseType(Enum):
 class Response:
     message: str
     response_type: ResponseType
+    # a broadcast superseding earlier ones of the connection with the same key
+    coalesce_key: typing.Hashable | None = None
+    # writes of the broadcast run in one transaction with its sequencing,
+    # dropped together with a superseded broadcast
+    transaction: 'Transaction | None' = None
 
 
 class RequestHandlingException(Exception):
@@ -33,5 +42,24 @@ class RequestHandlingException(Exception):
 
 
 class BaseMessageHandler(ABC):
+    # seconds between heartbeat calls while the connection is alive, None disables them
+    heartbeat_interval: float | None = None
+
     @abstractmethod
-    async def handle_message(self, message: str) -> Response: ...
+    async def handle_message(self, message: str | typing.Any) -> Response:
+        """Handles json text or an object decoded by a binary codec"""
+
+    async def snapshot(self) -> tuple[str, int] | None:
+        """State the connection starts from and the sequence number of the
+        last event it includes, None when clients start without one"""
+        return None
+
+    def observe_broadcast(self, message: str) -> None:
+        """Sees every message broadcast to the connection before it is sent"""
+
+    async def heartbeat(self) -> None:
+        """Keeps state bound to the connection alive, e.g. renews leases"""
+
+    async def close(self) -> list[Response]:
+        """Drops state bound to the ended connection, returns responses for the others"""
+        return list()
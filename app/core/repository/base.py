@@ -1,5 +1,16 @@
 from abc import ABC, abstractmethod
 import typing
+from .pagination import PageCursor
+
+
+class InvalidIdException(ValueError): ...
+
+
+class UpdatesFailedException(Exception):
+    def __init__(self, failed_indexes: set[int]) -> None:
+        # positions of failed updates in the applied list
+        self.failed_indexes = failed_indexes
+        super().__init__(f"{len(failed_indexes)} updates failed")
 
 
 class BaseRepository(ABC):
@@ -11,7 +22,11 @@ class BaseRepository(ABC):
         offset: int,
         name: str | None,
         exclude_fields: list[str] | None,
+        is_deleted: bool,
+        cursor: PageCursor | None,
+        include_fields: list[str] | None,
     ) -> list[dict]:
+        """Page of documents ordered by (created_at, _id) descending, after cursor if provided"""
         ...
 
     @abstractmethod
@@ -19,14 +34,31 @@ class BaseRepository(ABC):
         self,
         owner_id: typing.Any,
         name: str | None,
+        is_deleted: bool,
     ) -> int:
         ...
 
+    @abstractmethod
+    async def get_documents_with_count(
+        self,
+        owner_id: typing.Any,
+        limit: int,
+        offset: int,
+        name: str | None,
+        exclude_fields: list[str] | None,
+        is_deleted: bool,
+        cursor: PageCursor | None,
+        include_fields: list[str] | None,
+    ) -> tuple[list[dict], int]:
+        """Same page as get_documents along with count_documents total"""
+        ...
+
     @abstractmethod
     async def get_document(
         self,
         id: typing.Any,
         owner_id: typing.Any | None,
+        include_fields: list[str] | None,
     ) -> dict | None:
         ...
 
@@ -61,3 +93,58 @@ class BaseRepository(ABC):
         owner_id: typing.Any,
     ) -> dict | None:
         ...
+
+    @abstractmethod
+    async def get_documents_by_ids(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+        include_fields: list[str] | None,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def insert_documents(
+        self,
+        documents: list[dict],
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def update_documents(
+        self,
+        changes: dict[typing.Any, dict[str, typing.Any]],
+        owner_id: typing.Any | None,
+    ) -> int:
+        """Sets changes of every document id, returns amount of matched documents.
+
+        Unlike update_document, None values are written as is.
+        """
+        ...
+
+    @abstractmethod
+    async def apply_updates(
+        self,
+        updates: list[tuple[typing.Any, dict[str, typing.Any], dict[str, typing.Any]]],
+        owner_id: typing.Any | None,
+        ordered: bool = True,
+    ) -> int:
+        """Applies (id, filter, update) updates not touching name, returns amount of matched ones.
+        Unordered ones are all tried and UpdatesFailedException tells the failed ones"""
+        ...
+
+    @abstractmethod
+    async def mark_documents_as_deleted(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+    ) -> int:
+        ...
+
+    @abstractmethod
+    async def restore_documents(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+    ) -> int:
+        ...
@@ -0,0 +1,381 @@
+from .base import BaseRepository
+from .pagination import PageCursor
+
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+import contextlib
+import asyncio
+import logging
+import typing
+import time
+import bson
+
+
+logger = logging.getLogger(__name__)
+
+# seconds between attempts to subscribe to invalidations again
+RESUBSCRIBE_MIN_DELAY = 0.1
+RESUBSCRIBE_MAX_DELAY = 5
+
+# KEYS: entry, generation
+# ARGV: encoded document, ttl seconds, generation read before loading
+# stores the loaded document unless it was invalidated meanwhile
+_STORE_LOADED_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+@dataclass
+class CacheStats:
+    l1_hits: int = 0
+    l2_hits: int = 0
+    misses: int = 0
+    l1_evictions: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class LocalCache:
+    """Bounded LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size: int, ttl: float, stats: CacheStats) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._stats = stats
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats.l1_evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CachingRepository(BaseRepository):
+    """Read-through cache of get_document in a per-process LRU (L1) and in Redis (L2)"""
+
+    def __init__(
+        self,
+        repository: BaseRepository,
+        redis_client: Redis,
+        namespace: str,
+        l1_max_size: int = 1024,
+        l1_ttl: float = 5,
+        l2_ttl: int = 60,
+    ) -> None:
+        self._repository = repository
+        self._redis_client = redis_client
+        self._namespace = namespace
+        self._l2_ttl = l2_ttl
+        self._channel_name = f"cache-invalidation:{namespace}"
+
+        self.stats = CacheStats()
+        self._l1 = LocalCache(max_size=l1_max_size, ttl=l1_ttl, stats=self.stats)
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task | None = None
+        self._store_loaded_script = redis_client.register_script(_STORE_LOADED_SCRIPT)
+
+    async def start(self) -> None:
+        self._pubsub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen_invalidations())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    def get_stats(self) -> dict[str, int]:
+        return {**self.stats.as_dict(), "l1_size": len(self._l1)}
+
+    async def get_document(
+        self,
+        id: typing.Any,
+        owner_id: typing.Any | None,
+        include_fields: list[str] | None = None,
+    ) -> dict | None:
+        if include_fields is not None:
+            return await self._repository.get_document(
+                id=id,
+                owner_id=owner_id,
+                include_fields=include_fields,
+            )
+
+        key = str(id)
+        generation = None
+        encoded = self._l1.get(key)
+        if encoded is not None:
+            self.stats.l1_hits += 1
+        else:
+            async with self._redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.get(self._get_key(key))
+                pipeline.get(self._get_generation_key(key))
+                encoded, generation = await pipeline.execute()
+            if encoded is not None:
+                self.stats.l2_hits += 1
+                self._l1.set(key, encoded)
+
+        if encoded is not None:
+            document = bson.decode(encoded)
+        else:
+            self.stats.misses += 1
+            # loaded without owner filter, so the entry serves any owner check
+            document = await self._repository.get_document(id=id, owner_id=None)
+            if document is None:
+                return None
+            encoded = bson.encode(document)
+            if await self._store_loaded_script(
+                keys=[self._get_key(key), self._get_generation_key(key)],
+                args=[encoded, self._l2_ttl, generation or b""],
+            ):
+                self._l1.set(key, encoded)
+
+        if owner_id is not None and document.get("owner_id") != owner_id:
+            return None
+        return document
+
+    async def get_documents(
+        self,
+        owner_id: typing.Any,
+        limit: int,
+        offset: int,
+        is_deleted: bool = False,
+        name: str | None = None,
+        exclude_fields: list[str] | None = None,
+        cursor: PageCursor | None = None,
+        include_fields: list[str] | None = None,
+    ) -> list[dict]:
+        return await self._repository.get_documents(
+            owner_id=owner_id,
+            limit=limit,
+            offset=offset,
+            is_deleted=is_deleted,
+            name=name,
+            exclude_fields=exclude_fields,
+            cursor=cursor,
+            include_fields=include_fields,
+        )
+
+    async def count_documents(
+        self,
+        owner_id: typing.Any,
+        name: str | None = None,
+        is_deleted: bool = False,
+    ) -> int:
+        return await self._repository.count_documents(
+            owner_id=owner_id,
+            name=name,
+            is_deleted=is_deleted,
+        )
+
+    async def get_documents_with_count(
+        self,
+        owner_id: typing.Any,
+        limit: int,
+        offset: int,
+        is_deleted: bool = False,
+        name: str | None = None,
+        exclude_fields: list[str] | None = None,
+        cursor: PageCursor | None = None,
+        include_fields: list[str] | None = None,
+    ) -> tuple[list[dict], int]:
+        return await self._repository.get_documents_with_count(
+            owner_id=owner_id,
+            limit=limit,
+            offset=offset,
+            is_deleted=is_deleted,
+            name=name,
+            exclude_fields=exclude_fields,
+            cursor=cursor,
+            include_fields=include_fields,
+        )
+
+    async def get_documents_by_ids(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+        include_fields: list[str] | None = None,
+    ) -> list[dict]:
+        return await self._repository.get_documents_by_ids(
+            ids=ids,
+            owner_id=owner_id,
+            include_fields=include_fields,
+        )
+
+    async def insert_document(self, document: dict) -> dict:
+        return await self._repository.insert_document(document=document)
+
+    async def insert_documents(self, documents: list[dict]) -> list[dict]:
+        return await self._repository.insert_documents(documents=documents)
+
+    async def update_document(
+        self,
+        id: typing.Any,
+        changes: dict[str, typing.Any],
+        owner_id: typing.Any,
+    ) -> dict | None:
+        document = await self._repository.update_document(
+            id=id,
+            changes=changes,
+            owner_id=owner_id,
+        )
+        if document is not None:
+            await self.invalidate([id])
+        return document
+
+    async def update_documents(
+        self,
+        changes: dict[typing.Any, dict[str, typing.Any]],
+        owner_id: typing.Any | None,
+    ) -> int:
+        matched_amount = await self._repository.update_documents(
+            changes=changes,
+            owner_id=owner_id,
+        )
+        await self.invalidate(list(changes))
+        return matched_amount
+
+    async def apply_updates(
+        self,
+        updates: list[tuple[typing.Any, dict[str, typing.Any], dict[str, typing.Any]]],
+        owner_id: typing.Any | None,
+        ordered: bool = True,
+    ) -> int:
+        try:
+            return await self._repository.apply_updates(
+                updates=updates,
+                owner_id=owner_id,
+                ordered=ordered,
+            )
+        finally:
+            # failed updates may still follow applied ones
+            await self.invalidate(list({id: None for id, _, _ in updates}))
+
+    async def delete_document(self, id: typing.Any, owner_id: typing.Any) -> bool:
+        is_deleted = await self._repository.delete_document(id=id, owner_id=owner_id)
+        if is_deleted:
+            await self.invalidate([id])
+        return is_deleted
+
+    async def mark_document_as_deleted(
+        self,
+        id: typing.Any,
+        owner_id: typing.Any,
+    ) -> dict | None:
+        document = await self._repository.mark_document_as_deleted(
+            id=id,
+            owner_id=owner_id,
+        )
+        if document is not None:
+            await self.invalidate([id])
+        return document
+
+    async def mark_documents_as_deleted(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+    ) -> int:
+        affected_amount = await self._repository.mark_documents_as_deleted(
+            ids=ids,
+            owner_id=owner_id,
+        )
+        await self.invalidate(ids)
+        return affected_amount
+
+    async def restore_documents(
+        self,
+        ids: list[typing.Any],
+        owner_id: typing.Any | None,
+    ) -> int:
+        affected_amount = await self._repository.restore_documents(
+            ids=ids,
+            owner_id=owner_id,
+        )
+        await self.invalidate(ids)
+        return affected_amount
+
+    async def invalidate(self, ids: list[typing.Any]) -> None:
+        if not ids:
+            return
+        keys = [str(id) for id in ids]
+        for key in keys:
+            self._l1.delete(key)
+        async with self._redis_client.pipeline() as pipeline:
+            for key in keys:
+                pipeline.incr(self._get_generation_key(key))
+                # outlives loads which started before the invalidation
+                pipeline.expire(self._get_generation_key(key), self._l2_ttl)
+            pipeline.delete(*[self._get_key(key) for key in keys])
+            for key in keys:
+                pipeline.publish(self._channel_name, key)
+            await pipeline.execute()
+        self.stats.invalidations += len(keys)
+
+    async def _subscribe(self) -> PubSub:
+        pubsub = self._redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._channel_name)
+        except BaseException:
+            await pubsub.aclose()
+            raise
+        return pubsub
+
+    async def _listen_invalidations(self) -> None:
+        delay = RESUBSCRIBE_MIN_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = await self._subscribe()
+                    self._l1.clear()
+                async for message in self._pubsub.listen():
+                    delay = RESUBSCRIBE_MIN_DELAY
+                    self._l1.delete(message["data"].decode())
+            except RedisError as e:
+                logger.warning(
+                    "invalidations of %s are not received, subscribing again in %ss: %s",
+                    self._namespace, delay, e,
+                )
+            if self._pubsub is not None:
+                with contextlib.suppress(RedisError):
+                    await self._pubsub.aclose()
+                self._pubsub = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_DELAY)
+
+    def _get_key(self, id: str) -> str:
+        return f"cache:{self._namespace}:{id}"
+
+    def _get_generation_key(self, id: str) -> str:
+        return f"cache:{self._namespace}:{id}:generation"
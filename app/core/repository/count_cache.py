@@ -0,0 +1,74 @@
+from redis.asyncio import Redis
+import typing
+
+
+# KEYS: totals, generation
+# ARGV: field, amount, ttl seconds, generation read before counting
+# stores the counted total unless the totals were invalidated meanwhile
+_SET_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[4] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class CountCache:
+    """Per-owner cache of list totals keyed by (is_deleted, name filter)"""
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        namespace: str,
+        ttl: int,
+    ) -> None:
+        self._redis_client = redis_client
+        self._namespace = namespace
+        self._ttl = ttl
+        self._set_script = redis_client.register_script(_SET_SCRIPT)
+
+    async def get(
+        self,
+        owner_id: typing.Any,
+        name: str | None,
+        is_deleted: bool,
+    ) -> tuple[int | None, bytes | None]:
+        """Cached total and the generation to set a counted one with"""
+        async with self._redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.hget(self._get_key(owner_id), self._get_field(name, is_deleted))
+            pipeline.get(self._get_generation_key(owner_id))
+            amount, generation = await pipeline.execute()
+        return int(amount) if amount is not None else None, generation
+
+    async def set(
+        self,
+        owner_id: typing.Any,
+        name: str | None,
+        is_deleted: bool,
+        amount: int,
+        generation: bytes | None,
+    ) -> None:
+        await self._set_script(
+            keys=[self._get_key(owner_id), self._get_generation_key(owner_id)],
+            args=[self._get_field(name, is_deleted), amount, self._ttl, generation or b""],
+        )
+
+    async def invalidate(self, owner_id: typing.Any) -> None:
+        generation_key = self._get_generation_key(owner_id)
+        async with self._redis_client.pipeline() as pipeline:
+            pipeline.incr(generation_key)
+            # outlives counts which started before the invalidation
+            pipeline.expire(generation_key, self._ttl)
+            pipeline.delete(self._get_key(owner_id))
+            await pipeline.execute()
+
+    def _get_key(self, owner_id: typing.Any) -> str:
+        return f"counts:{self._namespace}:{owner_id}"
+
+    def _get_generation_key(self, owner_id: typing.Any) -> str:
+        return f"counts:{self._namespace}:{owner_id}:generation"
+
+    def _get_field(self, name: str | None, is_deleted: bool) -> str:
+        return f"{int(is_deleted)}:{name or ''}"
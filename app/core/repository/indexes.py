@@ -0,0 +1,61 @@
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from pymongo.asynchronous.collection import AsyncCollection
+import typing
+
+
+# index with the same name exists, but with different keys or options
+_INDEX_CONFLICT_CODES = (85, 86)
+
+
+class QueryPlanException(Exception):
+    def __init__(self, collection_name: str, queries: list[str]) -> None:
+        self.collection_name = collection_name
+        self.queries = queries
+        super().__init__(
+            f"queries on collection {collection_name} would do a collection "
+            f"scan: {', '.join(queries)}. Declare an index serving them"
+        )
+
+
+class IndexConflictException(Exception):
+    def __init__(self, collection_name: str, index_name: str) -> None:
+        self.collection_name = collection_name
+        self.index_name = index_name
+        super().__init__(
+            f"index {index_name} of collection {collection_name} differs from "
+            f"the declared one. Rebuild it with `cli-tools ensure_indexes --rebuild`"
+        )
+
+
+async def apply_indexes(
+    collection: AsyncCollection,
+    indexes: list[IndexModel],
+    rebuild: bool = False,
+) -> None:
+    """Creates declared indexes, changed ones are recreated if rebuild"""
+    for index in indexes:
+        try:
+            await collection.create_indexes([index])
+        except OperationFailure as e:
+            if e.code not in _INDEX_CONFLICT_CODES:
+                raise
+            if not rebuild:
+                raise IndexConflictException(collection.name, index.document["name"])
+            await collection.drop_index(index.document["name"])
+            await collection.create_indexes([index])
+
+
+def has_plan_stage(explain: typing.Any, stage: str) -> bool:
+    """Whether a winning plan of explain output contains the stage"""
+    if isinstance(explain, dict):
+        if explain.get("stage") == stage:
+            return True
+        return any(
+            has_plan_stage(value, stage)
+            for key, value in explain.items()
+            if key != "rejectedPlans"
+        )
+    if isinstance(explain, list):
+        return any(has_plan_stage(value, stage) for value in explain)
+    return False
@@ -1,16 +1,56 @@
-from .base import BaseRepository
+from .base import BaseRepository, InvalidIdException, UpdatesFailedException
+from .pagination import PageCursor
+from .count_cache import CountCache
+from .name_search import NameSearch, RegexNameSearch, SCORE_FIELD
+from .indexes import apply_indexes, has_plan_stage, QueryPlanException
 
 import pymongo
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
 from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.asynchronous.collection import AsyncCollection
 from typing import Any
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+
+
+PAGE_SORT = [("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
 
 
 class MongoRepository(BaseRepository):
-    def __init__(self, collection: AsyncCollection) -> None:
+    def __init__(
+        self,
+        collection: AsyncCollection,
+        indexes: list[IndexModel] | None = None,
+        count_cache: CountCache | None = None,
+        name_search: NameSearch | None = None,
+    ) -> None:
         self._collection = collection
+        self._count_cache = count_cache
+        self._name_search = name_search if name_search else RegexNameSearch()
+        self._indexes = (indexes if indexes else list()) \
+            + self._name_search.get_indexes()
+
+    async def ensure_indexes(self, rebuild: bool = False) -> None:
+        """Raises IndexConflictException if a declared index changed, unless rebuild"""
+        await apply_indexes(self._collection, self._indexes, rebuild=rebuild)
+
+    async def verify_query_plans(self) -> None:
+        """Explains the queries this repository issues.
+
+        Raises QueryPlanException if any of them would scan the collection.
+        """
+        collection_scans = list()
+        for query_name, command in self._get_query_samples().items():
+            explain = await self._collection.database.command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            if has_plan_stage(explain, "COLLSCAN"):
+                collection_scans.append(query_name)
+
+        if collection_scans:
+            raise QueryPlanException(self._collection.name, collection_scans)
 
     async def get_documents(
         self,
@@ -20,43 +60,139 @@ class MongoRepository(BaseRepository):
         is_deleted: bool = False,
         name: str | None = None,
         exclude_fields: list[str] | None = None,
+        cursor: PageCursor | None = None,
+        include_fields: list[str] | None = None,
     ) -> list[dict]:
-        if limit > 0:
-            return await self._collection.find(
-                filter=self._construct_filter(owner_id=owner_id, name=name),
-                projection=self._construct_projection(exclude_fields)
-            ).skip(offset).limit(limit).to_list(None)
-        else:
+        if limit <= 0:
             return list()
 
+        filter = self._construct_filter(
+            owner_id=owner_id,
+            name=name,
+            is_deleted=is_deleted,
+            cursor=cursor,
+        )
+        projection = self._construct_projection(
+            exclude_fields=exclude_fields,
+            include_fields=include_fields,
+        )
+
+        if self._is_ranked(name, cursor):
+            command_cursor = await self._collection.aggregate(
+                self._construct_ranked_pipeline(
+                    filter=filter,
+                    name=name,
+                    offset=offset,
+                    limit=limit,
+                    projection=projection,
+                )
+            )
+            return await command_cursor.to_list(None)
+
+        documents = self._collection.find(
+            filter=filter,
+            projection=projection,
+            sort=PAGE_SORT,
+        )
+        if cursor is None:
+            documents = documents.skip(offset)
+        return await documents.limit(limit).to_list(None)
+
     async def count_documents(
         self,
         owner_id: str,
         name: str | None = None,
+        is_deleted: bool = False,
     ) ->  int:
-        return await self._collection.count_documents(
-            filter=self._construct_filter(
+        total_amount, generation = await self._get_cached_count(owner_id, name, is_deleted)
+        if total_amount is None:
+            total_amount = await self._collection.count_documents(
+                filter=self._construct_filter(
+                    owner_id=owner_id,
+                    name=name,
+                    is_deleted=is_deleted,
+                )
+            )
+            await self._set_cached_count(owner_id, name, is_deleted, total_amount, generation)
+        return total_amount
+
+    async def get_documents_with_count(
+        self,
+        owner_id: str,
+        limit: int,
+        offset: int,
+        is_deleted: bool = False,
+        name: str | None = None,
+        exclude_fields: list[str] | None = None,
+        cursor: PageCursor | None = None,
+        include_fields: list[str] | None = None,
+    ) -> tuple[list[dict], int]:
+        total_amount, generation = await self._get_cached_count(owner_id, name, is_deleted)
+
+        # the total is counted over the whole filter, not the part after
+        # the cursor, so cursor pages keep the indexed find + count
+        if total_amount is not None or limit <= 0 or cursor is not None:
+            documents = await self.get_documents(
                 owner_id=owner_id,
-                name=name
+                limit=limit,
+                offset=offset,
+                is_deleted=is_deleted,
+                name=name,
+                exclude_fields=exclude_fields,
+                cursor=cursor,
+                include_fields=include_fields,
+            )
+            if total_amount is None:
+                total_amount = await self.count_documents(
+                    owner_id=owner_id,
+                    name=name,
+                    is_deleted=is_deleted,
+                )
+            return documents, total_amount
+
+        command_cursor = await self._collection.aggregate(
+            self._construct_facet_pipeline(
+                filter=self._construct_filter(
+                    owner_id=owner_id,
+                    name=name,
+                    is_deleted=is_deleted,
+                ),
+                name=name,
+                offset=offset,
+                limit=limit,
+                projection=self._construct_projection(
+                    exclude_fields=exclude_fields,
+                    include_fields=include_fields,
+                ),
             )
         )
+        result = (await command_cursor.to_list(None))[0]
+        total_amount = result["total"][0]["amount"] if result["total"] else 0
+        await self._set_cached_count(owner_id, name, is_deleted, total_amount, generation)
+
+        return result["content"], total_amount
 
     async def get_document(
         self,
         id: str | ObjectId,
         owner_id: str | None,
+        include_fields: list[str] | None = None,
     ) -> dict | None:
         return await self._collection.find_one(
-            filter=self._construct_filter(id=id, owner_id=owner_id)
+            filter=self._construct_filter(id=id, owner_id=owner_id),
+            projection=self._construct_projection(include_fields=include_fields),
         )
 
     async def insert_document(
         self,
         document: dict,
     ) -> dict:
-        insert_result = await self._collection.insert_one(document)
+        # insert_one sets _id of the passed document, so it is returned as stored
+        document = self._name_search.annotate(document)
+        await self._collection.insert_one(document)
+        await self._invalidate_cached_counts(document["owner_id"])
 
-        return await self.get_document(id=insert_result.inserted_id, owner_id=None)
+        return document
 
     async def update_document(
         self,
@@ -64,7 +200,9 @@ class MongoRepository(BaseRepository):
         changes: dict[str, Any],
         owner_id: str | None,
     ) -> dict | None:
-        valuable_fields = {k: v for k, v in changes.items() if v is not None}
+        valuable_fields = self._name_search.annotate(
+            {k: v for k, v in changes.items() if v is not None}
+        )
 
         filter = self._construct_filter(id=id, owner_id=owner_id)
         if len(valuable_fields) == 0:
@@ -73,48 +211,387 @@ class MongoRepository(BaseRepository):
             document = await self._collection.find_one_and_update(
                 filter=filter,
                 update={"$set": valuable_fields},
-                return_document=True
+                return_document=pymongo.ReturnDocument.AFTER,
             )
+            # a rename or a restore moves the document between cached totals
+            if document is not None and valuable_fields.keys() & {"name", "is_deleted"}:
+                await self._invalidate_cached_counts(document["owner_id"])
 
         return document
 
     async def delete_document(self, id: str, owner_id: str | None) -> bool:
-        delete_result = await self._collection.delete_one(
-            filter=self._construct_filter(id=id, owner_id=owner_id)
+        document = await self._collection.find_one_and_delete(
+            filter=self._construct_filter(id=id, owner_id=owner_id),
+            projection={"owner_id": 1},
         )
+        if document is not None:
+            await self._invalidate_cached_counts(document["owner_id"])
 
-        return delete_result.deleted_count == 1
+        return document is not None
 
     async def mark_document_as_deleted(self, id: str, owner_id: str | None) -> dict | None:
         document = await self._collection.find_one_and_update(
             filter=self._construct_filter(id=id, owner_id=owner_id),
-            update={"$set": {"is_deleted": True, "deleted_at": datetime.now()}}
+            update={"$set": {"is_deleted": True, "deleted_at": datetime.now()}},
+            return_document=pymongo.ReturnDocument.AFTER,
         )
+        if document is not None:
+            await self._invalidate_cached_counts(document["owner_id"])
         return document
 
+    async def get_documents_by_ids(
+        self,
+        ids: list[str | ObjectId],
+        owner_id: str | None,
+        include_fields: list[str] | None = None,
+    ) -> list[dict]:
+        if not ids:
+            return list()
+        return await self._collection.find(
+            filter=self._construct_filter(ids=ids, owner_id=owner_id),
+            projection=self._construct_projection(include_fields=include_fields),
+            sort=PAGE_SORT,
+        ).to_list(None)
+
+    async def insert_documents(
+        self,
+        documents: list[dict],
+    ) -> list[dict]:
+        if not documents:
+            return list()
+        documents = [self._name_search.annotate(d) for d in documents]
+        await self._collection.insert_many(documents)
+        for owner_id in {d["owner_id"] for d in documents}:
+            await self._invalidate_cached_counts(owner_id)
+        return documents
+
+    async def update_documents(
+        self,
+        changes: dict[str | ObjectId, dict[str, Any]],
+        owner_id: str | None,
+    ) -> int:
+        if not changes:
+            return 0
+
+        result = await self._collection.bulk_write(
+            [
+                UpdateOne(
+                    filter=self._construct_filter(id=id, owner_id=owner_id),
+                    update={"$set": self._name_search.annotate(document_changes)},
+                )
+                for id, document_changes in changes.items()
+            ],
+            ordered=False,
+        )
+
+        if any(c.keys() & {"name", "is_deleted"} for c in changes.values()):
+            await self._invalidate_owners_cached_counts(list(changes), owner_id)
+
+        return result.matched_count
+
+    async def apply_updates(
+        self,
+        updates: list[tuple[str | ObjectId, dict[str, Any], dict[str, Any]]],
+        owner_id: str | None,
+        ordered: bool = True,
+    ) -> int:
+        if not updates:
+            return 0
+
+        try:
+            result = await self._collection.bulk_write(
+                [
+                    UpdateOne(
+                        filter={
+                            **update_filter,
+                            **self._construct_filter(id=id, owner_id=owner_id),
+                        },
+                        update=update,
+                    )
+                    for id, update_filter, update in updates
+                ],
+                ordered=ordered,
+            )
+        except BulkWriteError as e:
+            # unacknowledged writes fail all of them
+            if ordered or e.details.get("writeConcernErrors"):
+                raise
+            raise UpdatesFailedException(
+                {error["index"] for error in e.details["writeErrors"]}
+            ) from e
+        return result.matched_count
+
+    async def mark_documents_as_deleted(
+        self,
+        ids: list[str | ObjectId],
+        owner_id: str | None,
+    ) -> int:
+        return await self._set_documents_deleted(ids, owner_id, is_deleted=True)
+
+    async def restore_documents(
+        self,
+        ids: list[str | ObjectId],
+        owner_id: str | None,
+    ) -> int:
+        return await self._set_documents_deleted(ids, owner_id, is_deleted=False)
+
+    async def _set_documents_deleted(
+        self,
+        ids: list[str | ObjectId],
+        owner_id: str | None,
+        is_deleted: bool,
+    ) -> int:
+        if not ids:
+            return 0
+
+        result = await self._collection.update_many(
+            filter=self._construct_filter(
+                ids=ids,
+                owner_id=owner_id,
+                is_deleted=not is_deleted,
+            ),
+            update={"$set": {
+                "is_deleted": is_deleted,
+                "deleted_at": datetime.now() if is_deleted else None,
+            }},
+        )
+        if result.modified_count > 0:
+            await self._invalidate_owners_cached_counts(ids, owner_id)
+
+        return result.modified_count
+
+    async def _invalidate_owners_cached_counts(
+        self,
+        ids: list[str | ObjectId],
+        owner_id: str | None,
+    ) -> None:
+        if self._count_cache is None:
+            return
+        owner_ids = [owner_id] if owner_id is not None else \
+            await self._collection.distinct(
+                "owner_id",
+                filter=self._construct_filter(ids=ids),
+            )
+        for owner_id in owner_ids:
+            await self._invalidate_cached_counts(owner_id)
+
+    async def _get_cached_count(
+        self,
+        owner_id: str,
+        name: str | None,
+        is_deleted: bool,
+    ) -> tuple[int | None, bytes | None]:
+        if self._count_cache is None:
+            return None, None
+        return await self._count_cache.get(
+            owner_id=owner_id,
+            name=name,
+            is_deleted=is_deleted,
+        )
+
+    async def _set_cached_count(
+        self,
+        owner_id: str,
+        name: str | None,
+        is_deleted: bool,
+        amount: int,
+        generation: bytes | None,
+    ) -> None:
+        if self._count_cache is not None:
+            await self._count_cache.set(
+                owner_id=owner_id,
+                name=name,
+                is_deleted=is_deleted,
+                amount=amount,
+                generation=generation,
+            )
+
+    async def _invalidate_cached_counts(self, owner_id: str) -> None:
+        if self._count_cache is not None:
+            await self._count_cache.invalidate(owner_id)
+
     def _construct_filter(
         self,
         id: str | ObjectId | None = None,
         owner_id: str | None = None,
         name: str | None = None,
         is_deleted: bool | None = None,
+        cursor: PageCursor | None = None,
+        ids: list[str | ObjectId] | None = None,
     ) -> dict:
         filter = dict()
         if id is not None:
-            filter["_id"] = id if isinstance(id, ObjectId) else ObjectId(id)
+            filter["_id"] = self._to_object_id(id)
+        if ids is not None:
+            filter["_id"] = {"$in": [self._to_object_id(i) for i in ids]}
         if owner_id is not None:
             filter["owner_id"] = owner_id
-        if name is not None:
-           filter["name"] = {
-               "$regex": f".*{name}.*",
-               "$options": "i"
-           }
+        if name:
+            filter.update(self._name_search.construct_filter(name))
         if is_deleted is not None:
             filter["is_deleted"] = is_deleted
+        if cursor is not None:
+            filter["$or"] = [
+                {"created_at": {"$lt": cursor.created_at}},
+                {"created_at": cursor.created_at, "_id": {"$lt": cursor.id}},
+            ]
 
         return filter
 
-    def _construct_projection(self, exclude_fields: list[str] | None) -> dict:
-        if exclude_fields is None:
-            return dict()
-        return {k: 0 for k in exclude_fields}
+    def _construct_ranked_pipeline(
+        self,
+        filter: dict,
+        name: str,
+        offset: int,
+        limit: int,
+        projection: dict | None,
+    ) -> list[dict]:
+        pipeline = [
+            {"$match": filter},
+            *self._name_search.get_score_stages(name),
+            {"$sort": self._construct_sort(name)},
+            {"$skip": offset},
+            {"$limit": limit},
+        ]
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        return pipeline
+
+    def _construct_facet_pipeline(
+        self,
+        filter: dict,
+        name: str | None,
+        offset: int,
+        limit: int,
+        projection: dict | None,
+    ) -> list[dict]:
+        pipeline = [
+            {"$match": filter},
+            *(self._name_search.get_score_stages(name) if self._is_ranked(name) else []),
+            {"$sort": self._construct_sort(name)},
+        ]
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        pipeline.append({"$facet": {
+            "content": [{"$skip": offset}, {"$limit": limit}],
+            "total": [{"$count": "amount"}],
+        }})
+        return pipeline
+
+    def _get_query_samples(self) -> dict[str, dict]:
+        """Commands shaped like the ones issued by this repository"""
+        collection_name = self._collection.name
+        owner_id = "query-plan-sample"
+        name = "query plan sample"
+        id = ObjectId()
+        cursor = PageCursor(created_at=datetime.now(), id=id)
+        owner_filter = self._construct_filter(owner_id=owner_id, is_deleted=False)
+        name_filter = self._construct_filter(owner_id=owner_id, name=name, is_deleted=False)
+
+        samples = {
+            "get_document": {
+                "find": collection_name,
+                "filter": self._construct_filter(id=id),
+            },
+            "get_document_of_owner": {
+                "find": collection_name,
+                "filter": self._construct_filter(id=id, owner_id=owner_id),
+            },
+            "get_documents": {
+                "find": collection_name,
+                "filter": owner_filter,
+                "sort": dict(PAGE_SORT),
+                "skip": 25,
+                "limit": 25,
+            },
+            "get_documents_by_cursor": {
+                "find": collection_name,
+                "filter": self._construct_filter(
+                    owner_id=owner_id,
+                    is_deleted=False,
+                    cursor=cursor,
+                ),
+                "sort": dict(PAGE_SORT),
+                "limit": 25,
+            },
+            "count_documents": {
+                "aggregate": collection_name,
+                "pipeline": [
+                    {"$match": owner_filter},
+                    {"$group": {"_id": 1, "n": {"$sum": 1}}},
+                ],
+                "cursor": {},
+            },
+            "get_documents_with_count": {
+                "aggregate": collection_name,
+                "pipeline": self._construct_facet_pipeline(
+                    filter=owner_filter,
+                    name=None,
+                    offset=25,
+                    limit=25,
+                    projection=None,
+                ),
+                "cursor": {},
+            },
+            "get_documents_with_count_by_name": {
+                "aggregate": collection_name,
+                "pipeline": self._construct_facet_pipeline(
+                    filter=name_filter,
+                    name=name,
+                    offset=25,
+                    limit=25,
+                    projection=None,
+                ),
+                "cursor": {},
+            },
+        }
+        if self._name_search.ranked:
+            samples["get_documents_by_name"] = {
+                "aggregate": collection_name,
+                "pipeline": self._construct_ranked_pipeline(
+                    filter=name_filter,
+                    name=name,
+                    offset=25,
+                    limit=25,
+                    projection=None,
+                ),
+                "cursor": {},
+            }
+        else:
+            samples["get_documents_by_name"] = {
+                "find": collection_name,
+                "filter": name_filter,
+                "sort": dict(PAGE_SORT),
+                "limit": 25,
+            }
+        return samples
+
+    def _is_ranked(self, name: str | None, cursor: PageCursor | None = None) -> bool:
+        # cursor pages are bound to the (created_at, _id) ordering
+        return bool(name) and cursor is None and self._name_search.ranked
+
+    def _construct_sort(self, name: str | None) -> dict:
+        sort = dict(PAGE_SORT)
+        if self._is_ranked(name):
+            sort = {SCORE_FIELD: pymongo.DESCENDING, **sort}
+        return sort
+
+    def _to_object_id(self, id: str | ObjectId) -> ObjectId:
+        # raises InvalidIdException
+        if isinstance(id, ObjectId):
+            return id
+        try:
+            return ObjectId(id)
+        except (InvalidId, TypeError):
+            raise InvalidIdException(f"invalid id: {id}")
+
+    def _construct_projection(
+        self,
+        exclude_fields: list[str] | None = None,
+        include_fields: list[str] | None = None,
+    ) -> dict | None:
+        if include_fields is not None:
+            return {k: 1 for k in include_fields}
+        if exclude_fields is not None:
+            return {k: 0 for k in exclude_fields}
+        return None
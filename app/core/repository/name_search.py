@@ -0,0 +1,125 @@
+from abc import ABC, abstractmethod
+from pymongo import IndexModel, ASCENDING, TEXT
+import unicodedata
+import re
+
+
+SCORE_FIELD = "_score"
+TRIGRAMS_FIELD = "name_trigrams"
+
+
+def normalize_name(name: str) -> str:
+    """Case, accent and whitespace insensitive form of a name"""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+def get_trigrams(name: str) -> list[str]:
+    normalized = normalize_name(name)
+    return sorted({normalized[i:i + 3] for i in range(len(normalized) - 2)})
+
+
+class NameSearch(ABC):
+    """Strategy for filtering (and optionally ranking) documents by name"""
+    ranked: bool = False
+
+    def get_indexes(self) -> list[IndexModel]:
+        return list()
+
+    def annotate(self, fields: dict) -> dict:
+        """Adds search fields derived from name to inserted or updated fields"""
+        return fields
+
+    @abstractmethod
+    def construct_filter(self, name: str) -> dict: ...
+
+    def get_score_stages(self, name: str) -> list[dict]:
+        """Aggregation stages which set SCORE_FIELD, higher is better"""
+        return list()
+
+
+class RegexNameSearch(NameSearch):
+    """Case insensitive substring match. Not served by any index"""
+
+    def construct_filter(self, name: str) -> dict:
+        return {"name": {"$regex": re.escape(name), "$options": "i"}}
+
+
+class TextNameSearch(NameSearch):
+    """Word match over a text index, ranked by text score"""
+    ranked = True
+
+    def get_indexes(self) -> list[IndexModel]:
+        return [
+            IndexModel(
+                [("owner_id", ASCENDING), ("name", TEXT)],
+                name="owner_name_text",
+            ),
+        ]
+
+    def construct_filter(self, name: str) -> dict:
+        return {"$text": {"$search": name}}
+
+    def get_score_stages(self, name: str) -> list[dict]:
+        return [{"$addFields": {SCORE_FIELD: {"$meta": "textScore"}}}]
+
+
+class TrigramNameSearch(NameSearch):
+    """Substring match prefiltered by trigrams of the normalized name, ranked by coverage"""
+    ranked = True
+
+    def __init__(self) -> None:
+        self._fallback = RegexNameSearch()
+
+    def get_indexes(self) -> list[IndexModel]:
+        return [
+            IndexModel(
+                [("owner_id", ASCENDING), (TRIGRAMS_FIELD, ASCENDING)],
+                name="owner_name_trigrams",
+            ),
+        ]
+
+    def annotate(self, fields: dict) -> dict:
+        if fields.get("name") is None:
+            return fields
+        return {**fields, TRIGRAMS_FIELD: get_trigrams(fields["name"])}
+
+    def construct_filter(self, name: str) -> dict:
+        trigrams = get_trigrams(name)
+        if not trigrams:
+            return self._fallback.construct_filter(name)
+        # trigrams narrow the candidates over the index, the regex drops
+        # names having them all but not as one substring
+        return {
+            TRIGRAMS_FIELD: {"$all": trigrams},
+            **self._fallback.construct_filter(name),
+        }
+
+    def get_score_stages(self, name: str) -> list[dict]:
+        trigrams_amount = len(get_trigrams(name))
+        if trigrams_amount == 0:
+            return list()
+        name_trigrams_amount = {"$size": {"$ifNull": [f"${TRIGRAMS_FIELD}", []]}}
+        return [{"$addFields": {
+            SCORE_FIELD: {
+                "$divide": [trigrams_amount, {"$max": [name_trigrams_amount, 1]}]
+            }
+        }}]
+
+
+NAME_SEARCH_ENGINES: dict[str, type[NameSearch]] = {
+    "regex": RegexNameSearch,
+    "text": TextNameSearch,
+    "trigram": TrigramNameSearch,
+}
+
+
+def get_name_search(engine: str) -> NameSearch:
+    try:
+        return NAME_SEARCH_ENGINES[engine]()
+    except KeyError:
+        raise ValueError(
+            f"unknown name search engine {engine!r}, "
+            f"expected one of: {', '.join(NAME_SEARCH_ENGINES)}"
+        )
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import binascii
+import json
+
+
+class InvalidCursorException(ValueError): ...
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """Keyset position in the (created_at, _id) ordering of a collection"""
+    created_at: datetime
+    id: ObjectId
+
+    @classmethod
+    def from_document(cls, document: dict) -> 'PageCursor':
+        return cls(created_at=document["created_at"], id=document["_id"])
+
+    def encode(self) -> str:
+        raw = json.dumps([self.created_at.isoformat(), str(self.id)])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> 'PageCursor':
+        # raises InvalidCursorException
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+            return cls(
+                created_at=datetime.fromisoformat(created_at),
+                id=ObjectId(id),
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, InvalidId):
+            raise InvalidCursorException(f"invalid cursor: {token}")
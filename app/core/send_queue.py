@@ -0,0 +1,129 @@
+from dataclasses import dataclass, field
+from enum import Enum
+import asyncio
+import collections
+import itertools
+import typing
+
+if typing.TYPE_CHECKING:
+    from .ws_codecs import WSCodec
+
+
+class OverflowPolicy(str, Enum):
+    # drops queued messages superseded by a later one with the same key
+    COALESCE = "coalesce"
+    # drops the oldest message which is not critical
+    DROP_OLDEST = "drop-oldest"
+    DISCONNECT = "disconnect"
+
+
+@dataclass(frozen=True)
+class OutboundMessage:
+    text: str
+    # messages with the same key supersede each other, None never does
+    coalesce_key: typing.Hashable | None = None
+    # a client missing a critical message has to resync
+    critical: bool = True
+    # position in the event log of the channel
+    seq: int | None = None
+    # by codec name, the message is shared by queues of all connections
+    _encoded: dict[str, str | bytes] = field(default_factory=dict, compare=False, repr=False)
+
+    def encode(self, codec: 'WSCodec') -> str | bytes:
+        """Encodes the message once per codec whatever the connections amount"""
+        if codec.name not in self._encoded:
+            self._encoded[codec.name] = codec.encode(self.text)
+        return self._encoded[codec.name]
+
+
+class SendQueueOverflowException(Exception): ...
+
+
+_queue_ids = itertools.count(1)
+
+
+class SendQueue:
+    """Bounded outbound messages of one connection, made room for by the overflow policy"""
+
+    def __init__(self, maxsize: int, policy: OverflowPolicy) -> None:
+        self.id = next(_queue_ids)
+        self._maxsize = maxsize
+        self._policy = policy
+        self._messages: collections.deque[OutboundMessage] = collections.deque()
+        self._has_messages = asyncio.Event()
+        self._is_closed = False
+        self.is_overflowed = False
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, message: OutboundMessage) -> None:
+        if self.is_overflowed or self._is_closed:
+            return
+        if len(self._messages) >= self._maxsize and not self._make_room(message):
+            if not message.critical:
+                self.dropped += 1
+                return
+            self.is_overflowed = True
+            self._messages.clear()
+        else:
+            self._messages.append(message)
+            self.max_depth = max(self.max_depth, len(self._messages))
+        self._has_messages.set()
+
+    def close(self) -> None:
+        """Lets the reader get the rest and then None"""
+        self._is_closed = True
+        self._has_messages.set()
+
+    async def get(self) -> OutboundMessage | None:
+        while not self._messages:
+            if self.is_overflowed:
+                raise SendQueueOverflowException()
+            if self._is_closed:
+                return None
+            self._has_messages.clear()
+            await self._has_messages.wait()
+        if self.is_overflowed:
+            raise SendQueueOverflowException()
+        return self._messages.popleft()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "depth": len(self._messages),
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+    def _make_room(self, message: OutboundMessage) -> bool:
+        if self._policy is OverflowPolicy.COALESCE:
+            return self._coalesce(message)
+        if self._policy is OverflowPolicy.DROP_OLDEST:
+            return self._drop_oldest()
+        return False
+
+    def _coalesce(self, message: OutboundMessage) -> bool:
+        # the newest message of a key stays at its place, so order of keys is kept
+        seen_keys = set() if message.coalesce_key is None else {message.coalesce_key}
+        kept = collections.deque()
+        for queued in reversed(self._messages):
+            if queued.coalesce_key is None:
+                kept.appendleft(queued)
+            elif queued.coalesce_key not in seen_keys:
+                seen_keys.add(queued.coalesce_key)
+                kept.appendleft(queued)
+        self.coalesced += len(self._messages) - len(kept)
+        self._messages = kept
+        return len(self._messages) < self._maxsize
+
+    def _drop_oldest(self) -> bool:
+        for i, queued in enumerate(self._messages):
+            if not queued.critical:
+                del self._messages[i]
+                self.dropped += 1
+                return True
+        return False
@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from fastapi import WebSocket
+import json
+import msgpack
+import typing
+
+
+class WSCodec(ABC):
+    """Wire encoding of json text messages of one websocket connection"""
+
+    name: str
+    subprotocol: str
+
+    @abstractmethod
+    def iter_frames(self, websocket: WebSocket) -> typing.AsyncIterator[str | bytes]: ...
+
+    @abstractmethod
+    def decode(self, frame: str | bytes) -> typing.Any: ...
+
+    @abstractmethod
+    def encode(self, message: str) -> str | bytes: ...
+
+    @abstractmethod
+    async def send(self, websocket: WebSocket, data: str | bytes) -> None: ...
+
+
+class JSONWSCodec(WSCodec):
+    name = "json"
+    subprotocol = "cloudoc.json"
+
+    def iter_frames(self, websocket: WebSocket) -> typing.AsyncIterator[str]:
+        return websocket.iter_text()
+
+    def decode(self, frame: str) -> str:
+        return frame
+
+    def encode(self, message: str) -> str:
+        return message
+
+    async def send(self, websocket: WebSocket, data: str) -> None:
+        await websocket.send_text(data)
+
+
+class MsgpackWSCodec(WSCodec):
+    name = "msgpack"
+    subprotocol = "cloudoc.msgpack"
+
+    def iter_frames(self, websocket: WebSocket) -> typing.AsyncIterator[bytes]:
+        return websocket.iter_bytes()
+
+    def decode(self, frame: bytes) -> typing.Any:
+        return msgpack.unpackb(frame)
+
+    def encode(self, message: str) -> bytes:
+        return msgpack.packb(json.loads(message))
+
+    async def send(self, websocket: WebSocket, data: bytes) -> None:
+        await websocket.send_bytes(data)
+
+
+JSON_WS_CODEC = JSONWSCodec()
+
+WS_CODECS: dict[str, WSCodec] = {
+    codec.subprotocol: codec
+    for codec in (JSON_WS_CODEC, MsgpackWSCodec())
+}
+
+
+def negotiate_ws_codec(subprotocols: list[str]) -> tuple[WSCodec, str | None]:
+    """Codec and subprotocol of the first supported one the client offered, json without any"""
+    for subprotocol in subprotocols:
+        if subprotocol in WS_CODECS:
+            return WS_CODECS[subprotocol], subprotocol
+    return JSON_WS_CODEC, None
@@ -1,10 +1,15 @@
 import asyncio
+import contextlib
 import typing
 import json
-from fastapi import WebSocket
-from broadcaster import Broadcast
+import logging
+from fastapi import WebSocket, status
 from dataclasses import dataclass
 from enum import Enum, auto
+from .document_hub import DocumentHub
+from .event_coalescer import EventCoalescer
+from .send_queue import SendQueueOverflowException
+from .ws_codecs import negotiate_ws_codec
 from .message_handler import (
     BaseMessageHandler,
     Response,
@@ -13,47 +18,198 @@ from .message_handler import (
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+# sent before closing connections of a stopping process
+SERVER_RESTART_MESSAGE = json.dumps(
+    {"event": {"type": "server-restart", "data": {}}}
+)
+
+# close code of a connection which fell behind, its client reloads the document
+WS_RESYNC_CLOSE_CODE = 4001
+
+
+class ConnectionRegistry:
+    """Connections served by the process, drained on shutdown"""
+
+    def __init__(self) -> None:
+        self._connections: set['WSConnectionManager'] = set()
+        self._is_empty = asyncio.Event()
+        self._is_empty.set()
+        self.is_draining = False
+
+    @contextlib.contextmanager
+    def register(self, connection: 'WSConnectionManager') -> typing.Iterator[None]:
+        self._connections.add(connection)
+        self._is_empty.clear()
+        try:
+            yield
+        finally:
+            self._connections.discard(connection)
+            if not self._connections:
+                self._is_empty.set()
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """Refuses new connections, asks connected clients to reconnect and
+        waits up to timeout seconds for them to publish held edits and end"""
+        self.is_draining = True
+        await asyncio.gather(
+            *[connection.close_for_restart() for connection in list(self._connections)],
+            return_exceptions=True,
+        )
+        if timeout is None:
+            return
+        try:
+            await asyncio.wait_for(self._is_empty.wait(), timeout=timeout)
+        except TimeoutError:
+            logger.warning("%s connections did not end in %ss", len(self), timeout)
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
 
 class WSConnectionManager:
     def __init__(
         self,
         websocket: WebSocket,
-        broadcast: Broadcast,
+        hub: DocumentHub,
         channel_name: str,
         message_handler: BaseMessageHandler,
+        registry: ConnectionRegistry,
+        coalescing_window: float = 0,
+        resume_from: int | None = None,
     ) -> None:
         self._websocket = websocket
-        self._broadcast = broadcast
+        self._hub = hub
         self._message_handler = message_handler
         self._channel_name = channel_name
+        self._registry = registry
+        self._codec, self._subprotocol = negotiate_ws_codec(
+            websocket.scope.get("subprotocols", [])
+        )
+        self._coalescer = EventCoalescer(
+            self._publish_response,
+            window=coalescing_window,
+            on_error=self._fail_held_response,
+        )
+        # sequence number of the last event the reconnecting client got
+        self._resume_from = resume_from
+        # set once the snapshot or missed events are sent, they go first
+        self._caught_up = asyncio.Event()
+        # set once a held edit failed, the connection ends then
+        self._failed = asyncio.Event()
 
     async def perform(self) -> None:
-        await self._websocket.accept()
-        async with asyncio.TaskGroup() as tg:
-            tg.create_task(self._ws_recieve())
-            tg.create_task(self._ws_send())
+        if self._registry.is_draining:
+            await self._websocket.close(code=status.WS_1012_SERVICE_RESTART)
+            return
+
+        await self._websocket.accept(subprotocol=self._subprotocol)
+        with self._registry.register(self):
+            # sending and heartbeat never end by themselves, so they stop with the receiving
+            # or a failed held edit
+            tasks = [
+                asyncio.create_task(self._ws_recieve()),
+                asyncio.create_task(self._ws_send()),
+                asyncio.create_task(self._failed.wait()),
+            ]
+            if self._message_handler.heartbeat_interval is not None:
+                tasks.append(asyncio.create_task(self._heartbeat()))
+            try:
+                done, _ = await asyncio.wait(
+                    tasks,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self._coalescer.close()
+                for response in await self._message_handler.close():
+                    if response.response_type is ResponseType.BROADCAST:
+                        await self._publish_response(response)
+        for task in done:
+            task.result()
+
+    async def close_for_restart(self) -> None:
+        await self._send_message(SERVER_RESTART_MESSAGE)
+        await self._websocket.close(
+            code=status.WS_1012_SERVICE_RESTART,
+            reason="server restart, reconnect",
+        )
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self._message_handler.heartbeat_interval)
+            await self._message_handler.heartbeat()
 
     async def _ws_recieve(self) -> None:
-        async for message in self._websocket.iter_text():
+        await self._caught_up.wait()
+        async for frame in self._codec.iter_frames(self._websocket):
             try:
-                response = await self._message_handler.handle_message(message)
+                response = await self._message_handler.handle_message(
+                    self._codec.decode(frame)
+                )
             except RequestHandlingException as e:
                 response = e.get_response()
             if response.response_type is ResponseType.BROADCAST:
-                await self._publish_message(response.message)
+                await self._coalescer.publish(response)
             elif response.response_type is ResponseType.UNICAST:
                 await self._send_message(response.message)
 
-    async def _publish_message(self, message: typing.Any):
-        await self._broadcast.publish(
-            channel=self._channel_name,
-            message=message
-        )
+    async def _publish_response(self, response: Response) -> None:
+        try:
+            await self._hub.publish(
+                channel=self._channel_name,
+                message=response.message,
+                transaction=response.transaction,
+            )
+        except RequestHandlingException as e:
+            # raised by writes of the response, possibly after it was held
+            await self._send_message(e.get_response().message)
+
+    async def _fail_held_response(self, error: Exception) -> None:
+        # the client applied the edit already, so its document diverged
+        logger.error("failed to publish a held response", exc_info=error)
+        with contextlib.suppress(RuntimeError, OSError):
+            await self._close_for_resync("failed to apply a change, resync")
+        self._failed.set()
 
-    async def _send_message(self, message: typing.Any):
-        await self._websocket.send_text(message)
+    async def _send_message(self, message: str):
+        await self._codec.send(self._websocket, self._codec.encode(message))
+
+    async def _close_for_resync(self, reason: str) -> None:
+        await self._websocket.close(code=WS_RESYNC_CLOSE_CODE, reason=reason)
 
     async def _ws_send(self) -> None:
-        async with self._broadcast.subscribe(channel=self._channel_name) as subscriber:
-            async for event in subscriber:
-                await self._websocket.send_text(event.message)
+        # subscribed before reading the log, so no event falls in between
+        async with self._hub.subscribe(channel=self._channel_name) as queue:
+            missed = None
+            if self._resume_from is not None:
+                missed = await self._hub.read_since(self._channel_name, self._resume_from)
+            if missed is not None:
+                for text in missed:
+                    self._message_handler.observe_broadcast(text)
+                    await self._send_message(text)
+                last_seq = self._resume_from + len(missed)
+            elif (snapshot := await self._message_handler.snapshot()) is not None:
+                message, last_seq = snapshot
+                await self._send_message(message)
+            elif self._resume_from is not None:
+                # handlers without a snapshot can not restore the client
+                await self._close_for_resync("missed events are not kept anymore, resync")
+                return
+            else:
+                last_seq = None
+            self._caught_up.set()
+            try:
+                # None once the channel is lost, the client reconnects
+                while (message := await queue.get()) is not None:
+                    if last_seq is not None and message.seq is not None and message.seq <= last_seq:
+                        # already in the snapshot or sent from the log
+                        continue
+                    self._message_handler.observe_broadcast(message.text)
+                    await self._codec.send(self._websocket, message.encode(self._codec))
+            except SendQueueOverflowException:
+                await self._close_for_resync("too slow to receive events, resync")
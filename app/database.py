@@ -14,7 +14,83 @@ documents_collection = database.get_collection(DOCUMENTS_COLLECTION)
 styles_collection = database.get_collection(STYLES_COLLECTION)
 
 
+from app.core.repository.base import BaseRepository
 from app.core.repository.mongo import MongoRepository
+from app.core.repository.caching import CachingRepository
+from app.core.repository.count_cache import CountCache
+from app.core.repository.name_search import get_name_search
+from app.redis import redis_client
 
-documents_repository = MongoRepository(documents_collection)
-styles_repository = MongoRepository(styles_collection)
+# serves owner listing ordered by (created_at, _id) for both offset and cursor pages
+OWNER_PAGE_INDEX = pymongo.IndexModel(
+    [
+        ("owner_id", pymongo.ASCENDING),
+        ("is_deleted", pymongo.ASCENDING),
+        ("created_at", pymongo.DESCENDING),
+        ("_id", pymongo.DESCENDING),
+    ],
+    name="owner_page",
+)
+
+# documents shared with a user
+ACCESS_RESTRICTIONS_INDEX = pymongo.IndexModel(
+    [
+        ("access_restrictions.user_id", pymongo.ASCENDING),
+        ("is_deleted", pymongo.ASCENDING),
+        ("created_at", pymongo.DESCENDING),
+    ],
+    name="access_restrictions_page",
+)
+
+DOCUMENTS_INDEXES = [OWNER_PAGE_INDEX, ACCESS_RESTRICTIONS_INDEX]
+STYLES_INDEXES = [OWNER_PAGE_INDEX]
+
+
+def _get_count_cache(namespace: str) -> CountCache | None:
+    if Config.COUNT_CACHE_TTL <= 0:
+        return None
+    return CountCache(
+        redis_client=redis_client,
+        namespace=namespace,
+        ttl=Config.COUNT_CACHE_TTL,
+    )
+
+
+def _with_cache(repository: BaseRepository, namespace: str) -> BaseRepository:
+    if not Config.REPOSITORY_CACHE_ENABLED:
+        return repository
+    return CachingRepository(
+        repository=repository,
+        redis_client=redis_client,
+        namespace=namespace,
+        l1_max_size=Config.REPOSITORY_CACHE_L1_SIZE,
+        l1_ttl=Config.REPOSITORY_CACHE_L1_TTL,
+        l2_ttl=Config.REPOSITORY_CACHE_L2_TTL,
+    )
+
+
+documents_mongo_repository = MongoRepository(
+    documents_collection,
+    indexes=DOCUMENTS_INDEXES,
+    count_cache=_get_count_cache(DOCUMENTS_COLLECTION),
+    name_search=get_name_search(Config.NAME_SEARCH_ENGINE),
+)
+styles_mongo_repository = MongoRepository(
+    styles_collection,
+    indexes=STYLES_INDEXES,
+    count_cache=_get_count_cache(STYLES_COLLECTION),
+    name_search=get_name_search(Config.NAME_SEARCH_ENGINE),
+)
+
+documents_repository = _with_cache(documents_mongo_repository, DOCUMENTS_COLLECTION)
+styles_repository = _with_cache(styles_mongo_repository, STYLES_COLLECTION)
+
+mongo_repositories = [documents_mongo_repository, styles_mongo_repository]
+caching_repositories = {
+    name: repository
+    for name, repository in (
+        (DOCUMENTS_COLLECTION, documents_repository),
+        (STYLES_COLLECTION, styles_repository),
+    )
+    if isinstance(repository, CachingRepository)
+}
@@ -1,6 +1,7 @@
 from fastapi import Depends
 from broadcaster import Broadcast
-from app.broadcast import broadcast
+from app.broadcast import broadcast, document_hub
+from app.core.document_hub import DocumentHub
 import typing
 
 
@@ -8,7 +9,16 @@ def broadcast_dependency() -> Broadcast:
     return broadcast
 
 
+def document_hub_dependency() -> DocumentHub:
+    return document_hub
+
+
 BroadcastAnnotation = typing.Annotated[
     Broadcast,
     Depends(broadcast_dependency)
 ]
+
+DocumentHubAnnotation = typing.Annotated[
+    DocumentHub,
+    Depends(document_hub_dependency)
+]
@@ -0,0 +1,14 @@
+from fastapi import Depends
+from app.core.ws_connection_manager import ConnectionRegistry
+from app.connections import connection_registry
+import typing
+
+
+def connection_registry_dependency() -> ConnectionRegistry:
+    return connection_registry
+
+
+ConnectionRegistryAnnotation = typing.Annotated[
+    ConnectionRegistry,
+    Depends(connection_registry_dependency)
+]
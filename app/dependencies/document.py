@@ -1,21 +1,20 @@
 from fastapi import Depends, status
+from dataclasses import dataclass
 import typing
 
+from app.broadcast import event_log, get_document_channel_name
 from app.models.document import Document, DocumentAccessRole
+from app.routers import cache
 from ._context import ContextAnnotation, get_context_based_exception
-from .repository import DocumentsRepositoryAnnotation
 from .user import ActiveUserAnnotation
 
 
 async def document_dependency(
     context: ContextAnnotation,
-    repository: DocumentsRepositoryAnnotation,
     document_id: str,
 ) -> Document:
-    document = await repository.get_document(
-        id=document_id,
-        owner_id=None
-    )
+    # editor state, loaded once per document for concurrent connections
+    document = await cache.get_document(document_id)
     if document is None:
         raise get_context_based_exception(
             context=context,
@@ -24,7 +23,7 @@ async def document_dependency(
             message=f"document {document_id} not found"
         )
 
-    return Document.model_validate(document)
+    return document
 
 
 DocumentAnnotation = typing.Annotated[
@@ -33,6 +32,31 @@ DocumentAnnotation = typing.Annotated[
 ]
 
 
+@dataclass
+class EditorDocument:
+    document: Document
+    # sequence number of document events read before the document was loaded
+    loaded_seq: int
+
+
+async def document_events_seq_dependency(document_id: str) -> int:
+    return await event_log.get_seq(get_document_channel_name(document_id))
+
+
+async def editor_document_dependency(
+    # solved before the document, so the document has every event up to it
+    loaded_seq: typing.Annotated[int, Depends(document_events_seq_dependency)],
+    document: DocumentAnnotation,
+) -> EditorDocument:
+    return EditorDocument(document=document, loaded_seq=loaded_seq)
+
+
+EditorDocumentAnnotation = typing.Annotated[
+    EditorDocument,
+    Depends(editor_document_dependency)
+]
+
+
 def document_user_role_dependency(
     context: ContextAnnotation,
     user: ActiveUserAnnotation,
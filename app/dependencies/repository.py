@@ -1,24 +1,24 @@
 from fastapi import Depends
 from app.database import documents_repository, styles_repository
-from app.core.repository.mongo import MongoRepository
+from app.core.repository.base import BaseRepository
 import typing
 
 
-def documents_repository_dependency() -> MongoRepository:
+def documents_repository_dependency() -> BaseRepository:
     return documents_repository
 
 
 DocumentsRepositoryAnnotation = typing.Annotated[
-    MongoRepository,
+    BaseRepository,
     Depends(documents_repository_dependency)
 ]
 
 
-def styles_repository_dependency() -> MongoRepository:
+def styles_repository_dependency() -> BaseRepository:
     return styles_repository
 
 
 StylesRepositoryAnnotation = typing.Annotated[
-    MongoRepository,
+    BaseRepository,
     Depends(styles_repository_dependency)
 ]
@@ -77,7 +77,7 @@ def admin_user_dependency(
             context=connection_context,
             http_code=status.HTTP_403_FORBIDDEN,
             ws_code=status.WS_1008_POLICY_VIOLATION,
-            details="not an admin"
+            message="not an admin"
         )
     return user
 
@@ -1,19 +1,69 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
+import asyncio
+import logging
 from app.routers.documents import router as documents_router
 from app.routers.styles import router as styles_router
-from app.scheduler import scheduler
-from app.database import client as mongo_client
+from app.routers.stats import router as stats_router
+from app.routers.health import router as health_router
+from app.scheduler import scheduler, leader_election
+from app.scheduler import tasks  # registers scheduled jobs
+from app.config import Config
+from app.connections import connection_registry
+from app.core.repository.indexes import IndexConflictException
+from app.redis import open_redis, close_redis
+from app.broadcast import document_hub
+from app.database import (
+    client as mongo_client,
+    mongo_repositories,
+    caching_repositories,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await open_redis()
+    await document_hub.connect()
+    for repository in mongo_repositories:
+        # a changed index is rebuilt by the cli once, not by every worker
+        try:
+            await repository.ensure_indexes()
+        except IndexConflictException as e:
+            logger.error("%s", e)
+            raise
+        if Config.VERIFY_QUERY_PLANS:
+            await repository.verify_query_plans()
+    for repository in caching_repositories.values():
+        await repository.start()
+    await leader_election.start()
     scheduler.start()
     yield
     scheduler.shutdown()
+    await leader_election.stop()
+    # connections publish their last edits before the flush
+    await connection_registry.drain(timeout=Config.SHUTDOWN_DRAIN_TIMEOUT)
+    await _flush_cache_before_exit()
+    await document_hub.disconnect()
+    for repository in caching_repositories.values():
+        await repository.stop()
+    await close_redis()
     await mongo_client.close()
 
+
+async def _flush_cache_before_exit() -> None:
+    # whatever is left stays dirty in redis for the next flush of other workers
+    try:
+        await asyncio.wait_for(tasks.flush_cache(), timeout=Config.SHUTDOWN_FLUSH_TIMEOUT)
+    except TimeoutError:
+        logger.warning("cache flush did not finish in %ss", Config.SHUTDOWN_FLUSH_TIMEOUT)
+
+
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(router=documents_router)
 app.include_router(router=styles_router)
+app.include_router(router=stats_router)
+app.include_router(router=health_router)
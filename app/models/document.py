@@ -15,6 +15,8 @@ class DocElementType(str, Enum):
 
 
 class DocElement(BaseModel):
+    # client side block id, missing on blocks created before it was stored
+    id: str | None = Field(default=None)
     type: DocElementType
     attrs: dict
     data: dict  # NOTE No validation ? (
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Literal, Union, Annotated, Any
-from app.models.document import DocElementType as BlockType
+from app.models.document import Document, DocElementType as BlockType
 
 
 class EventType(str, Enum):
@@ -11,6 +11,13 @@ class EventType(str, Enum):
     BLOCK_REMOVED = "block-removed"
     BLOCK_LOCKED = "block-locked"
     BLOCK_RELEASED = "block-released"
+    BLOCKS_LOCKED = "blocks-locked"
+    BLOCKS_RELEASED = "blocks-released"
+    SNAPSHOT = "snapshot"
+
+
+# blocks of one blocks-locked or blocks-released event
+MAX_BATCH_BLOCKS = 500
 
 
 class BlockChangedData(BaseModel):
@@ -41,6 +48,12 @@ class BlockLockedData(BaseModel):
 class BlockReleasedData(BaseModel):
     id: str
 
+class BlocksLockedData(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=MAX_BATCH_BLOCKS)
+
+class BlocksReleasedData(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=MAX_BATCH_BLOCKS)
+
 class BlockChangedEvent(BaseModel):
     type: Literal[EventType.BLOCK_CHANGED]
     data: BlockChangedData
@@ -71,6 +84,16 @@ class BlockReleasedEvent(BaseModel):
     data: BlockReleasedData
 
 
+class BlocksLockedEvent(BaseModel):
+    type: Literal[EventType.BLOCKS_LOCKED]
+    data: BlocksLockedData
+
+
+class BlocksReleasedEvent(BaseModel):
+    type: Literal[EventType.BLOCKS_RELEASED]
+    data: BlocksReleasedData
+
+
 class DefaultEvent(BaseModel):
     """Anything that follows general structure"""
     type: str
@@ -88,11 +111,35 @@ class Event(BaseModel):
             BlockAddedEvent,
             BlockMovedEvent,
             BlockRemovedEvent,
+            BlockLockedEvent,
+            BlockReleasedEvent,
+            BlocksLockedEvent,
+            BlocksReleasedEvent,
             DefaultEvent
         ],
         Field(union_mode='left_to_right')
     ]
     user: UserInfo | None = Field(default=None)
+    # version of document locks after a lock or release event
+    lock_version: int | None = Field(default=None)
+
+
+class SnapshotData(BaseModel):
+    document: Document
+    # owner ids of locked blocks by block id
+    locks: dict[str, str]
+    lock_version: int
+
+
+class SnapshotEvent(BaseModel):
+    type: Literal[EventType.SNAPSHOT]
+    data: SnapshotData
+
+
+class SnapshotFrame(BaseModel):
+    """First message of an editor connection, events follow from seq + 1"""
+    seq: int
+    event: SnapshotEvent
 
 
 class EventsCollection(BaseModel):
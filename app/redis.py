@@ -1,8 +1,23 @@
-import redis
+import redis.asyncio as redis
 from app.config import Config
 
 
-redis_client = redis.Redis.from_url(
+# one pool per process shared by every redis user of the application;
+# waits for a free connection instead of failing when exhausted
+redis_pool = redis.BlockingConnectionPool.from_url(
     Config.REDIS_STORAGE_URL,
-    decode_responses=True,
+    max_connections=Config.REDIS_MAX_CONNECTIONS,
+    timeout=Config.REDIS_POOL_TIMEOUT,
+    socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30,
 )
+
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+async def open_redis() -> None:
+    await redis_client.ping()
+
+
+async def close_redis() -> None:
+    await redis_client.aclose(close_connection_pool=True)
@@ -1,50 +1,471 @@
+import asyncio
 import bson
-from app.models.document import Document
+import itertools
+import typing
+import json
+import logging
+import zlib
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
+from app.config import Config
+from app.models.document import Document, DocElement
 from app.redis import redis_client
 from app.database import documents_collection
+from app.core.repository.base import BaseRepository, UpdatesFailedException
+from app.core.lease import RedisLease
+from app.core.cache_codecs import get_cache_codec
+
+
+# ids of cached documents changed since their last flush, scored by a
+# version taken from a counter on every change. Ids are spread over
+# CACHE_FLUSH_BUCKETS sets, so workers can flush different buckets at once
+DIRTY_DOCUMENTS_KEY = "documents:dirty:{}"
+DIRTY_VERSION_KEY = "documents:dirty:version"
+
+codec = get_cache_codec(
+    Config.DOCUMENT_CACHE_CODEC,
+    compression_threshold=Config.DOCUMENT_CACHE_COMPRESSION_THRESHOLD,
+)
+
+# held by the process loading a document missing in cache
+DOCUMENT_LOAD_LEASE_KEY = "leases:document-load:{}"
+
+# loads of this process in progress, shared by concurrent callers
+_loads_in_flight: dict[str, asyncio.Task] = dict()
+
+logger = logging.getLogger(__name__)
+
+# changes of content since the last flush, see _get_content_updates
+CONTENT_CHANGES_KEY = "document:{}:changes"
+
+# amount of changes of a document applied to db, which keeps it in
+# FLUSHED_CHANGES_FIELD, so updates of a change apply once, see _get_content_updates
+FLUSHED_CHANGES_KEY = "document:{}:flushed-changes"
+FLUSHED_CHANGES_FIELD = "flushed_changes"
+
+# more updates than that cost more than rewriting the whole content
+MAX_CONTENT_UPDATES = 32
+
+# an edit losing the document to other editors that often gives up
+MAX_EDIT_ATTEMPTS = 16
+
+# KEYS: document key, flushed changes key; ARGV: document, ttl, flushed changes
+# returns 0 when the document is cached already
+_CACHE_LOADED_SCRIPT = redis_client.register_script("""
+if not redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2], 'NX') then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[2])
+return 1
+""")
+
+# KEYS: document key, dirty set, version counter, changes list, flushed
+# changes key; ARGV: document, document id, change or nothing when unknown
+_MARK_DIRTY_SCRIPT = redis_client.register_script("""
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('PERSIST', KEYS[5])
+redis.call('RPUSH', KEYS[4], ARGV[3] or '{"op": "reset"}')
+local version = redis.call('INCR', KEYS[3])
+redis.call('ZADD', KEYS[2], version, ARGV[2])
+return version
+""")
+
+# KEYS: dirty set, then document, changes and flushed changes keys per id;
+# ARGV: ttl, then id, flushed version, amount of flushed changes and of
+# changes flushed before per id. Changes made during the flush stay dirty
+_MARK_CLEAN_SCRIPT = redis_client.register_script("""
+local cleaned = 0
+for i = 1, (#KEYS - 1) / 3 do
+    local id = ARGV[4 * i - 2]
+    local document_key, changes_key, flushed_key = KEYS[3 * i - 1], KEYS[3 * i], KEYS[3 * i + 1]
+    if tonumber(redis.call('GET', flushed_key) or 0) == tonumber(ARGV[4 * i + 1]) then
+        redis.call('INCRBY', flushed_key, ARGV[4 * i])
+        local score = redis.call('ZSCORE', KEYS[1], id)
+        if score and tonumber(score) == tonumber(ARGV[4 * i - 1]) then
+            redis.call('ZREM', KEYS[1], id)
+            redis.call('DEL', changes_key)
+            redis.call('EXPIRE', document_key, ARGV[1])
+            redis.call('EXPIRE', flushed_key, ARGV[1])
+            cleaned = cleaned + 1
+        else
+            redis.call('LTRIM', changes_key, ARGV[4 * i], -1)
+        end
+    end
+end
+return cleaned
+""")
+
+
+class DocumentEditConflictException(Exception): ...
+
+
+def block_set_change(index: int, block: DocElement) -> dict:
+    return {"op": "set", "index": index, "block": block.model_dump(mode="json")}
+
+
+def block_inserted_change(index: int, block: DocElement) -> dict:
+    return {"op": "insert", "index": index, "block": block.model_dump(mode="json")}
+
+
+def block_removed_change(block_id: str) -> dict:
+    return {"op": "remove", "id": block_id}
 
 
 def _get_document_key(document_id: str):
     return f"document:{document_id}"
 
 
+def get_dirty_bucket(document_id: str) -> int:
+    return zlib.crc32(document_id.encode()) % Config.CACHE_FLUSH_BUCKETS
+
+
 async def _get_document_from_mongodb(
     document_id: bson.ObjectId
-) -> Document | None:
+) -> tuple[Document, int] | None:
+    """The document and the amount of cache changes flushed to it"""
     # raises pydantic.ValidationError
 
     mongo_record = await documents_collection.find_one(
         {"_id": document_id}
     )
+    if not mongo_record:
+        return None
     return (
-        Document.model_validate(mongo_record)
-            if mongo_record
-            else None
+        Document.model_validate(mongo_record),
+        mongo_record.get(FLUSHED_CHANGES_FIELD, 0),
     )
 
 
 async def get_document(
     document_id: str,
 ) -> Document | None:
+    if not bson.ObjectId.is_valid(document_id):
+        return None
+
+    doc_redis_record = await redis_client.get(_get_document_key(document_id))
+    if doc_redis_record is None:
+        doc_redis_record = await _load_document_once(document_id)
+    if doc_redis_record is None:
+        return None
+    # every caller gets its own model, handlers modify it
+    return codec.decode(doc_redis_record, Document)
+
+
+async def get_document_with_counter(
+    document_id: str,
+    counter_key: str,
+) -> tuple[Document | None, int]:
+    """Document read at once with an integer counter, e.g. of its events"""
+    for _ in range(2):
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.get(_get_document_key(document_id))
+            pipeline.get(counter_key)
+            doc_redis_record, counter = await pipeline.execute()
+        if doc_redis_record is not None:
+            return codec.decode(doc_redis_record, Document), int(counter or 0)
+        # expired meanwhile, load it and read again
+        if await get_document(document_id) is None:
+            break
+    return None, int(counter or 0)
+
+
+async def _load_document_once(document_id: str) -> bytes | None:
+    """Joins a load of the document started by this process or starts one"""
+    load = _loads_in_flight.get(document_id)
+    if load is None:
+        load = asyncio.create_task(_load_document(document_id))
+        _loads_in_flight[document_id] = load
+        load.add_done_callback(lambda _: _loads_in_flight.pop(document_id, None))
+    # a cancelled caller must not cancel the load for the others
+    return await asyncio.shield(load)
+
+
+async def _load_document(document_id: str) -> bytes | None:
     document_key = _get_document_key(document_id)
+    lease = RedisLease(
+        redis_client,
+        key=DOCUMENT_LOAD_LEASE_KEY.format(document_id),
+        ttl=Config.DOCUMENT_LOAD_LEASE_TTL,
+    )
+    if not await lease.acquire():
+        doc_redis_record = await _wait_for_document_load(document_id)
+        if doc_redis_record is not None:
+            return doc_redis_record
 
-    document: Document | None = None
-    if doc_redis_record := redis_client.get(document_key):
-        document = Document.model_validate_json(doc_redis_record)
-    else:
-        document = await _get_document_from_mongodb(
+    try:
+        loaded = await _get_document_from_mongodb(
             bson.ObjectId(document_id)
         )
-        if document is not None:
-            redis_client.set(document_key, document.model_dump_json())
+        if loaded is None:
+            return None
+        document, flushed_changes = loaded
+        doc_redis_record = codec.encode(document)
+        # an edited entry stored meanwhile is newer than the loaded one
+        if not await _CACHE_LOADED_SCRIPT(
+            keys=[document_key, FLUSHED_CHANGES_KEY.format(document_id)],
+            args=[doc_redis_record, Config.DOCUMENT_CACHE_TTL, flushed_changes],
+        ):
+            doc_redis_record = await redis_client.get(document_key)
+        return doc_redis_record
+    finally:
+        await lease.release()
 
-    return document
 
+async def _wait_for_document_load(document_id: str) -> bytes | None:
+    """Waits for the document to be cached, None once the load lease is gone without it"""
+    delay = 0.01
+    while True:
+        await asyncio.sleep(delay)
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.get(_get_document_key(document_id))
+            pipeline.exists(DOCUMENT_LOAD_LEASE_KEY.format(document_id))
+            doc_redis_record, is_loading = await pipeline.execute()
+        if doc_redis_record is not None or not is_loading:
+            return doc_redis_record
+        delay = min(delay * 2, 0.2)
 
-async def set_document_in_cache(
+
+async def edit_document(
     document_id: str,
-    document: Document
-) -> None:
+    edit: typing.Callable[[Document | None], dict | None],
+    queue_writes: typing.Callable[[Pipeline], typing.Awaitable[None]] | None = None,
+) -> typing.Any:
+    """Applies edit to the cached document and stores it until the next flush.
+    edit returns one of the block_*_change of its change, queue_writes adds commands to the
+    transaction storing the document, the result of the last one is returned"""
     document_key = _get_document_key(document_id)
+    async with redis_client.pipeline(transaction=True) as pipeline:
+        for _ in range(MAX_EDIT_ATTEMPTS):
+            await pipeline.watch(document_key)
+            doc_redis_record = await pipeline.get(document_key)
+            if doc_redis_record is None:
+                await pipeline.reset()
+                if (
+                    not bson.ObjectId.is_valid(document_id)
+                    or await _load_document_once(document_id) is None
+                ):
+                    edit(None)
+                    return None
+                continue
+
+            document = codec.decode(doc_redis_record, Document)
+            change = edit(document)
+            pipeline.multi()
+            await _queue_mark_dirty(pipeline, document_id, document, change)
+            if queue_writes is not None:
+                await queue_writes(pipeline)
+            try:
+                return (await pipeline.execute())[-1]
+            except WatchError:
+                continue
+    raise DocumentEditConflictException(
+        f"document {document_id} changed during {MAX_EDIT_ATTEMPTS} attempts to edit it"
+    )
+
+
+async def _queue_mark_dirty(
+    pipeline: Pipeline,
+    document_id: str,
+    document: Document,
+    change: dict | None,
+) -> None:
+    args = [codec.encode(document), document_id]
+    if change is not None:
+        args.append(json.dumps(change))
+    # dirty entries have no ttl until they are flushed
+    await _MARK_DIRTY_SCRIPT(
+        keys=[
+            _get_document_key(document_id),
+            DIRTY_DOCUMENTS_KEY.format(get_dirty_bucket(document_id)),
+            DIRTY_VERSION_KEY,
+            CONTENT_CHANGES_KEY.format(document_id),
+            FLUSHED_CHANGES_KEY.format(document_id),
+        ],
+        args=args,
+        client=pipeline,
+    )
+
+
+async def flush_dirty_documents(
+    repository: BaseRepository,
+    chunk_size: int,
+    buckets: typing.Iterable[int] | None = None,
+    keep_flushing: typing.Callable[[], typing.Awaitable[bool]] | None = None,
+) -> int:
+    """Writes documents changed before the flush started to the repository, returns their amount"""
+    if buckets is None:
+        buckets = range(Config.CACHE_FLUSH_BUCKETS)
+    last_version = await redis_client.get(DIRTY_VERSION_KEY)
+    if last_version is None:
+        return 0
+
+    flushed_amount = 0
+    for bucket in buckets:
+        flushed_amount += await _flush_dirty_bucket(
+            repository=repository,
+            dirty_key=DIRTY_DOCUMENTS_KEY.format(bucket),
+            last_version=int(last_version),
+            chunk_size=chunk_size,
+            keep_flushing=keep_flushing,
+        )
+    return flushed_amount
+
 
-    redis_client.set(document_key, document.model_dump_json())
+async def _flush_dirty_bucket(
+    repository: BaseRepository,
+    dirty_key: str,
+    last_version: int,
+    chunk_size: int,
+    keep_flushing: typing.Callable[[], typing.Awaitable[bool]] | None,
+) -> int:
+    flushed_amount = 0
+    # flushed entries leave the set, failed ones stay for the next flush
+    after_version = "-inf"
+    while True:
+        # e.g. the lease of the bucket is lost, another process flushes it then
+        if after_version != "-inf" and keep_flushing is not None and not await keep_flushing():
+            return flushed_amount
+        dirty = await redis_client.zrangebyscore(
+            dirty_key,
+            min=after_version,
+            max=last_version,
+            start=0,
+            num=chunk_size,
+            withscores=True,
+        )
+        if not dirty:
+            return flushed_amount
+        after_version = f"({int(dirty[-1][1])}"
+
+        ids = [id.decode() for id, _ in dirty]
+        versions = {id.decode(): int(version) for id, version in dirty}
+        changes_keys = [CONTENT_CHANGES_KEY.format(id) for id in ids]
+        flushed_keys = [FLUSHED_CHANGES_KEY.format(id) for id in ids]
+        # documents and their changes are read at one point of time
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.mget([_get_document_key(id) for id in ids])
+            pipeline.mget(flushed_keys)
+            for changes_key in changes_keys:
+                pipeline.lrange(changes_key, 0, -1)
+            doc_strs, flushed_counts, *changes_lists = await pipeline.execute()
+
+        updates = list()
+        # id of the document every update belongs to
+        update_ids = list()
+        for id, doc_str, flushed_count, changes in zip(
+            ids, doc_strs, flushed_counts, changes_lists
+        ):
+            if doc_str is None:
+                continue
+            doc = codec.decode(doc_str, Document)
+            changes = [json.loads(change) for change in changes]
+            for update_filter, update in _get_content_updates(
+                doc, changes, int(flushed_count or 0)
+            ):
+                updates.append((id, update_filter, update))
+                update_ids.append(id)
+
+        # unordered, so a failed document does not stop the others; updates
+        # of a document apply once in any order, see _get_content_updates
+        failed_ids = set()
+        try:
+            await repository.apply_updates(updates=updates, owner_id=None, ordered=False)
+        except UpdatesFailedException as e:
+            failed_ids = {update_ids[index] for index in e.failed_indexes}
+            logger.error("failed to flush documents %s", sorted(failed_ids), exc_info=e)
+        flushed = [
+            (id, int(flushed_count or 0), len(changes))
+            for id, flushed_count, changes in zip(ids, flushed_counts, changes_lists)
+            if id not in failed_ids
+        ]
+        flushed_amount += len(set(update_ids) - failed_ids)
+        if not flushed:
+            continue
+
+        await _MARK_CLEAN_SCRIPT(
+            keys=[
+                dirty_key,
+                *itertools.chain(*[
+                    (
+                        _get_document_key(id),
+                        CONTENT_CHANGES_KEY.format(id),
+                        FLUSHED_CHANGES_KEY.format(id),
+                    )
+                    for id, _, _ in flushed
+                ]),
+            ],
+            args=[
+                Config.DOCUMENT_CACHE_TTL,
+                *itertools.chain(*[
+                    (id, versions[id], changes_amount, flushed_count)
+                    for id, flushed_count, changes_amount in flushed
+                ]),
+            ],
+        )
+
+
+def _get_content_updates(
+    document: Document,
+    changes: list[dict],
+    flushed_changes: int,
+) -> list[tuple[dict, dict]]:
+    """Turns content changes since the last flush into (filter, update) pairs applied once each"""
+    flushed_changes_after = flushed_changes + len(changes)
+    # brings up to date a db document the changes do not follow, e.g. never flushed this way
+    rewrite = (
+        {FLUSHED_CHANGES_FIELD: {"$not": {"$gte": flushed_changes_after}}},
+        {"$set": {
+            "content": [block.model_dump(mode="json") for block in document.content],
+            "edited_at": document.edited_at,
+            FLUSHED_CHANGES_FIELD: flushed_changes_after,
+        }},
+    )
+    updates = list()
+    block_sets = dict()
+    block_sets_from = flushed_changes
+    for i, change in enumerate(changes, start=flushed_changes):
+        if change["op"] == "set":
+            if not block_sets:
+                block_sets_from = i
+            block_sets[f"content.{change['index']}"] = change["block"]
+            continue
+        # $set of positions conflicts with $push and $pull in one update
+        if block_sets:
+            updates.append(_get_block_sets_update(document, block_sets, block_sets_from, i))
+            block_sets = dict()
+        if change["op"] == "insert":
+            update = {"$push": {"content": {
+                "$each": [change["block"]],
+                "$position": change["index"],
+            }}}
+        elif change["op"] == "remove":
+            update = {"$pull": {"content": {"id": change["id"]}}}
+        else:
+            return [rewrite]
+        update["$set"] = {"edited_at": document.edited_at, FLUSHED_CHANGES_FIELD: i + 1}
+        updates.append(({FLUSHED_CHANGES_FIELD: i}, update))
+
+    if block_sets:
+        updates.append(
+            _get_block_sets_update(document, block_sets, block_sets_from, flushed_changes_after)
+        )
+    if len(updates) >= MAX_CONTENT_UPDATES:
+        return [rewrite]
+    return [*updates, rewrite]
+
+
+def _get_block_sets_update(
+    document: Document,
+    block_sets: dict,
+    changes_from: int,
+    changes_to: int,
+) -> tuple[dict, dict]:
+    # sets of a retried flush may start within the group, setting blocks again is harmless
+    return (
+        {FLUSHED_CHANGES_FIELD: {"$gte": changes_from, "$lt": changes_to}},
+        {"$set": {
+            **block_sets,
+            "edited_at": document.edited_at,
+            FLUSHED_CHANGES_FIELD: changes_to,
+        }},
+    )
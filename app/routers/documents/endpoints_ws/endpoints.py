@@ -1,11 +1,14 @@
 from fastapi import WebSocket
 
 from app.dependencies.user import ActiveUserAnnotation
-from app.dependencies.document import DocumentAnnotation, DocumentUserRoleAnnotation
+from app.dependencies.document import EditorDocumentAnnotation, DocumentUserRoleAnnotation
 from app.dependencies.repository import DocumentsRepositoryAnnotation
-from app.dependencies.broadcast import BroadcastAnnotation
+from app.dependencies.broadcast import DocumentHubAnnotation
+from app.dependencies.connections import ConnectionRegistryAnnotation
 
 from app.core.ws_connection_manager import WSConnectionManager
+from app.config import Config
+from app.broadcast import get_document_channel_name
 
 from .message_handler import MessageHandler
 from ..router import router
@@ -15,20 +18,31 @@ from ..router import router
 async def edit_document_ws(
     websocket: WebSocket,
     user: ActiveUserAnnotation,
-    document: DocumentAnnotation,
+    # before the role, which loads the document otherwise
+    editor_document: EditorDocumentAnnotation,
     user_role: DocumentUserRoleAnnotation,
     repository: DocumentsRepositoryAnnotation,
-    broadcast: BroadcastAnnotation,
+    hub: DocumentHubAnnotation,
+    registry: ConnectionRegistryAnnotation,
+    # "seq" of the last event a reconnecting client got, it receives the
+    # missed ones first or a new snapshot when they are gone
+    resume_from: int | None = None,
 ):
+    document = editor_document.document
     message_handler = MessageHandler(
         document_id=document.id,
         repository=repository,
         user=user,
+        document=document,
+        loaded_seq=editor_document.loaded_seq,
     )
     connection_manager = WSConnectionManager(
         websocket=websocket,
-        broadcast=broadcast,
-        channel_name=f"document-edit:{document.id}",
+        hub=hub,
+        channel_name=get_document_channel_name(document.id),
         message_handler=message_handler,
+        registry=registry,
+        coalescing_window=Config.EVENT_COALESCING_WINDOW,
+        resume_from=resume_from,
     )
     await connection_manager.perform()
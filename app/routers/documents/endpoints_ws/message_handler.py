@@ -1,12 +1,17 @@
 import typing
 import json
+import time
 from abc import ABC, abstractmethod
+from redis.asyncio.client import Pipeline
 from app.core import repository
+from app.core.document_hub import Transaction
 from app.core.message_handler import (
     BaseMessageHandler, ResponseType, Response, RequestHandlingException
 )
 from app.models.editor_events import (
-    Event, UserInfo, EventType
+    Event, UserInfo, EventType, BlocksReleasedEvent, BlocksReleasedData,
+    BlockLockedEvent, BlockReleasedEvent, BlocksLockedEvent, MAX_BATCH_BLOCKS,
+    SnapshotFrame, SnapshotEvent, SnapshotData,
 )
 from app.models.document import Document, DocElement
 from app.models.user import User
@@ -16,9 +21,14 @@ from app.core.lock_manager import (
     AlreadyLockedException,
     UnauthorizedReleaseException
 )
+from app.broadcast import event_log, get_document_channel_name
+from app.config import Config
+from app.connections import lock_mirrors
 from app.redis import redis_client
+from app.routers import cache
 from enum import Enum, auto
 from dataclasses import dataclass
+from datetime import datetime
 
 
 class BlockAlreadyLockedException(RequestHandlingException):
@@ -42,6 +52,14 @@ class DocumentNotFoundException(RequestHandlingException):
 
 _event_handlers = {}    # TODO (((
 
+# lock events change the mirror, others are not parsed when observed
+_LOCK_EVENT_TYPES = (
+    EventType.BLOCK_LOCKED,
+    EventType.BLOCK_RELEASED,
+    EventType.BLOCKS_LOCKED,
+    EventType.BLOCKS_RELEASED,
+)
+
 
 class MessageHandler(BaseMessageHandler):
     _event_handlers = _event_handlers
@@ -63,22 +81,40 @@ class MessageHandler(BaseMessageHandler):
         document_id: str,
         repository: BaseRepository,
         user: User,
+        document: Document | None = None,
+        loaded_seq: int = 0,
     ) -> None:
         self._lock_manager = LockManager(
             resource_namespace=document_id,
             redis_client=redis_client,
+            ttl=Config.BLOCK_LOCK_TTL,
+        )
+        # shared by connections of the document, saves a Redis call per edit
+        self._lock_mirror = lock_mirrors.get(
+            self._lock_manager,
+            namespace=document_id,
+            ttl=Config.BLOCK_LOCK_TTL,
         )
         self._user = user
         self._document_id = document_id
         self._repository = repository
+        # loaded for the connection, becomes its snapshot unless changed since
+        self._loaded_document = document
+        self._loaded_seq = loaded_seq
+        # blocks locked through this connection, their leases live with it
+        self._locked_block_ids: set[str] = set()
+        self.heartbeat_interval = Config.BLOCK_LOCK_TTL / 3
 
         self._event_user_info = UserInfo(
             id=self._user.id,
             name=self._user.name,
         )
 
-    async def handle_message(self, message: str) -> Response:
-        event_model = Event.model_validate_json(message)
+    async def handle_message(self, message: str | typing.Any) -> Response:
+        if isinstance(message, str):
+            event_model = Event.model_validate_json(message)
+        else:
+            event_model = Event.model_validate(message)
 
         handler_function = self._event_handlers.get(event_model.event.type)
         if handler_function is None:
@@ -87,14 +123,100 @@ class MessageHandler(BaseMessageHandler):
         response = await handler_function(self, event_model)
         return response
 
+    async def snapshot(self) -> tuple[str, int]:
+        channel = get_document_channel_name(self._document_id)
+        document, seq = self._loaded_document, self._loaded_seq
+        self._loaded_document = None
+        if await event_log.get_seq(channel) != seq:
+            # edited while connecting, the document and its seq are read at once
+            edited_document, edited_seq = await cache.get_document_with_counter(
+                self._document_id,
+                event_log.get_seq_key(channel),
+            )
+            if edited_document is not None:
+                document, seq = edited_document, edited_seq
+        # lock events carry the owner, so the ones after seq only repeat these
+        lock_state = await self._lock_manager.get_locks()
+        frame = SnapshotFrame(
+            seq=seq,
+            event=SnapshotEvent(
+                type=EventType.SNAPSHOT,
+                data=SnapshotData(
+                    document=document,
+                    locks=lock_state.owner_ids,
+                    lock_version=lock_state.version,
+                ),
+            ),
+        )
+        return frame.model_dump_json(), seq
+
+    def observe_broadcast(self, message: str) -> None:
+        if not any(f'"{event_type.value}"' in message for event_type in _LOCK_EVENT_TYPES):
+            return
+        event_model = Event.model_validate_json(message)
+        event = event_model.event
+        if isinstance(event, BlockLockedEvent) and event_model.user is not None:
+            self._lock_mirror.apply_locked(
+                [event.data.id], event_model.user.id, event_model.lock_version,
+            )
+        elif isinstance(event, BlocksLockedEvent) and event_model.user is not None:
+            self._lock_mirror.apply_locked(
+                event.data.ids, event_model.user.id, event_model.lock_version,
+            )
+        elif isinstance(event, BlockReleasedEvent):
+            self._lock_mirror.apply_released([event.data.id], event_model.lock_version)
+        elif isinstance(event, BlocksReleasedEvent):
+            self._lock_mirror.apply_released(event.data.ids, event_model.lock_version)
+
+    async def heartbeat(self) -> None:
+        started_at = time.monotonic()
+        renewed_ids = await self._lock_manager.renew(
+            resource_ids=list(self._locked_block_ids),
+            user_id=self._user.id,
+        )
+        self._lock_mirror.apply_renewed(
+            renewed_ids, self._user.id, started_at + Config.BLOCK_LOCK_TTL,
+        )
+        # the rest expired or were released through another connection
+        self._locked_block_ids = set(renewed_ids)
+
+    async def close(self) -> list[Response]:
+        released_ids, lock_version = await self._lock_manager.release_owned(
+            resource_ids=list(self._locked_block_ids),
+            user_id=self._user.id,
+        )
+        self._lock_mirror.apply_released(released_ids, lock_version)
+        self._locked_block_ids = set()
+        return [
+            Response(
+                response_type=ResponseType.BROADCAST,
+                message=Event(
+                    event=BlocksReleasedEvent(
+                        type=EventType.BLOCKS_RELEASED,
+                        data=BlocksReleasedData(ids=released_ids[i:i + MAX_BATCH_BLOCKS]),
+                    ),
+                    user=self._event_user_info,
+                    lock_version=lock_version,
+                ).model_dump_json(),
+            )
+            for i in range(0, len(released_ids), MAX_BATCH_BLOCKS)
+        ]
+
     @event_handler(EventType.BLOCK_LOCKED)
     async def _handle_block_locked_event(self, event_model: Event) -> Response:
         try:
-            await self._lock_manager.lock(
+            started_at = time.monotonic()
+            lock_version = await self._lock_manager.lock(
                 resource_id=event_model.event.data.id,
                 user_id=self._user.id,
             )
+            self._locked_block_ids.add(event_model.event.data.id)
+            self._lock_mirror.apply_locked(
+                [event_model.event.data.id], self._user.id, lock_version,
+                expires_at=started_at + Config.BLOCK_LOCK_TTL,
+            )
             event_model.user = self._event_user_info
+            event_model.lock_version = lock_version
             return Response(
                 response_type=ResponseType.BROADCAST,
                 message=event_model.model_dump_json()
@@ -105,11 +227,14 @@ class MessageHandler(BaseMessageHandler):
     @event_handler(EventType.BLOCK_RELEASED)
     async def _handle_block_released_event(self, event_model: Event) -> Response:
         try:
-            await self._lock_manager.release(
+            lock_version = await self._lock_manager.release(
                 resource_id=event_model.event.data.id,
                 user_id=self._user.id
             )
+            self._locked_block_ids.discard(event_model.event.data.id)
+            self._lock_mirror.apply_released([event_model.event.data.id], lock_version)
             event_model.user = self._event_user_info
+            event_model.lock_version = lock_version
             return Response(
                 response_type=ResponseType.BROADCAST,
                 message=event_model.model_dump_json()
@@ -117,66 +242,134 @@ class MessageHandler(BaseMessageHandler):
         except UnauthorizedReleaseException:
             raise BlockReleaseDeniedException("block is locked by another user")
 
+    @event_handler(EventType.BLOCKS_LOCKED)
+    async def _handle_blocks_locked_event(self, event_model: Event) -> Response:
+        try:
+            started_at = time.monotonic()
+            lock_version = await self._lock_manager.lock_many(
+                resource_ids=event_model.event.data.ids,
+                user_id=self._user.id,
+            )
+            self._locked_block_ids.update(event_model.event.data.ids)
+            self._lock_mirror.apply_locked(
+                event_model.event.data.ids, self._user.id, lock_version,
+                expires_at=started_at + Config.BLOCK_LOCK_TTL,
+            )
+            event_model.user = self._event_user_info
+            event_model.lock_version = lock_version
+            return Response(
+                response_type=ResponseType.BROADCAST,
+                message=event_model.model_dump_json()
+            )
+        except AlreadyLockedException:
+            raise BlockAlreadyLockedException("some of blocks are locked by another user")
+
+    @event_handler(EventType.BLOCKS_RELEASED)
+    async def _handle_blocks_released_event(self, event_model: Event) -> Response:
+        try:
+            lock_version = await self._lock_manager.release_many(
+                resource_ids=event_model.event.data.ids,
+                user_id=self._user.id,
+            )
+            self._locked_block_ids.difference_update(event_model.event.data.ids)
+            self._lock_mirror.apply_released(event_model.event.data.ids, lock_version)
+            event_model.user = self._event_user_info
+            event_model.lock_version = lock_version
+            return Response(
+                response_type=ResponseType.BROADCAST,
+                message=event_model.model_dump_json()
+            )
+        except UnauthorizedReleaseException:
+            raise BlockReleaseDeniedException("some of blocks are locked by another user")
+
     @event_handler(EventType.BLOCK_ADDED)
     async def _handle_block_added_event(self, event_model: Event) -> Response:
         await self._check_block_locked_by_user(event_model.event.data.id)
-        document_model = await self._get_not_deleted_document()
-        document_model.content.insert(
-            event_model.event.data.index,
-            DocElement(
-                type=event_model.event.data.type.value,
+        data = event_model.event.data
+
+        def add_block(document_model: Document) -> dict:
+            block = DocElement(
+                id=data.id,
+                type=data.type.value,
                 attrs={},
                 data={}
             )
-        )
-        self._repository.update_document(
-            id=self._document_id,
-            changes=document_model.model_dump(include=("content"))
-        )
+            document_model.content.insert(data.index, block)
+            return cache.block_inserted_change(data.index, block)
+
         event_model.user = self._event_user_info
 
         return Response(
             response_type=ResponseType.BROADCAST,
             message=event_model.model_dump_json(),
+            transaction=self._edit_document(add_block),
         )
 
 
     @event_handler(EventType.BLOCK_MOVED)
     async def _handle_block_moved_event(self, event_model: Event) -> Response:
         await self._check_block_locked_by_user(event_model.event.data.id)
-        document_model = await self._get_not_deleted_document(self._document_id)
-        document_model.content.insert(
-            event_model.event.data.to_index,
-            document_model.content.pop(event_model.event.data.from_index)
-        )
+        data = event_model.event.data
+
+        def move_block(document_model: Document) -> None:
+            document_model.content.insert(
+                data.to_index,
+                document_model.content.pop(data.from_index)
+            )
+
         event_model.user = self._event_user_info
 
         return Response(
             response_type=ResponseType.BROADCAST,
-            message=event_model.model_dump_json()
+            message=event_model.model_dump_json(),
+            transaction=self._edit_document(move_block),
         )
 
 
     @event_handler(EventType.BLOCK_REMOVED)
     async def _handle_block_removed_event(self, event_model: Event) -> Response:
         await self._check_block_locked_by_user(event_model.event.data.id)
-        document_model = await self._get_not_deleted_document(self._document_id)
-        document_model.content.pop(event_model.event.data.index)
+        data = event_model.event.data
+
+        def remove_block(document_model: Document) -> dict | None:
+            block = document_model.content.pop(data.index)
+            return cache.block_removed_change(block.id) if block.id else None
+
         event_model.user = self._event_user_info
 
         return Response(
             response_type=ResponseType.BROADCAST,
-            message=event_model.model_dump_json()
+            message=event_model.model_dump_json(),
+            transaction=self._edit_document(remove_block),
         )
 
     @event_handler(EventType.BLOCK_CHANGED)
     async def _handle_block_changed_event(self, event_model: Event) -> Response:
         await self._check_block_locked_by_user(event_model.event.data.id)
-        document_model = await self._get_not_deleted_document(self._document_id)
+        data = event_model.event.data
 
-        # TODO
+        def change_block(document_model: Document) -> dict:
+            block = document_model.content[data.index]
+            block.type = data.type
+            block.data = data.data
+            return cache.block_set_change(data.index, block)
+
+        event_model.user = self._event_user_info
+
+        return Response(
+            response_type=ResponseType.BROADCAST,
+            message=event_model.model_dump_json(),
+            # carries the whole block, so the last change of a typing burst is enough
+            coalesce_key=(EventType.BLOCK_CHANGED, event_model.event.data.id),
+            transaction=self._edit_document(change_block),
+        )
 
     async def _check_block_locked_by_user(self, block_id: str) -> None:
+        if self._lock_mirror.is_stale:
+            await self._lock_mirror.reconcile()
+        if self._lock_mirror.is_locked_by(block_id, self._user.id):
+            return
+        # the mirror answers only positively, e.g. a lease of another process
         if not await self._lock_manager.is_locked_by(
             resource_id=block_id,
             user_id=self._user.id
@@ -185,13 +378,35 @@ class MessageHandler(BaseMessageHandler):
                 "block must be locked before accessing"
             )
 
-    async def _get_not_deleted_document(self) -> Document:
-        document: dict | None = await self._repository.get_document(id=self._document_id)
-        if document is None:
-            raise DocumentNotFoundException()
-        document_model = Document.model_validate(document)
-        if document_model.is_deleted:
-            raise DocumentDeletedException(
-                "Document deleted. Restore it before applying changes"
-            )
-        return document_model
+    def _edit_document(
+        self,
+        edit: typing.Callable[[Document], dict | None],
+    ) -> Transaction:
+        """Edit of the cached document stored with the sequencing of its event,
+        so a snapshot has the edit exactly when its seq covers the event.
+        The document reaches db with the next flush."""
+        def edit_not_deleted(document_model: Document | None) -> dict | None:
+            if document_model is None:
+                raise DocumentNotFoundException("document not found")
+            if document_model.is_deleted:
+                raise DocumentDeletedException(
+                    "Document deleted. Restore it before applying changes"
+                )
+            try:
+                change = edit(document_model)
+            except IndexError:
+                raise UnableToHandleException("block index is out of range")
+            document_model.edited_at = datetime.now()
+            return change
+
+        async def transaction(
+            queue_writes: typing.Callable[[Pipeline], typing.Awaitable[None]],
+        ) -> typing.Any:
+            try:
+                return await cache.edit_document(
+                    self._document_id, edit_not_deleted, queue_writes,
+                )
+            except cache.DocumentEditConflictException:
+                raise UnableToHandleException("document is edited too often, retry")
+
+        return transaction
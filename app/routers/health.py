@@ -0,0 +1,32 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from app.dependencies.connections import ConnectionRegistryAnnotation
+from app.dependencies.user import AdminUserAnnotation
+
+
+router = APIRouter(prefix='/health', tags=['health'])
+
+
+@router.get(path='/live')
+async def liveness() -> dict[str, str]:
+    return {"status": "alive"}
+
+
+@router.get(path='/ready')
+async def readiness(registry: ConnectionRegistryAnnotation) -> JSONResponse:
+    if registry.is_draining:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "draining", "connections": len(registry)},
+        )
+    return JSONResponse(content={"status": "ready", "connections": len(registry)})
+
+
+@router.post(path='/drain')
+async def drain(
+    user: AdminUserAnnotation,
+    registry: ConnectionRegistryAnnotation,
+) -> dict[str, str]:
+    """Starts shutdown ahead of the signal, e.g. from a pre-stop hook"""
+    await registry.drain()
+    return {"status": "draining"}
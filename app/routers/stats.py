@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from app.broadcast import document_hub
+from app.database import caching_repositories
+from app.dependencies.user import AdminUserAnnotation
+
+
+router = APIRouter(prefix='/stats', tags=['stats'])
+
+
+@router.get(path='/repository-cache')
+async def repository_cache_stats(
+    user: AdminUserAnnotation,
+) -> dict[str, dict[str, int]]:
+    return {
+        name: repository.get_stats()
+        for name, repository in caching_repositories.items()
+    }
+
+
+@router.get(path='/send-queues')
+async def send_queues_stats(
+    user: AdminUserAnnotation,
+) -> dict[str, dict]:
+    """Send queues of editor connections of the process per document channel"""
+    return document_hub.get_stats()
@@ -1,5 +1,6 @@
-from .scheduler import scheduler
+from .scheduler import scheduler, leader_election
 
 __all__ = [
     "scheduler",
+    "leader_election",
 ]
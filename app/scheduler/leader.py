@@ -0,0 +1,55 @@
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+import functools
+import asyncio
+import typing
+
+from app.core.lease import RedisLease
+
+
+class LeaderElection:
+    """Keeps one process of the deployment leader through a renewed Redis lease"""
+
+    def __init__(self, redis_client: Redis, name: str, ttl: float) -> None:
+        self._lease = RedisLease(redis_client, key=f"leader:{name}", ttl=ttl)
+        self._interval = ttl / 3
+        self._task: asyncio.Task | None = None
+        self.is_leader = False
+
+    async def start(self) -> None:
+        await self._campaign()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self._lease.release()
+
+    def leader_only(
+        self,
+        func: typing.Callable[..., typing.Awaitable[None]],
+    ) -> typing.Callable[..., typing.Awaitable[None]]:
+        """Makes a scheduled job a no-op on every process but the leader"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> None:
+            if self.is_leader:
+                await func(*args, **kwargs)
+        return wrapper
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            await self._campaign()
+
+    async def _campaign(self) -> None:
+        try:
+            if self.is_leader:
+                self.is_leader = await self._lease.renew()
+            else:
+                self.is_leader = await self._lease.acquire()
+        except RedisError:
+            # can not prove the lease is still ours
+            self.is_leader = False
@@ -1,4 +1,13 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from app.config import Config
+from app.redis import redis_client
+from .leader import LeaderElection
 
 
 scheduler = AsyncIOScheduler(timezone='UTC')
+
+leader_election = LeaderElection(
+    redis_client=redis_client,
+    name="scheduler",
+    ttl=Config.SCHEDULER_LEADER_TTL,
+)
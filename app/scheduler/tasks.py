@@ -1,18 +1,86 @@
+import random
+from collections import defaultdict
+from app.config import Config
 from app.redis import redis_client
-from app.models.document import Document
-from app.database import documents_collection
-from bson import ObjectId
-from .scheduler import scheduler
+from app.broadcast import document_hub, get_document_channel_name
+from app.database import documents_repository
+from app.core.lease import RedisLease
+from app.core.lock_manager import sweep_expired_locks
+from app.models.editor_events import (
+    Event,
+    EventType,
+    BlocksReleasedEvent,
+    BlocksReleasedData,
+    MAX_BATCH_BLOCKS,
+)
+from app.routers.cache import flush_dirty_documents
+from .scheduler import scheduler, leader_election
 
 
 @scheduler.scheduled_job('interval', minutes=10)
 async def push_cache_to_db():
-    for key in redis_client.scan(match="document:*"):
-        doc_str = redis_client.get(key)
-        doc = Document.model_validate_json(doc_str)
-        assert doc.id is not None
-        await documents_collection.replace_one(
-            filter={"_id": doc.id},
-            replacement=doc.model_dump(by_alias=True, exclude=["id"])
+    if Config.CACHE_FLUSH_MODE == 'sharded':
+        await flush_cache()
+    else:
+        await _flush_cache_as_leader()
+
+
+@leader_election.leader_only
+async def _flush_cache_as_leader():
+    await flush_cache()
+
+
+async def flush_cache() -> int:
+    """Flushes every dirty bucket which is not being flushed by another process.
+
+    Returns the amount of flushed documents.
+    """
+    # every process walks buckets in its own order and skips leased ones,
+    # so concurrent flushes spread over the buckets
+    buckets = list(range(Config.CACHE_FLUSH_BUCKETS))
+    random.shuffle(buckets)
+    flushed_amount = 0
+    for bucket in buckets:
+        lease = RedisLease(
+            redis_client,
+            key=f"leases:cache-flush:{bucket}",
+            ttl=Config.CACHE_FLUSH_LEASE_TTL,
         )
-        redis_client.delete(key)
+        if not await lease.acquire():
+            continue
+        try:
+            flushed_amount += await flush_dirty_documents(
+                repository=documents_repository,
+                chunk_size=Config.CACHE_FLUSH_CHUNK_SIZE,
+                buckets=[bucket],
+                # a lost lease lets another process flush the bucket
+                keep_flushing=lease.renew,
+            )
+        finally:
+            await lease.release()
+    return flushed_amount
+
+
+@scheduler.scheduled_job('interval', seconds=Config.LOCK_SWEEP_INTERVAL)
+@leader_election.leader_only
+async def release_expired_locks():
+    """Releases block locks of editors gone without disconnecting, e.g. with their server"""
+    released_ids = defaultdict(list)
+    versions = dict()
+    for lock in await sweep_expired_locks(redis_client, limit=Config.LOCK_SWEEP_LIMIT):
+        released_ids[lock.resource_namespace].append(lock.resource_id)
+        versions[lock.resource_namespace] = lock.version
+
+    for document_id, block_ids in released_ids.items():
+        for i in range(0, len(block_ids), MAX_BATCH_BLOCKS):
+            await document_hub.publish(
+                channel=get_document_channel_name(document_id),
+                message=Event(
+                    event=BlocksReleasedEvent(
+                        type=EventType.BLOCKS_RELEASED,
+                        data=BlocksReleasedData(ids=block_ids[i:i + MAX_BATCH_BLOCKS]),
+                    ),
+                    # versions of single expiries are skipped, mirrors reconcile
+                    lock_version=versions[document_id],
+                ).model_dump_json(),
+            )
@@ -0,0 +1,41 @@
+from argparse import ArgumentParser
+import asyncio
+import time
+import typing
+
+
+BENCHMARK_DATABASE = "cloudoc_benchmarks"
+OWNER_ID = "benchmark-owner"
+
+
+async def measure_ms(
+    coro_factory: typing.Callable[[], typing.Awaitable[typing.Any]],
+    repeat: int,
+) -> list[float]:
+    """Sorted timings of repeat awaits of the factory, in ms"""
+    timings = list()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def percentile(timings: list[float], share: float) -> float:
+    return timings[int(len(timings) * share)]
+
+
+def main(
+    doc: str,
+    run: typing.Callable[..., typing.Awaitable[None]],
+    defaults: dict[str, typing.Any],
+) -> None:
+    """Runs the benchmark with --options named after its defaults, flags for False ones"""
+    parser = ArgumentParser(description=doc.splitlines()[0])
+    for name, default in defaults.items():
+        option = f"--{name.replace('_', '-')}"
+        if isinstance(default, bool):
+            parser.add_argument(option, action='store_true')
+        else:
+            parser.add_argument(option, type=type(default), default=default)
+    asyncio.run(run(**vars(parser.parse_args())))
@@ -0,0 +1,81 @@
+"""Size and speed of every cache codec on documents of the CLI generator.
+
+    poetry run python -m benchmarks.cache_codecs --blocks 10 100 1000
+
+Hit latency is a GET of the encoded document from redis plus decoding.
+"""
+from argparse import ArgumentParser
+import asyncio
+import time
+import redis.asyncio as redis
+
+from app.config import Config
+from app.models.document import Document
+from app.core.cache_codecs import CACHE_CODECS, CacheCodec, get_cache_codec
+from scripts.commands.documents import generate_document, generate_doc_element
+
+
+BENCHMARK_KEY = "benchmarks:cache-codecs"
+
+
+def _generate_document(blocks: int) -> Document:
+    document = generate_document(user_id=None, style_id=None)
+    document.content = [generate_doc_element() for _ in range(blocks)]
+    return document
+
+
+def _median_us(func, repeat: int) -> float:
+    timings = list()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1_000_000
+
+
+async def _hit_latency_us(
+    client: redis.Redis,
+    codec: CacheCodec,
+    encoded: bytes,
+    repeat: int,
+) -> float:
+    await client.set(BENCHMARK_KEY, encoded)
+    timings = list()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        codec.decode(await client.get(BENCHMARK_KEY), Document)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1_000_000
+
+
+async def run(blocks_amounts: list[int], threshold: int, repeat: int) -> None:
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    codecs = [get_cache_codec(name, compression_threshold=threshold) for name in CACHE_CODECS]
+
+    print(f"{'blocks':>7} {'codec':>13} {'bytes':>9} {'encode, us':>11} {'decode, us':>11} {'hit, us':>9}")
+    for blocks in blocks_amounts:
+        document = _generate_document(blocks)
+        for codec in codecs:
+            encoded = codec.encode(document)
+            encode_us = _median_us(lambda: codec.encode(document), repeat)
+            decode_us = _median_us(lambda: codec.decode(encoded, Document), repeat)
+            hit_us = await _hit_latency_us(client, codec, encoded, repeat)
+            print(f"{blocks:>7} {codec.name:>13} {len(encoded):>9} {encode_us:>11.1f} {decode_us:>11.1f} {hit_us:>9.1f}")
+
+    await client.delete(BENCHMARK_KEY)
+    await client.aclose()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocks', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--threshold', type=int, default=Config.DOCUMENT_CACHE_COMPRESSION_THRESHOLD)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.blocks, args.threshold, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
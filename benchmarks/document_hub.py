@@ -0,0 +1,117 @@
+"""Fan-out latency and CPU of editor events to local sockets, per-socket subscriptions vs the hub.
+
+    poetry run python -m benchmarks.document_hub --sockets 1000
+
+A socket is a task reading its subscription and parsing every message, as
+the connection does with lock events. Latency is the time from publishing
+a message to a socket reading it, CPU is process time per published message.
+"""
+from argparse import ArgumentParser
+import asyncio
+import contextlib
+import json
+import time
+from broadcaster import Broadcast
+
+from app.broadcast import describe_document_message
+from app.config import Config
+from app.core.document_hub import BroadcastDocumentHub, MemoryDocumentHub
+from app.core.send_queue import OverflowPolicy
+
+
+CHANNEL = "benchmarks:document-hub"
+
+
+async def _per_socket_subscription(broadcast: Broadcast, latencies: list[float], ready) -> None:
+    async with broadcast.subscribe(channel=CHANNEL) as subscriber:
+        ready()
+        async for event in subscriber:
+            latencies.append(time.perf_counter() - json.loads(event.message)["sent_at"])
+
+
+async def _hub_subscription(hub, latencies: list[float], ready) -> None:
+    async with hub.subscribe(channel=CHANNEL) as queue:
+        ready()
+        while (message := await queue.get()) is not None:
+            latencies.append(time.perf_counter() - json.loads(message.text)["sent_at"])
+
+
+async def _run_case(socket_factory, publish, sockets: int, messages: int, interval: float):
+    latencies = list()
+    subscribed = asyncio.Semaphore(0)
+    tasks = [
+        asyncio.create_task(socket_factory(latencies, subscribed.release))
+        for _ in range(sockets)
+    ]
+    for _ in range(sockets):
+        await subscribed.acquire()
+
+    cpu_started = time.process_time()
+    for _ in range(messages):
+        await publish(json.dumps({"sent_at": time.perf_counter(), "event": {"type": "noop"}}))
+        await asyncio.sleep(interval)
+    while len(latencies) < sockets * messages:
+        await asyncio.sleep(interval)
+    cpu = time.process_time() - cpu_started
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    return (
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+        cpu / messages * 1000,
+    )
+
+
+async def run(sockets: int, messages: int, interval: float, url: str) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        broadcast = await stack.enter_async_context(Broadcast(url))
+        hub_options = dict(
+            describe_message=describe_document_message,
+            send_queue_size=Config.SEND_QUEUE_SIZE,
+            overflow_policy=OverflowPolicy.COALESCE,
+        )
+        broadcast_hub = BroadcastDocumentHub(broadcast, **hub_options)
+        memory_hub = MemoryDocumentHub(**hub_options)
+
+        async def publish_broadcast(message: str) -> None:
+            await broadcast.publish(channel=CHANNEL, message=message)
+
+        async def publish_memory(message: str) -> None:
+            await memory_hub.publish(CHANNEL, message)
+
+        cases = {
+            "per-socket": (
+                lambda latencies, ready: _per_socket_subscription(broadcast, latencies, ready),
+                publish_broadcast,
+            ),
+            "hub": (
+                lambda latencies, ready: _hub_subscription(broadcast_hub, latencies, ready),
+                publish_broadcast,
+            ),
+            "hub-memory": (
+                lambda latencies, ready: _hub_subscription(memory_hub, latencies, ready),
+                publish_memory,
+            ),
+        }
+        print(f"{'case':>12} {'p50, ms':>10} {'p99, ms':>10} {'cpu/msg, ms':>12}")
+        for name, (socket_factory, publish) in cases.items():
+            p50, p99, cpu = await _run_case(socket_factory, publish, sockets, messages, interval)
+            print(f"{name:>12} {p50:>10.2f} {p99:>10.2f} {cpu:>12.2f}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sockets', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--url', default=Config.BROADCAST_STORAGE_URL)
+    args = parser.parse_args()
+    asyncio.run(run(args.sockets, args.messages, args.interval, args.url))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Broadcasts of typing editors with and without the coalescing window.
+
+    poetry run python -m benchmarks.event_coalescing --editors 20 --windows 0 0.016 0.05
+
+Every editor types into its own block at --keys-per-second, each keystroke is
+a block-changed event carrying the whole block text as the editor sends it.
+"""
+from argparse import ArgumentParser
+import asyncio
+import time
+
+from app.core.event_coalescer import EventCoalescer
+from app.core.message_handler import Response, ResponseType
+from app.models.editor_events import (
+    Event, EventType, BlockChangedEvent, BlockChangedData, UserInfo,
+)
+
+
+def _keystroke(editor: int, text: str) -> Response:
+    event = Event(
+        event=BlockChangedEvent(
+            type=EventType.BLOCK_CHANGED,
+            data=BlockChangedData(
+                index=editor,
+                id=f"block-{editor}",
+                type="paragraph",
+                data={"text": text},
+            ),
+        ),
+        user=UserInfo(id=str(editor), name=f"editor {editor}"),
+    )
+    return Response(
+        response_type=ResponseType.BROADCAST,
+        message=event.model_dump_json(),
+        coalesce_key=(EventType.BLOCK_CHANGED, f"block-{editor}"),
+    )
+
+
+async def _type(coalescer: EventCoalescer, editor: int, keys_per_second: float, duration: float) -> None:
+    text = ""
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        text += "a"
+        await coalescer.publish(_keystroke(editor, text))
+        await asyncio.sleep(1 / keys_per_second)
+    await coalescer.close()
+
+
+async def _run_case(window: float, editors: int, keys_per_second: float, duration: float) -> tuple[float, float]:
+    published = [0, 0]
+
+    async def publish(response: Response) -> None:
+        published[0] += 1
+        published[1] += len(response.message)
+
+    async def fail(error: Exception) -> None:
+        raise error
+
+    await asyncio.gather(*[
+        _type(EventCoalescer(publish, window=window, on_error=fail), editor, keys_per_second, duration)
+        for editor in range(editors)
+    ])
+    return published[0] / duration, published[1] / duration
+
+
+async def run(editors: int, keys_per_second: float, duration: float, windows: list[float]) -> None:
+    print(f"{'window, ms':>10} {'messages/s':>12} {'KiB/s':>10}")
+    for window in windows:
+        messages, size = await _run_case(window, editors, keys_per_second, duration)
+        print(f"{window * 1000:>10.0f} {messages:>12.0f} {size / 1024:>10.1f}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--editors', type=int, default=20)
+    parser.add_argument('--keys-per-second', type=float, default=100)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 0.016, 0.05])
+    args = parser.parse_args()
+    asyncio.run(run(args.editors, args.keys_per_second, args.duration, args.windows))
+
+
+if __name__ == '__main__':
+    main()
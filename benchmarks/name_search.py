@@ -0,0 +1,97 @@
+"""Name search latency of every engine on a collection seeded with the CLI generator.
+
+    poetry run python -m benchmarks.name_search --documents 1000000
+
+Seeding a million documents takes a while, pass --skip-seed to reuse the
+collection of a previous run.
+"""
+from pymongo import AsyncMongoClient
+import random
+
+from app.config import Config
+from app.database import OWNER_PAGE_INDEX
+from app.core.repository.mongo import MongoRepository
+from app.core.repository.name_search import (
+    NAME_SEARCH_ENGINES,
+    TrigramNameSearch,
+    get_name_search,
+)
+from scripts.commands.documents import generate_document
+from ._common import BENCHMARK_DATABASE, OWNER_ID, main, measure_ms, percentile
+
+
+async def _seed(collection, amount: int) -> None:
+    await collection.drop()
+    # documents carry the fields of every engine, so all of them query one collection
+    trigram_search = TrigramNameSearch()
+    batch = list()
+    for i in range(amount):
+        document = generate_document(user_id=OWNER_ID, style_id=None)
+        document.content = []
+        batch.append(
+            trigram_search.annotate(document.model_dump(by_alias=True, exclude=["id"]))
+        )
+        if len(batch) == 10_000:
+            await collection.insert_many(batch, ordered=False)
+            batch = list()
+            print(f"seeded {i + 1}/{amount}")
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def _get_queries(collection, amount: int) -> list[str]:
+    command_cursor = await collection.aggregate(
+        [{"$sample": {"size": amount}}, {"$project": {"name": 1}}]
+    )
+    queries = list()
+    for document in await command_cursor.to_list(None):
+        word = random.choice(document["name"].split())
+        queries.append(word.lower())
+    return queries
+
+
+async def _measure(repository: MongoRepository, names: list[str], repeat: int) -> tuple[float, float]:
+    timings = list()
+    for name in names:
+        timings += await measure_ms(
+            lambda: repository.get_documents_with_count(
+                owner_id=OWNER_ID,
+                limit=25,
+                offset=0,
+                name=name,
+                include_fields=["_id", "name"],
+            ),
+            repeat,
+        )
+    timings.sort()
+    return percentile(timings, 0.5), percentile(timings, 0.95)
+
+
+async def run(documents: int, queries: int, repeat: int, skip_seed: bool) -> None:
+    client = AsyncMongoClient(Config.MONGODB_URL)
+    collection = client.get_database(BENCHMARK_DATABASE).get_collection("name_search")
+    if not skip_seed:
+        await _seed(collection, documents)
+
+    repositories = {
+        engine: MongoRepository(
+            collection,
+            indexes=[OWNER_PAGE_INDEX],
+            name_search=get_name_search(engine),
+        )
+        for engine in NAME_SEARCH_ENGINES
+    }
+    for repository in repositories.values():
+        await repository.ensure_indexes()
+
+    names = await _get_queries(collection, queries)
+    print(f"{'engine':>10} {'p50, ms':>10} {'p95, ms':>10}")
+    for engine, repository in repositories.items():
+        p50, p95 = await _measure(repository, names, repeat)
+        print(f"{engine:>10} {p50:>10.2f} {p95:>10.2f}")
+
+    await client.close()
+
+
+if __name__ == '__main__':
+    main(__doc__, run, {"documents": 1_000_000, "queries": 20, "repeat": 3, "skip_seed": False})
@@ -0,0 +1,72 @@
+"""Offset vs cursor page latency as the page depth grows.
+
+    poetry run python -m benchmarks.pagination --documents 50000
+"""
+from datetime import datetime, timedelta
+from pymongo import AsyncMongoClient
+from bson import ObjectId
+
+from app.config import Config
+from app.database import OWNER_PAGE_INDEX
+from app.core.repository.mongo import MongoRepository
+from app.core.repository.pagination import PageCursor
+from ._common import BENCHMARK_DATABASE, OWNER_ID, main, measure_ms, percentile
+
+
+async def _seed(repository: MongoRepository, collection, amount: int) -> None:
+    await collection.drop()
+    await repository.ensure_indexes()
+    started_at = datetime(2020, 1, 1)
+    batch = list()
+    for i in range(amount):
+        batch.append({
+            "_id": ObjectId(),
+            "name": f"document {i}",
+            "owner_id": OWNER_ID,
+            "created_at": started_at + timedelta(seconds=i),
+            "is_deleted": False,
+            "content": [],
+        })
+        if len(batch) == 1000:
+            await collection.insert_many(batch)
+            batch = list()
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def run(documents: int, limit: int, repeat: int) -> None:
+    client = AsyncMongoClient(Config.MONGODB_URL)
+    collection = client.get_database(BENCHMARK_DATABASE).get_collection("pagination")
+    repository = MongoRepository(collection, indexes=[OWNER_PAGE_INDEX])
+    await _seed(repository, collection, documents)
+
+    print(f"{'depth':>10} {'offset, ms':>12} {'cursor, ms':>12}")
+    depth = limit
+    while depth < documents:
+        # cursor pointing to the document right before the measured page
+        previous = await repository.get_documents(
+            owner_id=OWNER_ID, limit=1, offset=depth - 1
+        )
+        cursor = PageCursor.from_document(previous[0])
+
+        offset_ms = percentile(await measure_ms(
+            lambda: repository.get_documents(
+                owner_id=OWNER_ID, limit=limit, offset=depth
+            ),
+            repeat,
+        ), 0.5)
+        cursor_ms = percentile(await measure_ms(
+            lambda: repository.get_documents(
+                owner_id=OWNER_ID, limit=limit, offset=0, cursor=cursor
+            ),
+            repeat,
+        ), 0.5)
+        print(f"{depth:>10} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+        depth *= 4
+
+    await collection.drop()
+    await client.close()
+
+
+if __name__ == '__main__':
+    main(__doc__, run, {"documents": 50_000, "limit": 25, "repeat": 20})
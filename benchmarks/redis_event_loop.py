@@ -0,0 +1,98 @@
+"""Event loop stall caused by redis calls of concurrent editors, sync vs asyncio client.
+
+    poetry run python -m benchmarks.redis_event_loop --editors 200
+
+Every editor repeats the lock check of the edit path (GET + SET of a lock
+blob). A probe task sleeps for 1 ms in a loop and records how late it wakes
+up, which is the delay every other websocket session on the worker sees.
+"""
+from argparse import ArgumentParser
+import asyncio
+import json
+import time
+import redis
+import redis.asyncio
+
+from app.config import Config
+
+
+LOCK_KEY = "benchmarks:locks:{}"
+PROBE_INTERVAL = 0.001
+
+
+async def _probe(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def _sync_editor(client: redis.Redis, editor: int, stop: asyncio.Event, ops: list[int]) -> None:
+    key = LOCK_KEY.format(editor % 10)
+    while not stop.is_set():
+        locks = json.loads(client.get(key) or "{}")
+        locks[str(editor)] = {"locked": True, "owner_id": str(editor)}
+        client.set(key, json.dumps(locks))
+        ops[0] += 1
+        await asyncio.sleep(0)
+
+
+async def _async_editor(client: redis.asyncio.Redis, editor: int, stop: asyncio.Event, ops: list[int]) -> None:
+    key = LOCK_KEY.format(editor % 10)
+    while not stop.is_set():
+        locks = json.loads(await client.get(key) or "{}")
+        locks[str(editor)] = {"locked": True, "owner_id": str(editor)}
+        await client.set(key, json.dumps(locks))
+        ops[0] += 1
+
+
+async def _run_case(editor_factory, editors: int, duration: float) -> tuple[float, float, float, float]:
+    stop = asyncio.Event()
+    lags, ops = list(), [0]
+    tasks = [asyncio.create_task(_probe(lags, stop))]
+    tasks += [asyncio.create_task(editor_factory(i, stop, ops)) for i in range(editors)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    lags.sort()
+    return (
+        lags[len(lags) // 2] * 1000,
+        lags[int(len(lags) * 0.99)] * 1000,
+        lags[-1] * 1000,
+        ops[0] / duration,
+    )
+
+
+async def run(editors: int, duration: float) -> None:
+    sync_client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    async_pool = redis.asyncio.BlockingConnectionPool.from_url(
+        Config.REDIS_STORAGE_URL,
+        max_connections=Config.REDIS_MAX_CONNECTIONS,
+    )
+    async_client = redis.asyncio.Redis(connection_pool=async_pool)
+
+    cases = {
+        "sync": lambda i, stop, ops: _sync_editor(sync_client, i, stop, ops),
+        "asyncio": lambda i, stop, ops: _async_editor(async_client, i, stop, ops),
+    }
+    print(f"{'client':>8} {'p50 lag, ms':>12} {'p99 lag, ms':>12} {'max lag, ms':>12} {'ops/s':>10}")
+    for name, factory in cases.items():
+        p50, p99, worst, throughput = await _run_case(factory, editors, duration)
+        print(f"{name:>8} {p50:>12.2f} {p99:>12.2f} {worst:>12.2f} {throughput:>10.0f}")
+
+    sync_client.delete(*[LOCK_KEY.format(i) for i in range(10)])
+    sync_client.close()
+    await async_client.aclose(close_connection_pool=True)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--editors', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.editors, args.duration))
+
+
+if __name__ == '__main__':
+    main()
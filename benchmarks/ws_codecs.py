@@ -0,0 +1,80 @@
+"""Frame size and fan-out CPU of editor events per websocket codec.
+
+    poetry run python -m benchmarks.ws_codecs --sockets 1000
+
+Fan-out CPU is encoding one event for every socket of the document, once
+per socket as before the hub and once per codec as the hub does now.
+"""
+from argparse import ArgumentParser
+import time
+
+from app.core.send_queue import OutboundMessage
+from app.core.ws_codecs import WS_CODECS
+from app.models.editor_events import (
+    Event, EventType, UserInfo,
+    BlockChangedEvent, BlockChangedData, BlocksLockedEvent, BlocksLockedData,
+)
+from scripts.commands.documents import generate_doc_element
+
+
+def _events() -> dict[str, str]:
+    block = generate_doc_element()
+    user = UserInfo(id="6650f1c2a1b2c3d4e5f60718", name="editor")
+    return {
+        "block-changed": Event(
+            event=BlockChangedEvent(
+                type=EventType.BLOCK_CHANGED,
+                data=BlockChangedData(index=10, id="block-10", type=block.type, data=block.data),
+            ),
+            user=user,
+        ).model_dump_json(),
+        "blocks-locked": Event(
+            event=BlocksLockedEvent(
+                type=EventType.BLOCKS_LOCKED,
+                data=BlocksLockedData(ids=[f"block-{i}" for i in range(100)]),
+            ),
+            user=user,
+            lock_version=42,
+        ).model_dump_json(),
+    }
+
+
+def _fan_out_ms(func, repeat: int) -> float:
+    timings = list()
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        timings.append(time.process_time() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def run(sockets: int, repeat: int) -> None:
+    print(f"{'event':>14} {'codec':>8} {'bytes':>7} {'per socket, ms':>15} {'per codec, ms':>14}")
+    for name, text in _events().items():
+        for codec in WS_CODECS.values():
+            per_socket = _fan_out_ms(
+                lambda: [codec.encode(text) for _ in range(sockets)],
+                repeat,
+            )
+
+            def per_codec():
+                message = OutboundMessage(text=text)
+                return [message.encode(codec) for _ in range(sockets)]
+
+            print(
+                f"{name:>14} {codec.name:>8} {len(codec.encode(text)):>7} "
+                f"{per_socket:>15.3f} {_fan_out_ms(per_codec, repeat):>14.3f}"
+            )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sockets', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sockets, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 import argparse
 from scripts.commands.documents import fill_documents_collection
+from scripts.commands.name_search import build_name_search
+from scripts.commands.indexes import ensure_indexes
+from app.core.repository.name_search import NAME_SEARCH_ENGINES
 from app.config import Config
 import os
 
@@ -55,8 +58,66 @@ def main():
         default=True,
         help="Should existing style_id be assigned to document (default: true)",
     )
+    docs_parser.add_argument(
+        '--name-search-engine',
+        type=str,
+        choices=list(NAME_SEARCH_ENGINES),
+        default=Config.NAME_SEARCH_ENGINE,
+        help=f"Name search engine to prepare documents for (default: {Config.NAME_SEARCH_ENGINE})",
+    )
     docs_parser.set_defaults(func=fill_documents_collection)
 
+    # Name search command
+    search_parser = subparsers.add_parser(
+        'build_name_search',
+        help='Create name search indexes and fill search fields of existing documents'
+    )
+    search_parser.add_argument(
+        'engine',
+        type=str,
+        choices=list(NAME_SEARCH_ENGINES),
+        help='Name search engine',
+    )
+    search_parser.add_argument(
+        'mongodb_url',
+        type=str,
+        nargs='?',
+        default=get_mongo_db_url(),
+        help=f'Url to mongodb database (default: {get_mongo_db_url()})'
+    )
+    search_parser.add_argument(
+        'database',
+        type=str,
+        nargs='?',
+        default='cloudoc',
+        help="MongoDB database name (default: cloudoc)"
+    )
+    search_parser.add_argument(
+        'collection',
+        type=str,
+        nargs='?',
+        default='documents',
+        help="Collection name (default: documents)"
+    )
+    search_parser.set_defaults(func=build_name_search)
+
+    # Indexes command
+    indexes_parser = subparsers.add_parser(
+        'ensure_indexes',
+        help='Create declared indexes of application collections (uses MONGODB_URL)'
+    )
+    indexes_parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Fail if any repository query would do a collection scan',
+    )
+    indexes_parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Drop and create again indexes whose definition changed',
+    )
+    indexes_parser.set_defaults(func=ensure_indexes)
+
 
     args = parser.parse_args()
 
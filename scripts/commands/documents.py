@@ -1,5 +1,5 @@
 from argparse import Namespace
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 from app.models.document import (
     Document,
     DocElement,
@@ -7,6 +7,7 @@ from app.models.document import (
     DocumentAccessRestriction,
     DocumentAccessRole,
 )
+from app.core.repository.name_search import NameSearch, get_name_search
 from bson import ObjectId
 from datetime import timedelta
 import asyncio
@@ -17,6 +18,8 @@ import random
 
 fake = faker.Faker()
 
+INSERT_BATCH_SIZE = 1000
+
 
 def generate_doc_element() -> DocElement:
     element_type = random.choice(list(DocElementType))
@@ -84,12 +87,13 @@ async def _fill_documents_collection(
     style_collection: str | None,
     assign_existing_style: bool,
     count: int,
+    name_search: NameSearch,
 ):
     if mongodb_url is None:
         print('url to mongodb not provided. finishing')
         return -1
 
-    mongo_client = AsyncIOMotorClient(mongodb_url)
+    mongo_client = AsyncMongoClient(mongodb_url)
     database = mongo_client.get_database(database)
     collection = database.get_collection(collection)
 
@@ -98,6 +102,7 @@ async def _fill_documents_collection(
         s_collection = database.get_collection(style_collection)
         style_ids_cursor = s_collection.find({}, {'_id': 1})
 
+    batch = list()
     for _ in range(count):
         try:
             style_id = str((await style_ids_cursor.next())['_id']) \
@@ -109,9 +114,17 @@ async def _fill_documents_collection(
             style_id=style_id
         )
 
-        await collection.insert_one(
-            document.model_dump(by_alias=True, exclude=["id"])
+        batch.append(
+            name_search.annotate(
+                document.model_dump(by_alias=True, exclude=["id"])
+            )
         )
+        if len(batch) == INSERT_BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            batch = list()
+
+    if batch:
+        await collection.insert_many(batch, ordered=False)
 
     print('Done!')
 
@@ -125,6 +138,7 @@ def fill_documents_collection(args):
             collection=args.collection,
             style_collection=args.collection,
             assign_existing_style=args.assign_existing_style,
-            count=args.count
+            count=args.count,
+            name_search=get_name_search(args.name_search_engine),
         )
     )
@@ -0,0 +1,23 @@
+from app.core.repository.indexes import QueryPlanException, IndexConflictException
+import asyncio
+
+
+async def _ensure_indexes(verify: bool, rebuild: bool):
+    from app.database import client, mongo_repositories
+
+    try:
+        for repository in mongo_repositories:
+            await repository.ensure_indexes(rebuild=rebuild)
+            if verify:
+                await repository.verify_query_plans()
+    except (QueryPlanException, IndexConflictException) as e:
+        print(e)
+        return -1
+    finally:
+        await client.close()
+
+    print('Done!')
+
+
+def ensure_indexes(args):
+    asyncio.run(_ensure_indexes(verify=args.verify, rebuild=args.rebuild))
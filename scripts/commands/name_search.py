@@ -0,0 +1,49 @@
+from pymongo import AsyncMongoClient, UpdateOne
+from app.core.repository.name_search import get_name_search
+from app.core.repository.indexes import apply_indexes
+import asyncio
+
+
+BATCH_SIZE = 1000
+
+
+async def _build_name_search(
+    mongodb_url: str,
+    database: str,
+    collection: str,
+    engine: str,
+):
+    name_search = get_name_search(engine)
+
+    mongo_client = AsyncMongoClient(mongodb_url)
+    collection = mongo_client.get_database(database).get_collection(collection)
+
+    await apply_indexes(collection, name_search.get_indexes(), rebuild=True)
+
+    updated = 0
+    batch = list()
+    async for document in collection.find({}, {'name': 1}):
+        changes = name_search.annotate({'name': document['name']})
+        changes.pop('name')
+        if not changes:
+            break
+        batch.append(UpdateOne({'_id': document['_id']}, {'$set': changes}))
+        if len(batch) == BATCH_SIZE:
+            updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+            batch = list()
+    if batch:
+        updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+
+    await mongo_client.close()
+    print(f'Done! {updated} documents updated')
+
+
+def build_name_search(args):
+    asyncio.run(
+        _build_name_search(
+            mongodb_url=args.mongodb_url,
+            database=args.database,
+            collection=args.collection,
+            engine=args.engine,
+        )
+    )
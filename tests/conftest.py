@@ -1,5 +1,7 @@
 import pytest
 import typing
+# registers the command listener before app creates its mongo client
+import tests.utils.mongo_commands
 from app.main import app as target_app
 from fastapi.testclient import TestClient
 from tests.utils.user import (
@@ -2,6 +2,7 @@ from pydantic.main import BaseModel
 import pytest
 import typing
 from fastapi import status
+from tests.utils.mongo_commands import command_counter
 
 
 if typing.TYPE_CHECKING:
@@ -116,6 +117,204 @@ def test_model_list_negative_params(
     assert 'presented_amount' not in response_data
     assert 'total_amount' not in response_data
 
+def test_model_list_cursor_pagination(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    models = [self.create_model(owner_id=active_user.id) for _ in range(5)]
+    self.insert_models_bulk(models)
+
+    seen_ids = list()
+    params = {'limit': 2}
+    while True:
+        response = client.get(url=self.base_url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+
+        response_data = response.json()
+        assert response_data['total_amount'] == len(models)
+        seen_ids += [m['id'] for m in response_data['content']]
+
+        if response_data['next_cursor'] is None:
+            break
+        params['cursor'] = response_data['next_cursor']
+
+    assert len(seen_ids) == len(models)
+    assert set(seen_ids) == {str(m.id) for m in models}
+
+
+def test_model_list_invalid_cursor(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    response = client.get(
+        url=self.base_url,
+        params={'cursor': 'not-a-cursor'}
+    )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_model_list_total_follows_changes(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    def get_total_amount() -> int:
+        response = client.get(url=self.base_url)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()['total_amount']
+
+    assert get_total_amount() == 0
+
+    response = client.post(url=self.base_url, json=self.creation_payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert get_total_amount() == 1
+
+    response = client.delete(url=self.detail_url(response.json()['id']))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert get_total_amount() == 0
+
+
+def test_model_list_is_deleted_filter(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    models = [self.create_model(owner_id=active_user.id) for _ in range(3)]
+    self.insert_models_bulk(models)
+    deleted_id = str(models[0].id)
+    response = client.delete(url=self.detail_url(deleted_id))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = client.get(url=self.base_url)
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert response_data['total_amount'] == 2
+    assert deleted_id not in {m['id'] for m in response_data['content']}
+
+    response = client.get(url=self.base_url, params={'is_deleted': True})
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert response_data['total_amount'] == 1
+    assert [m['id'] for m in response_data['content']] == [deleted_id]
+
+
+def test_model_list_name_filter(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    for name in ('Alpha (draft)', 'Alpha', 'Beta'):
+        response = client.post(url=self.base_url, json={'name': name})
+        assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.get(url=self.base_url, params={'name': 'a (dr'})
+
+    assert response.status_code == status.HTTP_200_OK
+
+    response_data = response.json()
+    assert response_data['total_amount'] == 1
+    assert response_data['content'][0]['name'] == 'Alpha (draft)'
+
+
+def test_model_list_fields(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    self.insert_models_bulk(
+        [self.create_model(owner_id=active_user.id) for _ in range(3)]
+    )
+
+    response = client.get(
+        url=self.base_url,
+        params={'fields': ['id', 'name']}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+
+    response_data = response.json()
+    assert response_data['presented_amount'] == 3
+    for model in response_data['content']:
+        assert set(model) == {'id', 'name'}
+
+
+def test_model_list_unknown_fields(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    response = client.get(
+        url=self.base_url,
+        params={'fields': ['content']}
+    )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_model_list_by_ids(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    models = [self.create_model(owner_id=active_user.id) for _ in range(3)]
+    self.insert_models_bulk(models)
+    foreign_model = self.create_model(owner_id=f"not-{active_user.id}")
+    self.insert_model(foreign_model)
+
+    requested_ids = [str(models[0].id), str(models[2].id), str(foreign_model.id)]
+    response = client.get(url=self.base_url, params={'ids': requested_ids})
+
+    assert response.status_code == status.HTTP_200_OK
+
+    response_data = response.json()
+    assert response_data['presented_amount'] == 2
+    assert {m['id'] for m in response_data['content']} == set(requested_ids[:2])
+
+
+def test_model_batch_deletion_and_restore(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    models = [self.create_model(owner_id=active_user.id) for _ in range(3)]
+    self.insert_models_bulk(models)
+    ids = [str(m.id) for m in models[:2]]
+
+    response = client.delete(url=self.base_url, params={'ids': ids})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['affected_amount'] == 2
+
+    response = client.get(url=self.base_url)
+    assert response.json()['total_amount'] == 1
+
+    response = client.post(url=f"{self.base_url}/restore", params={'ids': ids})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['affected_amount'] == 2
+
+    response = client.get(url=self.base_url)
+    assert response.json()['total_amount'] == 3
+
+
+def test_model_batch_invalid_ids(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+):
+    params = {'ids': ['not-an-id']}
+
+    response = client.get(url=self.base_url, params=params)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.delete(url=self.base_url, params=params)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.post(url=f"{self.base_url}/restore", params=params)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 def test_model_update(
     self: 'CRUDTestingSuite',
     client: 'TestClient',
@@ -161,6 +360,20 @@ def test_model_details(
         owner_id=active_user.id,
     )
 
+def test_model_details_fields(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+    persisted_model: 'BaseModel',
+):
+    response = client.get(
+        url=self.detail_url(persisted_model.id),
+        params={'fields': ['name']}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'name': persisted_model.name}
+
 def test_model_deletion(
     self: 'CRUDTestingSuite',
     client: 'TestClient',
@@ -178,3 +391,34 @@ def test_model_deletion(
    #)
 
    #assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize(
+    "method,detail,payload_name,budget",
+    [
+        ("GET", False, None, 1),
+        ("POST", False, "creation_payload", 1),
+        ("GET", True, None, 1),
+        ("PATCH", True, "update_payload", 1),
+        ("DELETE", True, None, 1),
+    ],
+    ids=["list", "create", "read", "update", "delete"]
+)
+def test_model_routes_command_budget(
+    self: 'CRUDTestingSuite',
+    client: 'TestClient',
+    active_user: 'User',
+    persisted_model: 'BaseModel',
+    method: str,
+    detail: bool,
+    payload_name: str | None,
+    budget: int,
+):
+    url = self.detail_url(persisted_model.id) if detail else self.base_url
+    payload = getattr(self, payload_name) if payload_name else None
+
+    with command_counter.count() as commands:
+        response = client.request(method=method, url=url, json=payload)
+
+    assert response.is_success
+    assert len(commands) <= budget, f"mongo commands issued: {commands}"
@@ -92,7 +92,19 @@ class CRUDTestingSuite:
         test_model_creation,
         test_model_list_normal_behavior,
         test_model_list_negative_params,
+        test_model_list_cursor_pagination,
+        test_model_list_invalid_cursor,
+        test_model_list_total_follows_changes,
+        test_model_list_is_deleted_filter,
+        test_model_list_name_filter,
+        test_model_list_fields,
+        test_model_list_unknown_fields,
+        test_model_list_by_ids,
+        test_model_batch_deletion_and_restore,
+        test_model_batch_invalid_ids,
         test_model_update,
         test_model_details,
+        test_model_details_fields,
         test_model_deletion,
+        test_model_routes_command_budget,
     )
@@ -0,0 +1,82 @@
+from bson import ObjectId
+from datetime import datetime
+import pytest
+
+from app.core.cache_codecs import (
+    CACHE_CODECS,
+    FORMAT_MSGPACK,
+    FORMAT_MSGPACK_ZLIB,
+    FORMAT_MSGPACK_ZSTD,
+    UnknownCacheFormatException,
+    get_cache_codec,
+)
+from app.models.document import Document, DocElement
+
+
+COMPRESSION_THRESHOLD = 256
+
+
+def _create_document(blocks: int) -> Document:
+    return Document(
+        id=str(ObjectId()),
+        name="document",
+        owner_id="owner",
+        created_at=datetime(2024, 1, 1),
+        content=[
+            DocElement(id=str(i), type="paragraph", attrs={}, data={"text": "text " * 10})
+            for i in range(blocks)
+        ],
+    )
+
+
+@pytest.fixture(params=list(CACHE_CODECS))
+def codec_name(request: pytest.FixtureRequest) -> str:
+    if request.param == "msgpack-zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+@pytest.mark.parametrize("blocks", [0, 50])
+def test_codec_round_trip(codec_name: str, blocks: int):
+    codec = get_cache_codec(codec_name, compression_threshold=COMPRESSION_THRESHOLD)
+    document = _create_document(blocks)
+
+    assert codec.decode(codec.encode(document), Document) == document
+
+
+@pytest.mark.parametrize("codec_name, compressed_format", [
+    ("msgpack-zlib", FORMAT_MSGPACK_ZLIB),
+    ("msgpack-zstd", FORMAT_MSGPACK_ZSTD),
+])
+def test_values_are_compressed_from_the_threshold(codec_name: str, compressed_format: int):
+    if codec_name == "msgpack-zstd":
+        pytest.importorskip("zstandard")
+    codec = get_cache_codec(codec_name, compression_threshold=COMPRESSION_THRESHOLD)
+
+    assert codec.encode(_create_document(0))[0] == FORMAT_MSGPACK
+    assert codec.encode(_create_document(50))[0] == compressed_format
+
+
+def test_legacy_json_is_decoded(codec_name: str):
+    codec = get_cache_codec(codec_name, compression_threshold=COMPRESSION_THRESHOLD)
+    document = _create_document(2)
+
+    assert codec.decode(document.model_dump_json().encode(), Document) == document
+
+
+def test_value_of_another_codec_is_decoded(codec_name: str):
+    codec = get_cache_codec(codec_name, compression_threshold=COMPRESSION_THRESHOLD)
+    document = _create_document(50)
+
+    for writer_name in CACHE_CODECS:
+        if writer_name == "msgpack-zstd":
+            pytest.importorskip("zstandard")
+        writer = get_cache_codec(writer_name, compression_threshold=COMPRESSION_THRESHOLD)
+        assert codec.decode(writer.encode(document), Document) == document
+
+
+def test_unknown_format_is_rejected(codec_name: str):
+    codec = get_cache_codec(codec_name, compression_threshold=COMPRESSION_THRESHOLD)
+
+    with pytest.raises(UnknownCacheFormatException):
+        codec.decode(bytes([255]) + b"value", Document)
@@ -0,0 +1,67 @@
+import asyncio
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.core.repository.caching import CachingRepository
+
+
+class SlowRepository:
+    """Holds loaded documents until released, as a load racing a write"""
+
+    def __init__(self, document: dict) -> None:
+        self.document = document
+        self.loaded = asyncio.Event()
+        self.released = asyncio.Event()
+
+    async def get_document(self, id, owner_id, include_fields=None) -> dict:
+        document = dict(self.document)
+        self.loaded.set()
+        await self.released.wait()
+        return document
+
+    async def update_document(self, id, changes, owner_id) -> dict:
+        self.document.update(changes)
+        return self.document
+
+
+async def _with_caching_repository(test, document: dict):
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    repository = SlowRepository(document)
+    cache = CachingRepository(
+        repository=repository,
+        redis_client=client,
+        namespace=uuid.uuid4().hex,
+    )
+    try:
+        return await test(repository, cache)
+    finally:
+        await client.aclose()
+
+
+def test_loaded_document_is_cached():
+    async def test(repository: SlowRepository, cache: CachingRepository) -> None:
+        repository.released.set()
+        await cache.get_document(id="document", owner_id=None)
+        cache._l1.clear()
+        document = await cache.get_document(id="document", owner_id=None)
+        assert document["name"] == "name"
+        assert cache.stats.misses == 1
+        assert cache.stats.l2_hits == 1
+
+    asyncio.run(_with_caching_repository(test, {"_id": "document", "name": "name"}))
+
+
+def test_load_racing_update_is_not_cached():
+    async def test(repository: SlowRepository, cache: CachingRepository) -> None:
+        read = asyncio.create_task(cache.get_document(id="document", owner_id=None))
+        await repository.loaded.wait()
+        await cache.update_document(id="document", changes={"name": "new"}, owner_id=None)
+        repository.released.set()
+        assert (await read)["name"] == "old"
+
+        document = await cache.get_document(id="document", owner_id=None)
+        assert document["name"] == "new"
+        assert cache.stats.misses == 2
+
+    asyncio.run(_with_caching_repository(test, {"_id": "document", "name": "old"}))
@@ -0,0 +1,37 @@
+import asyncio
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.core.repository.count_cache import CountCache
+
+
+async def _with_count_cache(test):
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    try:
+        return await test(CountCache(client, namespace=uuid.uuid4().hex, ttl=60))
+    finally:
+        await client.aclose()
+
+
+def test_counted_total_is_cached():
+    async def test(cache: CountCache) -> int | None:
+        amount, generation = await cache.get("owner", name=None, is_deleted=False)
+        assert amount is None
+        await cache.set("owner", name=None, is_deleted=False, amount=3, generation=generation)
+        amount, _ = await cache.get("owner", name=None, is_deleted=False)
+        return amount
+
+    assert asyncio.run(_with_count_cache(test)) == 3
+
+
+def test_total_counted_before_invalidation_is_not_cached():
+    async def test(cache: CountCache) -> int | None:
+        _, generation = await cache.get("owner", name="plan", is_deleted=False)
+        # a write of the owner lands while the stale total is counted
+        await cache.invalidate("owner")
+        await cache.set("owner", name="plan", is_deleted=False, amount=3, generation=generation)
+        amount, _ = await cache.get("owner", name="plan", is_deleted=False)
+        return amount
+
+    assert asyncio.run(_with_count_cache(test)) is None
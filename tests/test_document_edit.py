@@ -1,5 +1,16 @@
+import asyncio
+import bson
+import msgpack
 import pytest
 import typing
+from fastapi import status
+from starlette.websockets import WebSocketDisconnect
+
+from app.connections import connection_registry
+from app.database import documents_collection, documents_repository
+from app.models.document import DocElement
+from app.routers import cache
+from tests.utils.mongo_commands import command_counter
 
 from tests.utils.document import create_document, insert_document
 
@@ -10,6 +21,7 @@ if typing.TYPE_CHECKING:
     from starlette.testclient import WebSocketTestSession
 
 DOCUMENTS_URL = '/documents'
+EDITS_AMOUNT = 10
 
 @pytest.fixture
 def mock_document(active_user: 'User') -> 'Document':
@@ -27,6 +39,7 @@ def ws_client(
 ) -> typing.Generator['WebSocketTestSession', None, None]:
     url = get_documents_edit_ws_url(persisted_document.id)
     with client.websocket_connect(url=url) as client:
+        assert client.receive_json()["event"]["type"] == "snapshot"
         yield client
 
 
@@ -44,3 +57,167 @@ def test_unknown_event(ws_client: 'WebSocketTestSession'):
     ws_client.send_json(event)
     response = ws_client.receive_json()
     assert response["error"]["type"] == "unable-to-handle"
+
+
+def test_msgpack_subprotocol(client: 'TestClient', persisted_document: 'Document'):
+    url = get_documents_edit_ws_url(persisted_document.id)
+    with client.websocket_connect(url=url, subprotocols=["cloudoc.msgpack"]) as ws_client:
+        assert ws_client.accepted_subprotocol == "cloudoc.msgpack"
+        assert msgpack.unpackb(ws_client.receive_bytes())["event"]["type"] == "snapshot"
+        ws_client.send_bytes(msgpack.packb({"event": {"type": "unknown-event", "data": {}}}))
+        response = msgpack.unpackb(ws_client.receive_bytes())
+    assert response["error"]["type"] == "unable-to-handle"
+
+
+def test_resume_replays_missed_events(client: 'TestClient', persisted_document: 'Document'):
+    url = get_documents_edit_ws_url(persisted_document.id)
+    with client.websocket_connect(url=url) as ws_client:
+        ws_client.receive_json()
+        ws_client.send_json({"event": {"type": "block-locked", "data": {"id": "block"}}})
+        seq = ws_client.receive_json()["seq"]
+        ws_client.send_json({"event": {"type": "block-released", "data": {"id": "block"}}})
+        ws_client.receive_json()
+
+    with client.websocket_connect(url=f"{url}?resume_from={seq}") as ws_client:
+        missed = ws_client.receive_json()
+    assert missed["seq"] == seq + 1
+    assert missed["event"]["type"] == "block-released"
+
+
+def test_resume_gets_snapshot_when_events_are_gone(
+    client: 'TestClient',
+    persisted_document: 'Document',
+):
+    url = get_documents_edit_ws_url(persisted_document.id)
+    # events after the seq are not in the log
+    with client.websocket_connect(url=f"{url}?resume_from=1000") as ws_client:
+        snapshot = ws_client.receive_json()
+    assert snapshot["event"]["type"] == "snapshot"
+
+
+def test_snapshot_is_the_first_message(client: 'TestClient', persisted_document: 'Document'):
+    url = get_documents_edit_ws_url(persisted_document.id)
+    with client.websocket_connect(url=url) as ws_client:
+        ws_client.send_json({"event": {"type": "block-locked", "data": {"id": "block"}}})
+        snapshot = ws_client.receive_json()
+        locked = ws_client.receive_json()
+    with client.websocket_connect(url=url) as ws_client:
+        next_snapshot = ws_client.receive_json()
+
+    assert snapshot["event"]["type"] == "snapshot"
+    assert snapshot["event"]["data"]["document"]["id"] == persisted_document.id
+    assert locked["seq"] == snapshot["seq"] + 1
+    # the lock was released with the connection
+    assert next_snapshot["seq"] == locked["seq"] + 1
+    assert next_snapshot["event"]["data"]["locks"] == {}
+
+
+def test_concurrent_edits_are_kept(client: 'TestClient', persisted_document: 'Document'):
+    url = get_documents_edit_ws_url(persisted_document.id)
+    with (
+        client.websocket_connect(url=url) as first,
+        client.websocket_connect(url=url) as second,
+    ):
+        editors = {"first": first, "second": second}
+        for name, ws_client in editors.items():
+            ws_client.receive_json()
+            ws_client.send_json({"event": {"type": "blocks-locked", "data": {
+                "ids": [f"{name}-{i}" for i in range(EDITS_AMOUNT)],
+            }}})
+        for i in range(EDITS_AMOUNT):
+            for name, ws_client in editors.items():
+                ws_client.send_json({"event": {"type": "block-added", "data": {
+                    "id": f"{name}-{i}", "type": "paragraph", "index": 0,
+                }}})
+        # locks and additions of both editors
+        for ws_client in editors.values():
+            for _ in range(2 + 2 * EDITS_AMOUNT):
+                ws_client.receive_json()
+
+    document = client.portal.call(cache.get_document, persisted_document.id)
+    assert len(document.content) == 2 * EDITS_AMOUNT
+
+
+def test_repeated_flush_applies_changes_once(
+    client: 'TestClient',
+    persisted_document: 'Document',
+    monkeypatch: pytest.MonkeyPatch,
+):
+    def add_block(block_id: str) -> typing.Callable:
+        def edit(document: 'Document') -> dict:
+            block = DocElement(id=block_id, type="paragraph", attrs={}, data={})
+            document.content.insert(0, block)
+            return cache.block_inserted_change(0, block)
+        return edit
+
+    async def edit_and_flush(block_ids: list[str]) -> None:
+        for block_id in block_ids:
+            await cache.edit_document(persisted_document.id, add_block(block_id))
+        await cache.flush_dirty_documents(documents_repository, chunk_size=100)
+
+    client.portal.call(edit_and_flush, ["first"])
+
+    async def fail(*args, **kwargs):
+        raise ConnectionError()
+
+    # written to db, but still dirty in cache
+    with monkeypatch.context() as patch:
+        patch.setattr(cache, "_MARK_CLEAN_SCRIPT", fail)
+        with pytest.raises(ConnectionError):
+            client.portal.call(edit_and_flush, ["second"])
+    client.portal.call(edit_and_flush, ["third"])
+
+    stored = client.portal.call(
+        documents_collection.find_one, {"_id": bson.ObjectId(persisted_document.id)}
+    )
+    assert [block["id"] for block in stored["content"]] == ["third", "second", "first"]
+
+
+@pytest.fixture
+def draining_client(client: 'TestClient') -> typing.Generator['TestClient', None, None]:
+    yield client
+    connection_registry.is_draining = False
+
+
+def test_readiness(client: 'TestClient'):
+    response = client.get('/health/ready')
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_drain_asks_editors_to_reconnect(
+    draining_client: 'TestClient',
+    ws_client: 'WebSocketTestSession',
+    persisted_document: 'Document',
+):
+    draining_client.portal.call(connection_registry.drain)
+
+    assert ws_client.receive_json()["event"]["type"] == "server-restart"
+    with pytest.raises(WebSocketDisconnect) as e:
+        ws_client.receive_json()
+    assert e.value.code == status.WS_1012_SERVICE_RESTART
+
+    assert draining_client.get('/health/ready').status_code == 503
+    url = get_documents_edit_ws_url(persisted_document.id)
+    with pytest.raises(WebSocketDisconnect) as e:
+        with draining_client.websocket_connect(url=url):
+            pass
+    assert e.value.code == status.WS_1012_SERVICE_RESTART
+
+
+def test_concurrent_loads_query_db_once(
+    client: 'TestClient',
+    persisted_document: 'Document',
+):
+    async def open_by_many():
+        return await asyncio.gather(
+            *[cache.get_document(persisted_document.id) for _ in range(50)]
+        )
+
+    with command_counter.count() as commands:
+        documents = client.portal.call(open_by_many)
+
+    assert commands.count("find") == 1
+    assert all(document.id == persisted_document.id for document in documents)
+    # callers get separate models to modify
+    assert len({id(document) for document in documents}) == 50
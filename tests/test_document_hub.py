@@ -0,0 +1,190 @@
+import asyncio
+import pytest
+import uuid
+import redis.asyncio as redis
+from broadcaster import Broadcast
+
+from app.broadcast import describe_document_message
+from app.config import Config
+from app.core.document_hub import BroadcastDocumentHub, MemoryDocumentHub
+from app.core.event_log import EventLog
+from app.core.send_queue import (
+    OutboundMessage,
+    OverflowPolicy,
+    SendQueue,
+    SendQueueOverflowException,
+)
+
+
+SOCKETS_AMOUNT = 50
+
+HUB_OPTIONS = dict(
+    describe_message=describe_document_message,
+    send_queue_size=16,
+    overflow_policy=OverflowPolicy.COALESCE,
+)
+
+
+async def _fan_out(hub) -> list[list[str]]:
+    received = [list() for _ in range(SOCKETS_AMOUNT)]
+    subscribed = asyncio.Semaphore(0)
+
+    async def socket(messages: list[str]) -> None:
+        async with hub.subscribe("channel") as queue:
+            subscribed.release()
+            while len(messages) < 2:
+                messages.append((await queue.get()).text)
+
+    tasks = [asyncio.create_task(socket(messages)) for messages in received]
+    for _ in range(SOCKETS_AMOUNT):
+        await subscribed.acquire()
+    assert hub.subscribers_amount("channel") == SOCKETS_AMOUNT
+    await hub.publish("channel", "first")
+    await hub.publish("channel", "second")
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+    assert hub.subscribers_amount("channel") == 0
+    return received
+
+
+def test_memory_hub_fans_out_in_order():
+    received = asyncio.run(_fan_out(MemoryDocumentHub(**HUB_OPTIONS)))
+    assert received == [["first", "second"]] * SOCKETS_AMOUNT
+
+
+def test_broadcast_hub_subscribes_once_per_channel():
+    async def test() -> list[list[str]]:
+        async with Broadcast("memory://") as broadcast:
+            received = await _fan_out(BroadcastDocumentHub(broadcast, **HUB_OPTIONS))
+            # the shared subscription is dropped with the last socket
+            assert not broadcast._subscribers
+            return received
+
+    assert asyncio.run(test()) == [["first", "second"]] * SOCKETS_AMOUNT
+
+
+def test_broadcast_hub_checks_it_gets_event_log_messages():
+    async def connect(url: str) -> None:
+        client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+        hub = BroadcastDocumentHub(
+            Broadcast(url),
+            **HUB_OPTIONS,
+            event_log=EventLog(client, retention=10, ttl=60),
+        )
+        hub.publish_check_timeout = 0.3
+        try:
+            await hub.connect()
+            await hub.disconnect()
+        finally:
+            await client.aclose()
+
+    asyncio.run(connect(Config.REDIS_STORAGE_URL))
+    with pytest.raises(ValueError):
+        asyncio.run(connect("memory://"))
+
+
+def test_transaction_writes_with_the_sequence_number():
+    async def test() -> tuple[int, bytes, bytes]:
+        client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+        channel = uuid.uuid4().hex
+        event_log = EventLog(client, retention=10, ttl=60)
+        hub = MemoryDocumentHub(**HUB_OPTIONS, event_log=event_log)
+
+        async def transaction(queue_writes) -> bytes:
+            async with client.pipeline(transaction=True) as pipeline:
+                pipeline.set(f"{channel}:document", "edited")
+                await queue_writes(pipeline)
+                return (await pipeline.execute())[-1]
+
+        try:
+            async with hub.subscribe(channel) as queue:
+                await hub.publish(channel, '{"event": {"type": "block-added"}}', transaction)
+                message = await queue.get()
+            async with client.pipeline(transaction=True) as pipeline:
+                pipeline.get(f"{channel}:document")
+                pipeline.get(event_log.get_seq_key(channel))
+                document, seq = await pipeline.execute()
+            return message.seq, document, seq
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(test()) == (1, b"edited", b"1")
+
+
+def test_slow_transaction_does_not_hold_other_channels():
+    async def test() -> list[str]:
+        client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+        event_log = EventLog(client, retention=10, ttl=60)
+        hub = MemoryDocumentHub(**HUB_OPTIONS, event_log=event_log)
+        released = asyncio.Event()
+        published = list()
+
+        async def slow_transaction(queue_writes) -> bytes:
+            await released.wait()
+            async with client.pipeline(transaction=True) as pipeline:
+                await queue_writes(pipeline)
+                return (await pipeline.execute())[-1]
+
+        async def publish(channel: str, transaction=None) -> None:
+            await hub.publish(channel, '{"event": {"type": "block-added"}}', transaction)
+            published.append(channel)
+
+        try:
+            slow = asyncio.create_task(publish(uuid.uuid4().hex, slow_transaction))
+            await asyncio.wait_for(publish(uuid.uuid4().hex), timeout=1)
+            released.set()
+            await slow
+            return published
+        finally:
+            await client.aclose()
+
+    assert len(asyncio.run(test())) == 2
+
+
+def _block_changed(block_id: str, text: str) -> OutboundMessage:
+    return describe_document_message(
+        '{"event": {"type": "block-changed", "data": {"index": 0, "id": "%s", '
+        '"type": "paragraph", "data": {"text": "%s"}}}}' % (block_id, text)
+    )
+
+
+async def _drain(queue: SendQueue) -> list[str]:
+    queue.close()
+    messages = list()
+    while (message := await queue.get()) is not None:
+        messages.append(message.text)
+    return messages
+
+
+def test_full_queue_coalesces_changes_of_a_block():
+    queue = SendQueue(maxsize=3, policy=OverflowPolicy.COALESCE)
+    for message in [
+        _block_changed("first", "a"),
+        _block_changed("second", "a"),
+        _block_changed("first", "ab"),
+        _block_changed("first", "abc"),
+    ]:
+        queue.put(message)
+
+    messages = asyncio.run(_drain(queue))
+    assert ['"second"' in message for message in messages] == [True, False]
+    assert '"abc"' in messages[1]
+    assert queue.coalesced == 2
+
+
+def test_full_queue_drops_oldest_not_critical_message():
+    queue = SendQueue(maxsize=2, policy=OverflowPolicy.DROP_OLDEST)
+    queue.put(OutboundMessage(text="presence", critical=False))
+    queue.put(OutboundMessage(text="locked"))
+    queue.put(OutboundMessage(text="released"))
+
+    assert asyncio.run(_drain(queue)) == ["locked", "released"]
+    assert queue.dropped == 1
+
+
+def test_overflowed_queue_asks_to_resync():
+    queue = SendQueue(maxsize=2, policy=OverflowPolicy.DROP_OLDEST)
+    for text in ("first", "second", "third"):
+        queue.put(OutboundMessage(text=text))
+
+    with pytest.raises(SendQueueOverflowException):
+        asyncio.run(queue.get())
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.core.event_coalescer import EventCoalescer
+from app.core.message_handler import Response, ResponseType
+
+
+def _response(message: str, coalesce_key: str | None) -> Response:
+    return Response(
+        message=message,
+        response_type=ResponseType.BROADCAST,
+        coalesce_key=coalesce_key,
+    )
+
+
+async def _publish_all(responses: list[Response], window: float) -> list[str]:
+    published = list()
+
+    async def publish(response: Response) -> None:
+        published.append(response.message)
+
+    async def fail(error: Exception) -> None:
+        raise error
+
+    coalescer = EventCoalescer(publish, window=window, on_error=fail)
+    for response in responses:
+        await coalescer.publish(response)
+    await asyncio.sleep(window * 2)
+    return published
+
+
+def test_changes_of_a_block_are_merged_within_window():
+    published = asyncio.run(_publish_all(
+        [_response(text, "first") for text in ("a", "ab", "abc")],
+        window=0.02,
+    ))
+    assert published == ["abc"]
+
+
+def test_order_across_blocks_is_kept():
+    published = asyncio.run(_publish_all(
+        [
+            _response("first a", "first"),
+            _response("first ab", "first"),
+            _response("second a", "second"),
+            _response("locked", None),
+            _response("first abc", "first"),
+        ],
+        window=0.02,
+    ))
+    assert published == ["first ab", "second a", "locked", "first abc"]
+
+
+def test_error_of_held_response_is_handed_over():
+    errors = list()
+
+    async def publish(response: Response) -> None:
+        raise IndexError(response.message)
+
+    async def on_error(error: Exception) -> None:
+        errors.append(error)
+
+    async def test() -> None:
+        coalescer = EventCoalescer(publish, window=0.01, on_error=on_error)
+        await coalescer.publish(_response("a", "first"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(test())
+    assert [str(error) for error in errors] == ["a"]
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.core.event_log import EventLog
+
+
+async def _with_event_log(test, retention: int = 100):
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    try:
+        return await test(EventLog(client, retention=retention, ttl=60), uuid.uuid4().hex)
+    finally:
+        await client.aclose()
+
+
+def test_events_are_sequenced_and_resumed():
+    async def test(event_log: EventLog, channel: str) -> None:
+        for i in range(5):
+            message = await event_log.append(channel, json.dumps({"event": {"i": i}}))
+            assert json.loads(message) == {"seq": i + 1, "event": {"i": i}}
+
+        missed = await event_log.read_since(channel, 2)
+        assert [json.loads(message)["seq"] for message in missed] == [3, 4, 5]
+        assert await event_log.read_since(channel, 5) == []
+        # a sequence number the log never gave
+        assert await event_log.read_since(channel, 6) is None
+
+    asyncio.run(_with_event_log(test))
+
+
+def test_resume_outside_retention_needs_snapshot():
+    async def test(event_log: EventLog, channel: str) -> None:
+        for i in range(500):
+            await event_log.append(channel, json.dumps({"event": {"i": i}}))
+        assert await event_log.read_since(channel, 1) is None
+        assert len(await event_log.read_since(channel, 495)) == 5
+
+    asyncio.run(_with_event_log(test, retention=10))
+
+
+def test_sequence_expires_with_the_events():
+    async def test(event_log: EventLog, channel: str) -> list[int]:
+        await event_log.append(channel, json.dumps({"event": {}}))
+        seq_key = event_log.get_seq_key(channel)
+        return [await event_log._redis_client.ttl(key) for key in (seq_key, f"{channel}:events")]
+
+    assert all(0 < ttl <= 60 for ttl in asyncio.run(_with_event_log(test)))
@@ -0,0 +1,34 @@
+import asyncio
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.scheduler.leader import LeaderElection
+
+
+async def _elect(name: str, amount: int) -> tuple[list[bool], list[bool]]:
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    elections = [
+        LeaderElection(client, name=name, ttl=1)
+        for _ in range(amount)
+    ]
+    for election in elections:
+        await election.start()
+    before_stop = [election.is_leader for election in elections]
+
+    leader = elections[before_stop.index(True)]
+    await leader.stop()
+    # followers campaign every ttl / 3
+    await asyncio.sleep(0.5)
+    after_stop = [election.is_leader for election in elections if election is not leader]
+
+    for election in elections:
+        await election.stop()
+    await client.aclose()
+    return before_stop, after_stop
+
+
+def test_single_leader_and_failover():
+    before_stop, after_stop = asyncio.run(_elect(uuid.uuid4().hex, amount=5))
+    assert before_stop.count(True) == 1
+    assert after_stop.count(True) == 1
@@ -0,0 +1,160 @@
+import asyncio
+import pytest
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.core.lock_manager import (
+    LockManager,
+    sweep_expired_locks,
+    AlreadyLockedException,
+    UnauthorizedReleaseException,
+)
+
+
+USERS_AMOUNT = 20
+ROUNDS_AMOUNT = 50
+
+
+async def _with_lock_managers(test, amount: int, ttl: float = 30):
+    # a client per user, so their scripts really interleave on the server
+    namespace = uuid.uuid4().hex
+    clients = [redis.Redis.from_url(Config.REDIS_STORAGE_URL) for _ in range(amount)]
+    lock_managers = [
+        LockManager(resource_namespace=namespace, redis_client=client, ttl=ttl)
+        for client in clients
+    ]
+    try:
+        return await test(lock_managers)
+    finally:
+        for client in clients:
+            await client.aclose()
+
+
+def test_lock_mutual_exclusion():
+    holders = list()
+    max_holders = 0
+
+    async def contend(lock_manager: LockManager, user_id: str) -> int:
+        nonlocal max_holders
+        acquired_amount = 0
+        for _ in range(ROUNDS_AMOUNT):
+            try:
+                await lock_manager.lock(resource_id="block", user_id=user_id)
+            except AlreadyLockedException:
+                await asyncio.sleep(0)
+                continue
+            holders.append(user_id)
+            max_holders = max(max_holders, len(holders))
+            await asyncio.sleep(0)
+            holders.remove(user_id)
+            await lock_manager.release(resource_id="block", user_id=user_id)
+            acquired_amount += 1
+        return acquired_amount
+
+    async def test(lock_managers: list[LockManager]) -> list[int]:
+        return await asyncio.gather(
+            *[contend(lock_manager, str(i)) for i, lock_manager in enumerate(lock_managers)]
+        )
+
+    acquired_amounts = asyncio.run(_with_lock_managers(test, USERS_AMOUNT))
+    assert max_holders == 1
+    assert sum(acquired_amounts) > 0
+
+
+def test_concurrent_locks_of_different_blocks_are_kept():
+    async def test(lock_managers: list[LockManager]) -> list[bool]:
+        await asyncio.gather(*[
+            lock_manager.lock(resource_id=f"block-{i}", user_id=str(i))
+            for i, lock_manager in enumerate(lock_managers)
+        ])
+        return [
+            await lock_managers[0].is_locked_by(resource_id=f"block-{i}", user_id=str(i))
+            for i in range(len(lock_managers))
+        ]
+
+    assert all(asyncio.run(_with_lock_managers(test, USERS_AMOUNT)))
+
+
+def test_release_by_another_user_is_denied():
+    async def test(lock_managers: list[LockManager]) -> None:
+        await lock_managers[0].lock(resource_id="block", user_id="owner")
+        with pytest.raises(UnauthorizedReleaseException):
+            await lock_managers[1].release(resource_id="block", user_id="another")
+
+    asyncio.run(_with_lock_managers(test, 2))
+
+
+def test_lock_expires():
+    async def test(lock_managers: list[LockManager]) -> bool:
+        await lock_managers[0].lock(resource_id="block", user_id="owner")
+        await asyncio.sleep(0.2)
+        await lock_managers[1].lock(resource_id="block", user_id="another")
+        return await lock_managers[0].is_locked_by(resource_id="block", user_id="another")
+
+    assert asyncio.run(_with_lock_managers(test, 2, ttl=0.1))
+
+
+def test_renewed_lock_outlives_ttl():
+    async def test(lock_managers: list[LockManager]) -> bool:
+        await lock_managers[0].lock(resource_id="block", user_id="owner")
+        for _ in range(3):
+            await asyncio.sleep(0.2)
+            assert await lock_managers[0].renew(["block"], user_id="owner") == ["block"]
+        return await lock_managers[1].is_locked_by(resource_id="block", user_id="owner")
+
+    assert asyncio.run(_with_lock_managers(test, 2, ttl=0.3))
+
+
+def test_release_owned_keeps_locks_of_others():
+    async def test(lock_managers: list[LockManager]) -> tuple[list[str], bool]:
+        await lock_managers[0].lock(resource_id="first", user_id="owner")
+        await lock_managers[0].lock(resource_id="second", user_id="owner")
+        await lock_managers[1].lock(resource_id="third", user_id="another")
+        released_ids, _ = await lock_managers[0].release_owned(
+            ["first", "second", "third"],
+            user_id="owner",
+        )
+        return released_ids, await lock_managers[1].is_locked(resource_id="third")
+
+    released_ids, is_third_locked = asyncio.run(_with_lock_managers(test, 2))
+    assert sorted(released_ids) == ["first", "second"]
+    assert is_third_locked
+
+
+def test_sweep_drops_expired_locks():
+    resource_id = uuid.uuid4().hex
+
+    async def test(lock_managers: list[LockManager]) -> list:
+        await lock_managers[0].lock(resource_id=resource_id, user_id="owner")
+        await asyncio.sleep(0.2)
+        client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+        expired = await sweep_expired_locks(client, limit=1000)
+        await client.aclose()
+        return [lock for lock in expired if lock.resource_id == resource_id]
+
+    expired = asyncio.run(_with_lock_managers(test, 1, ttl=0.1))
+    assert [lock.owner_id for lock in expired] == ["owner"]
+
+
+def test_lock_many_is_all_or_nothing():
+    async def test(lock_managers: list[LockManager]) -> list[bool]:
+        await lock_managers[1].lock(resource_id="third", user_id="another")
+        with pytest.raises(AlreadyLockedException):
+            await lock_managers[0].lock_many(["first", "second", "third"], user_id="owner")
+        locked = [
+            await lock_managers[0].is_locked(resource_id=resource_id)
+            for resource_id in ("first", "second")
+        ]
+
+        await lock_managers[1].release(resource_id="third", user_id="another")
+        await lock_managers[0].lock_many(["first", "second", "third"], user_id="owner")
+        with pytest.raises(UnauthorizedReleaseException):
+            await lock_managers[1].release_many(["first", "second"], user_id="another")
+        await lock_managers[0].release_many(["first", "second", "third"], user_id="owner")
+        return locked + [
+            await lock_managers[0].is_locked(resource_id=resource_id)
+            for resource_id in ("first", "second", "third")
+        ]
+
+    assert not any(asyncio.run(_with_lock_managers(test, 2)))
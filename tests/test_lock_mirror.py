@@ -0,0 +1,69 @@
+import asyncio
+import uuid
+import redis.asyncio as redis
+
+from app.config import Config
+from app.core.lock_manager import LockManager
+from app.core.lock_mirror import LockMirror
+
+
+async def _with_lock_mirror(test, ttl: float = 30):
+    client = redis.Redis.from_url(Config.REDIS_STORAGE_URL)
+    lock_manager = LockManager(
+        resource_namespace=uuid.uuid4().hex,
+        redis_client=client,
+        ttl=ttl,
+    )
+    try:
+        return await test(lock_manager, LockMirror(lock_manager, ttl=ttl))
+    finally:
+        await client.aclose()
+
+
+def test_mirror_follows_changes_in_version_order():
+    async def test(lock_manager: LockManager, mirror: LockMirror) -> None:
+        await mirror.reconcile()
+        version = await lock_manager.lock(resource_id="block", user_id="owner")
+        mirror.apply_locked(["block"], "owner", version)
+        assert mirror.is_locked_by("block", "owner")
+
+        version = await lock_manager.release(resource_id="block", user_id="owner")
+        mirror.apply_released(["block"], version)
+        # replayed lock event of an older version
+        mirror.apply_locked(["block"], "owner", version - 1)
+        assert not mirror.is_locked_by("block", "owner")
+        assert not mirror.is_stale
+
+    asyncio.run(_with_lock_mirror(test))
+
+
+def test_mirror_reconciles_after_missed_version():
+    async def test(lock_manager: LockManager, mirror: LockMirror) -> None:
+        await mirror.reconcile()
+        await lock_manager.lock(resource_id="first", user_id="owner")
+        # the release of the first block was missed
+        await lock_manager.release(resource_id="first", user_id="owner")
+        version = await lock_manager.lock(resource_id="second", user_id="owner")
+        mirror.apply_locked(["first"], "owner", version - 2)
+        mirror.apply_locked(["second"], "owner", version)
+        assert mirror.is_stale
+        assert not mirror.is_locked_by("second", "owner")
+
+        await mirror.reconcile()
+        assert not mirror.is_stale
+        assert mirror.version == version
+        assert mirror.is_locked_by("second", "owner")
+        assert not mirror.is_locked_by("first", "owner")
+
+    asyncio.run(_with_lock_mirror(test))
+
+
+def test_mirror_forgets_expired_leases():
+    async def test(lock_manager: LockManager, mirror: LockMirror) -> None:
+        await lock_manager.lock(resource_id="block", user_id="owner")
+        await mirror.reconcile()
+        assert mirror.is_locked_by("block", "owner")
+        await asyncio.sleep(0.2)
+        assert not mirror.is_locked_by("block", "owner")
+
+    asyncio.run(_with_lock_mirror(test, ttl=0.1))
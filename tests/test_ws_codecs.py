@@ -0,0 +1,28 @@
+import json
+
+from app.core.send_queue import OutboundMessage
+from app.core.ws_codecs import JSON_WS_CODEC, MsgpackWSCodec, negotiate_ws_codec
+
+
+def test_first_supported_subprotocol_is_negotiated():
+    codec, subprotocol = negotiate_ws_codec(["cloudoc.cbor", "cloudoc.msgpack", "cloudoc.json"])
+    assert (codec.name, subprotocol) == ("msgpack", "cloudoc.msgpack")
+    assert negotiate_ws_codec([]) == (JSON_WS_CODEC, None)
+
+
+def test_outbound_message_is_encoded_once_per_codec():
+    encoded = list()
+
+    class CountingCodec(MsgpackWSCodec):
+        def encode(self, message: str) -> bytes:
+            encoded.append(message)
+            return super().encode(message)
+
+    codec = CountingCodec()
+    text = json.dumps({"event": {"type": "block-locked", "data": {"id": "block"}}})
+    message = OutboundMessage(text=text)
+    frames = [message.encode(codec) for _ in range(100)]
+
+    assert encoded == [text]
+    assert codec.decode(frames[0]) == json.loads(text)
+    assert message.encode(JSON_WS_CODEC) == text
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import pytest
+import typing
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.broadcast import describe_document_message
+from app.core.document_hub import MemoryDocumentHub
+from app.core.message_handler import BaseMessageHandler, Response, ResponseType
+from app.core.send_queue import OverflowPolicy
+from app.core.ws_connection_manager import (
+    ConnectionRegistry,
+    WSConnectionManager,
+    WS_RESYNC_CLOSE_CODE,
+)
+
+
+class EchoMessageHandler(BaseMessageHandler):
+    """Broadcasts every message, clients start without a snapshot.
+    Messages with a key are held, a "fail" one fails its transaction."""
+
+    async def handle_message(self, message: str | typing.Any) -> Response:
+        if isinstance(message, str):
+            message = json.loads(message)
+
+        async def transaction(queue_writes) -> None:
+            if message.get("fail"):
+                raise IndexError("list index out of range")
+            await queue_writes(None)
+
+        return Response(
+            message=json.dumps(message),
+            response_type=ResponseType.BROADCAST,
+            coalesce_key=message.get("key"),
+            transaction=transaction,
+        )
+
+
+def _create_app() -> FastAPI:
+    # no event log, so missed events are never known
+    hub = MemoryDocumentHub(
+        describe_message=describe_document_message,
+        send_queue_size=16,
+        overflow_policy=OverflowPolicy.COALESCE,
+    )
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def echo_ws(websocket: WebSocket, resume_from: int | None = None):
+        connection_manager = WSConnectionManager(
+            websocket=websocket,
+            hub=hub,
+            channel_name="channel",
+            message_handler=EchoMessageHandler(),
+            registry=ConnectionRegistry(),
+            coalescing_window=0.01,
+            resume_from=resume_from,
+        )
+        await connection_manager.perform()
+
+    return app
+
+
+def test_resume_without_snapshot_closes_for_resync():
+    with TestClient(_create_app()) as client:
+        with client.websocket_connect("/ws?resume_from=1") as ws_client:
+            with pytest.raises(WebSocketDisconnect) as e:
+                ws_client.receive_json()
+    assert e.value.code == WS_RESYNC_CLOSE_CODE
+
+
+def test_failed_held_change_closes_for_resync():
+    with TestClient(_create_app()) as client:
+        with client.websocket_connect("/ws") as ws_client:
+            ws_client.send_json({"key": "block", "fail": True})
+            with pytest.raises(WebSocketDisconnect) as e:
+                ws_client.receive_json()
+    assert e.value.code == WS_RESYNC_CLOSE_CODE
+
+
+class ClosingConnection:
+    def __init__(self) -> None:
+        self.closed = asyncio.Event()
+
+    async def close_for_restart(self) -> None:
+        self.closed.set()
+
+
+def test_drain_waits_for_connections_to_end():
+    async def test() -> list[str]:
+        registry = ConnectionRegistry()
+        events = list()
+
+        async def serve() -> None:
+            connection = ClosingConnection()
+            with registry.register(connection):
+                await connection.closed.wait()
+                # publishes held edits and releases locks
+                await asyncio.sleep(0.05)
+                events.append("ended")
+
+        task = asyncio.create_task(serve())
+        await asyncio.sleep(0)
+        await registry.drain(timeout=1)
+        events.append("drained")
+        await task
+        return events
+
+    assert asyncio.run(test()) == ["ended", "drained"]
@@ -0,0 +1,41 @@
+import contextlib
+import threading
+import typing
+from pymongo import monitoring
+from app.config import Config
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Records commands sent to the application database while counting"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._commands: list[str] | None = None
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.database_name != Config.DATABASE_NAME:
+            return
+        with self._lock:
+            if self._commands is not None:
+                self._commands.append(event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None: ...
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None: ...
+
+    @contextlib.contextmanager
+    def count(self) -> typing.Generator[list[str], None, None]:
+        commands = list()
+        with self._lock:
+            self._commands = commands
+        try:
+            yield commands
+        finally:
+            with self._lock:
+                self._commands = None
+
+
+command_counter = CommandCounter()
+
+# applies only to clients created afterwards, so it must be imported before app
+monitoring.register(command_counter)